@@ -0,0 +1,63 @@
+"""
+Пакетний (векторизований) розрахунок розмитнення для вивантажень лотів Copart/IAAI
+На вході — колонки однакової довжини, на виході — NumPy-масиви тих самих полів,
+що повертає Country.calc з rules.py. Country.calc_batch виконує ті самі правила
+в тому ж порядку операцій, тож результати збігаються побітово.
+"""
+
+import numpy as np
+
+import tariffs
+from rules import default_rules
+
+
+def auction_fee_batch(price_usd):
+    """Векторна версія get_auction_fee"""
+    return tariffs.AUCTION_FEES.lookup_array(price_usd).astype(float)
+
+
+RESULT_FIELDS = ("auction_fee", "customs_usd", "duty_local", "excise_local", "vat_local",
+                 "total_customs", "logistics_local", "total_local", "total_usd")
+
+
+def quote_batch(country, car_price, auction_fee, delivery_usa, sea_delivery,
+                engine_cc, fuel_type, car_age, rates=None, rules=None):
+    """
+    Розрахунок для масиву лотів. auction_fee = 0 — збір за таблицею Copart/IAAI.
+    rates — dict курсів зі знімка (RateSnapshot.rates), за замовчуванням tariffs.RATES.
+    rules — TariffRules (RulesProvider.current()), за замовчуванням правила з репозиторію.
+    Повертає dict полів RESULT_FIELDS (масиви float64) у валюті країни кожного рядка.
+    """
+    rates = rates or tariffs.RATES
+    rules = rules or default_rules()
+    country = np.asarray(country)
+    fuel_type = np.asarray(fuel_type)
+    car_price = np.asarray(car_price, dtype=float)
+    auction_fee = np.asarray(auction_fee, dtype=float)
+    engine_cc = np.asarray(engine_cc)
+    car_age = np.asarray(car_age)
+
+    auction_fee = np.where(auction_fee == 0, auction_fee_batch(car_price), auction_fee)
+    customs_usd = car_price + auction_fee + np.asarray(delivery_usa, dtype=float) \
+        + np.asarray(sea_delivery, dtype=float)
+
+    out = {name: np.full(len(car_price), np.nan) for name in RESULT_FIELDS}
+    out["auction_fee"] = auction_fee
+    out["customs_usd"] = customs_usd
+    for name, calc in rules.countries.items():
+        mask = country == name
+        if not mask.any():
+            continue
+        r = calc.rate(rates)
+        cu = customs_usd[mask]
+        duty, excise, vat, total = calc.calc_batch(cu, engine_cc[mask], fuel_type[mask], car_age[mask], r)
+        logistics = cu * r["usd"]
+        total_local = logistics + total
+        out["duty_local"][mask] = duty
+        out["excise_local"][mask] = excise
+        out["vat_local"][mask] = vat
+        out["total_customs"][mask] = total
+        out["logistics_local"][mask] = logistics
+        out["total_local"][mask] = total_local
+        out["total_usd"][mask] = total_local / r["usd"]
+    return out
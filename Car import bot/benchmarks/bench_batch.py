@@ -0,0 +1,131 @@
+"""
+Пакетний розрахунок проти скалярного Country.calc: перевірка побітового збігу і пропускна здатність
+Обидва — ще й проти golden_tariffs.json: еталонних сум і приміток колишніх tariffs.calc_*
+(межі таблиць: об'єм 1500/1501/2000/2001/3000, вік 2/3/5/8, усі пальні й країни).
+Правка tariff_rules.json, що змінює суми, тут і впаде — еталон оновлюється лише свідомо.
+Запуск: python benchmarks/bench_batch.py [кількість рядків]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from batch import quote_batch, RESULT_FIELDS
+from rules import default_rules
+from tariffs import RATES, get_auction_fee
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_tariffs.json")
+GOLDEN_AMOUNTS = ("duty_local", "excise_local", "vat_local", "total_customs")
+GOLDEN_NOTES = ("duty_note", "excise_note", "vat_note", "currency")
+
+# Межі таблиць теж потрапляють у вибірку, щоб перевірити <= / < на краях
+ENGINE_CC = [0, 999, 1000, 1001, 1500, 1998, 2000, 2001, 2500, 2999, 3000, 3500, 4500, 6200, 99999, 120000]
+CAR_AGE = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 15, 30]
+PRICES = [50, 100, 101, 499, 500, 8500, 9999, 10000, 99999, 100000, 250000]
+
+
+def make_rows(n, seed=42):
+    rnd = random.Random(seed)
+    countries = list(default_rules().countries)
+    fuels = ["gasoline", "diesel", "hybrid", "electric"]
+    cols = {k: [] for k in ("country", "car_price", "auction_fee", "delivery_usa",
+                            "sea_delivery", "engine_cc", "fuel_type", "car_age")}
+    for _ in range(n):
+        cols["country"].append(rnd.choice(countries))
+        cols["car_price"].append(rnd.choice(PRICES) if rnd.random() < 0.2 else round(rnd.uniform(300, 60000), 2))
+        cols["auction_fee"].append(0.0 if rnd.random() < 0.7 else float(rnd.randint(50, 3000)))
+        cols["delivery_usa"].append(float(rnd.randint(150, 1500)))
+        cols["sea_delivery"].append(float(rnd.randint(800, 2000)))
+        cols["engine_cc"].append(rnd.choice(ENGINE_CC) if rnd.random() < 0.3 else rnd.randint(900, 6500))
+        cols["fuel_type"].append(rnd.choice(fuels))
+        cols["car_age"].append(rnd.choice(CAR_AGE))
+    return cols
+
+
+def scalar(cols):
+    rules = default_rules()
+    out = {name: [] for name in RESULT_FIELDS}
+    for i in range(len(cols["country"])):
+        price = cols["car_price"][i]
+        fee = cols["auction_fee"][i] or get_auction_fee(price)
+        customs_usd = price + fee + cols["delivery_usa"][i] + cols["sea_delivery"][i]
+        calc = rules[cols["country"][i]]
+        rate = calc.rate(RATES)
+        c = calc.calc(customs_usd, cols["engine_cc"][i], cols["fuel_type"][i], cols["car_age"][i])
+        logistics = customs_usd * rate["usd"]
+        total_local = logistics + c["total_customs"]
+        for name, value in (("auction_fee", fee), ("customs_usd", customs_usd),
+                            ("duty_local", c["duty_local"]), ("excise_local", c["excise_local"]),
+                            ("vat_local", c["vat_local"]), ("total_customs", c["total_customs"]),
+                            ("logistics_local", logistics), ("total_local", total_local),
+                            ("total_usd", total_local / rate["usd"])):
+            out[name].append(value)
+    return out
+
+
+def check_golden():
+    """Кількість розбіжностей Country.calc і calc_batch з еталоном"""
+    rules = default_rules()
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        golden = json.load(f)
+    cases = [dict(zip(golden["fields"], row)) for row in golden["cases"]]
+    mismatched = 0
+    for case in cases:
+        got = rules[case["country"]].calc(case["customs_usd"], case["engine_cc"], case["fuel_type"], case["car_age"])
+        bad = [k for k in GOLDEN_AMOUNTS + GOLDEN_NOTES if got[k] != case[k]]
+        if bad:
+            mismatched += 1
+            if mismatched <= 5:
+                print(f"❌ calc {case['country']} {case['engine_cc']} см³ {case['fuel_type']} {case['car_age']} р.: "
+                      + ", ".join(f"{k} {got[k]!r} != {case[k]!r}" for k in bad))
+    for country in rules.countries:
+        rows = [case for case in cases if case["country"] == country]
+        arrays = [np.asarray([case[k] for case in rows]) for k in ("customs_usd", "engine_cc", "fuel_type", "car_age")]
+        results = rules[country].calc_batch(*arrays, rules[country].rate(RATES))
+        for name, values in zip(GOLDEN_AMOUNTS, results):
+            bad = np.flatnonzero(np.asarray([case[name] for case in rows], dtype=float) != values)
+            mismatched += len(bad)
+            if len(bad):
+                print(f"❌ calc_batch {country} {name}: {len(bad)} розбіжностей")
+    print(f"Еталон колишніх calc_*: {len(cases)} випадків — "
+          + ("✅ збігаються" if not mismatched else f"❌ розбіжностей: {mismatched}"))
+    return mismatched
+
+
+def main(n):
+    golden_mismatched = check_golden()
+    cols = make_rows(n)
+
+    t0 = time.perf_counter()
+    ref = scalar(cols)
+    t_scalar = time.perf_counter() - t0
+
+    # Вивантаження лотів читаються одразу в колонки — конвертацію не міряємо
+    arrays = {k: np.asarray(v) for k, v in cols.items()}
+    t0 = time.perf_counter()
+    res = quote_batch(**arrays)
+    t_batch = time.perf_counter() - t0
+
+    mismatched = 0
+    for name in RESULT_FIELDS:
+        bad = np.flatnonzero(np.asarray(ref[name], dtype=float) != res[name])
+        if len(bad):
+            mismatched += len(bad)
+            i = bad[0]
+            print(f"❌ {name}: {len(bad)} розбіжностей, напр. рядок {i}: "
+                  f"{ref[name][i]!r} != {res[name][i]!r}")
+    print(f"Рядків: {n:,}")
+    print(f"Скалярно: {t_scalar:8.3f} с  ({n / t_scalar:12,.0f} рядків/с)")
+    print(f"Пакетно:  {t_batch:8.3f} с  ({n / t_batch:12,.0f} рядків/с)  x{t_scalar / t_batch:.1f}")
+    print("✅ Результати збігаються побітово" if not mismatched else f"❌ Розбіжностей: {mismatched}")
+    return 1 if mismatched or golden_mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
@@ -0,0 +1,115 @@
+"""
+Мікробенчмарк таблиць ставок: попередні реалізації (список будується на кожен виклик,
+лінійний пошук) проти Brackets (bisect) і NumPy searchsorted для масивів.
+Запуск: python benchmarks/bench_brackets.py
+"""
+
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import tariffs
+from rules import default_rules
+
+
+# ----- попередні версії (до Brackets) -----
+def legacy_get_auction_fee(price_usd):
+    table = [
+        (100, 1), (499, 89), (999, 129), (1499, 179), (1999, 229),
+        (2999, 279), (3999, 329), (4999, 379), (5999, 429), (6999, 479),
+        (7999, 529), (8999, 579), (9999, 629), (14999, 729), (19999, 829),
+        (29999, 979), (49999, 1279), (74999, 1579), (99999, 1879),
+    ]
+    for limit, fee in table:
+        if price_usd <= limit:
+            return fee
+    return 2179
+
+
+def legacy_ua_excise_rate(engine_cc, car_age):
+    exc_tbl = [
+        (1500,  (0.012, 0.024, 0.048, 0.072)),
+        (2000,  (0.024, 0.048, 0.096, 0.144)),
+        (2500,  (0.048, 0.096, 0.144, 0.216)),
+        (3000,  (0.072, 0.144, 0.216, 0.288)),
+        (3500,  (0.096, 0.192, 0.288, 0.384)),
+        (4500,  (0.144, 0.288, 0.432, 0.576)),
+        (99999, (0.192, 0.384, 0.576, 0.768)),
+    ]
+    ai = 0 if car_age <= 3 else (1 if car_age <= 5 else (2 if car_age <= 8 else 3))
+    er = 0.192
+    for lim, rates in exc_tbl:
+        if engine_cc <= lim:
+            er = rates[ai]; break
+    return er
+
+
+def legacy_ge_excise_rate(engine_cc):
+    excise_usd_map = [
+        (1000,  0.05), (1500,  0.10), (2000,  0.20),
+        (2500,  0.35), (3000,  0.50), (3500,  0.75), (99999, 1.00),
+    ]
+    base_rate = 0.20
+    for lim, rate in excise_usd_map:
+        if engine_cc <= lim:
+            base_rate = rate; break
+    return base_rate
+
+
+# Таблиці з tariff_rules.json — ті самі Brackets, що й у скомпільованих правилах
+_UA_EXCISE = default_rules()["ukraine"].tables["excise_rate"]
+UA_EXCISE = _UA_EXCISE.brackets.lookup
+UA_AGE_INDEX = _UA_EXCISE.columns.index
+GE_EXCISE_USD = default_rules()["georgia"].tables["base_rate"].brackets
+
+
+def ua_excise_rate(engine_cc, car_age):
+    return UA_EXCISE(engine_cc)[UA_AGE_INDEX(car_age)]
+
+
+def bench(label, fn, args, number):
+    t = timeit.timeit(lambda: [fn(*a) for a in args], number=number)
+    per_call = t / (number * len(args)) * 1e9
+    print(f"  {label:<34} {per_call:8.1f} нс/виклик")
+    return per_call
+
+
+def main():
+    rnd = random.Random(1)
+    prices = [(rnd.uniform(0, 150_000),) for _ in range(10_000)]
+    cc_age = [(rnd.randint(0, 120_000), rnd.randint(0, 20)) for _ in range(10_000)]
+    ccs = [(cc,) for cc, _ in cc_age]
+
+    # Спершу — збіг результатів
+    assert all(legacy_get_auction_fee(*a) == tariffs.get_auction_fee(*a) for a in prices)
+    assert all(legacy_ua_excise_rate(*a) == ua_excise_rate(*a) for a in cc_age)
+    assert all(legacy_ge_excise_rate(*a) == GE_EXCISE_USD.lookup(*a) for a in ccs)
+
+    print("get_auction_fee:")
+    old = bench("список + лінійний пошук", legacy_get_auction_fee, prices, 20)
+    new = bench("Brackets (bisect)", tariffs.get_auction_fee, prices, 20)
+    print(f"  прискорення x{old / new:.1f}")
+
+    print("Україна, акциз EUR/см³:")
+    old = bench("список + лінійний пошук", legacy_ua_excise_rate, cc_age, 20)
+    new = bench("Brackets (bisect)", ua_excise_rate, cc_age, 20)
+    print(f"  прискорення x{old / new:.1f}")
+
+    print("Грузія, акциз USD/см³:")
+    old = bench("список + лінійний пошук", legacy_ge_excise_rate, ccs, 20)
+    new = bench("Brackets (bisect)", GE_EXCISE_USD.lookup, ccs, 20)
+    print(f"  прискорення x{old / new:.1f}")
+
+    arr = np.array([p for p, in prices] * 100)
+    assert (tariffs.AUCTION_FEES.lookup_array(arr[:10_000]) == [tariffs.get_auction_fee(p) for p, in prices]).all()
+    t = timeit.timeit(lambda: tariffs.AUCTION_FEES.lookup_array(arr), number=20) / 20
+    print(f"get_auction_fee, масив {len(arr):,}: {t / len(arr) * 1e9:.1f} нс/елемент (searchsorted)")
+
+
+if __name__ == "__main__":
+    main()
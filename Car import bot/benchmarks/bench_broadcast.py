@@ -0,0 +1,186 @@
+"""
+Розсилка адміністратора на тисячі чатів поруч зі звичайними розрахунками
+Список чатів засівається в broadcast.db, частина з них «заблокувала бота» (фейковий Telegram
+відповідає 403). Адміністратор запускає /broadcast, а користувачі тим часом рахують /q.
+Перевіряється: кожен доступний чат отримав розсилку рівно один раз (і після SIGTERM посеред неї —
+--restart), заблоковані вибули зі списку; швидкість розсилки відносно ліміту; затримка /q
+до і під час розсилки.
+Запуск: python benchmarks/bench_broadcast.py [чатів] [--rate 500] [--restart] [--max-rps 0]
+"""
+
+import os
+import sys
+import time
+import random
+import signal
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_load import BOT_DIR, ADMIN_CHAT_ID, FIRST_CHAT_ID, STARTUP_TIMEOUT, free_port, percentile
+from fake_telegram import FakeTelegram
+from broadcast import BroadcastStore
+
+FIRST_RECIPIENT = 10_000_000  # чати розсилки — окремо від користувачів, що рахують
+TEXT = "📣 Нові ставки мита з 1 числа — перерахуйте своє авто: /start"
+QUOTE = "/q UA 8500 0 400 1200 1998 gas 2019"
+
+
+async def wait_started(fake, bot, log_path, calls):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while fake.calls["getUpdates"] <= calls:
+        if bot.poll() is not None or time.monotonic() > deadline:
+            with open(log_path) as f:
+                sys.exit("❌ Бот не запустився:\n" + f.read()[-3000:])
+        await asyncio.sleep(0.05)
+
+
+async def reply(fake, chat_id, timeout=30):
+    """Наступна відповідь бота, крім повідомлень розсилки"""
+    while True:
+        method, params = await fake.wait_reply(chat_id, timeout)
+        if params.get("text") != TEXT:
+            return method, params
+
+
+async def quote_users(fake, users, think, latencies, until):
+    async def user(chat_id):
+        while not until.is_set():
+            t0 = time.perf_counter()
+            await fake.push_message(chat_id, QUOTE)
+            await reply(fake, chat_id)
+            latencies.append(time.perf_counter() - t0)
+            await asyncio.sleep(think)
+    await asyncio.gather(*(user(FIRST_CHAT_ID + i) for i in range(users)))
+
+
+def progress(db_path):
+    """(всі шарди пройдено, оброблено, сек від запуску до останнього шарда)"""
+    with sqlite3.connect(db_path) as db:
+        done, processed, last = db.execute(
+            "SELECT COUNT(*) > 0 AND COUNT(done_at) = COUNT(*), COALESCE(SUM(sent + blocked + failed), 0), "
+            "MAX(done_at) FROM campaign_shards WHERE campaign_id = 1").fetchone()
+        started = db.execute("SELECT started_at FROM campaigns WHERE id = 1").fetchone()
+    return bool(done), processed, (last - started[0]) if done else None
+
+
+def latency_line(label, values):
+    values = sorted(values)
+    return (f"  {label:<22} n={len(values):>5}  p50 {percentile(values, .5) * 1000:7.1f} мс  "
+            f"p95 {percentile(values, .95) * 1000:7.1f} мс  p99 {percentile(values, .99) * 1000:7.1f} мс")
+
+
+async def run(args):
+    rnd = random.Random(args.seed)
+    fake = FakeTelegram(latency=args.latency, max_rps=args.max_rps)
+    api_port = free_port()
+    await fake.start(port=api_port)
+    recipients = list(range(FIRST_RECIPIENT, FIRST_RECIPIENT + args.chats))
+    fake.blocked.update(rnd.sample(recipients, int(args.chats * args.blocked)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "broadcast.db")
+        store = BroadcastStore(db_path)
+        store.add_many(recipients)
+        store.close()
+        env = dict(os.environ, BOT_TOKEN="1:test", ADMIN_CHAT_ID=str(ADMIN_CHAT_ID), BOT_MODE="polling",
+                   TELEGRAM_API_URL=f"http://127.0.0.1:{api_port}", DATA_DIR=tmp, RATES_SOURCE="static",
+                   SEND_GLOBAL_RATE=str(args.rate), SEND_CHAT_RATE="1000")
+        log_path = os.path.join(tmp, "bot.log")
+        procs = []
+
+        def launch():
+            with open(log_path, "a") as log:
+                procs.append(subprocess.Popen([sys.executable, "main.py"], cwd=BOT_DIR,
+                                              env=dict(env, PORT=str(free_port())),
+                                              stdout=log, stderr=subprocess.STDOUT))
+            return procs[-1]
+
+        try:
+            await wait_started(fake, launch(), log_path, 0)
+            baseline, during = [], []
+            stop = asyncio.Event()
+            users = asyncio.create_task(quote_users(fake, args.users, args.think, baseline, stop))
+            await asyncio.sleep(args.warmup)
+            stop.set()
+            await users
+
+            await fake.push_message(ADMIN_CHAT_ID, "/broadcast " + TEXT)
+            await reply(fake, ADMIN_CHAT_ID)  # попередній перегляд (текст розсилки) reply пропускає
+            await fake.push_callback(ADMIN_CHAT_ID, "bcast:go:1", fake.next_message_id[ADMIN_CHAT_ID] - 1)
+            t0 = time.perf_counter()
+            stop = asyncio.Event()
+            users = asyncio.create_task(quote_users(fake, args.users, args.think, during, stop))
+
+            restart_s = None
+            done = False
+            while not done:
+                await asyncio.sleep(0.2)
+                done, processed, elapsed = await asyncio.to_thread(progress, db_path)
+                if args.restart and restart_s is None and processed >= args.chats // 2:
+                    old = procs[-1]
+                    old.send_signal(signal.SIGTERM)
+                    t1 = time.perf_counter()
+                    await asyncio.to_thread(old.wait)
+                    restart_s = time.perf_counter() - t1
+                    calls = fake.calls["getUpdates"]
+                    await wait_started(fake, launch(), log_path, calls)
+                if time.perf_counter() - t0 > args.timeout:
+                    sys.exit(f"❌ Розсилка не завершилась за {args.timeout} с: оброблено {processed:,}")
+            stop.set()
+            await users
+        finally:
+            for proc in procs:
+                proc.terminate()
+                await asyncio.to_thread(proc.wait)
+            await fake.stop()
+
+        received = {chat_id: sum(1 for method, params in fake.sent.get(chat_id, ())
+                                 if method == "sendMessage" and params.get("text") == TEXT)
+                    for chat_id in recipients}
+        with sqlite3.connect(db_path) as db:
+            pruned = {row[0] for row in db.execute("SELECT chat_id FROM chats WHERE blocked_at IS NOT NULL")}
+
+    reachable = [chat_id for chat_id in recipients if chat_id not in fake.blocked]
+    duplicates = sum(1 for chat_id in reachable if received[chat_id] > 1)
+    missing = sum(1 for chat_id in reachable if received[chat_id] == 0)
+    unpruned = len(fake.blocked - pruned)
+    ceiling = min(args.rate, args.max_rps or args.rate)
+    print(f"Розсилка на {processed:,} чатів ({len(fake.blocked):,} заблокували бота): {elapsed:.1f} с, "
+          f"{processed / elapsed:,.0f} повідомл./с при ліміті {ceiling:,.0f}/с "
+          f"({processed / elapsed / ceiling:.0%})")
+    if restart_s is not None:
+        print(f"SIGTERM посеред розсилки: старий процес зупинився за {restart_s:.1f} с")
+    if args.max_rps:
+        print(f"Відповідей 429 від Telegram: {fake.rejected_429:,}")
+    print(f"/q від {args.users} користувачів:")
+    print(latency_line("без розсилки", baseline))
+    print(latency_line("під час розсилки", during))
+    print(f"Дублікатів: {duplicates}, не отримали: {missing}, "
+          f"заблоковані вибули зі списку: {len(fake.blocked) - unpruned:,}/{len(fake.blocked):,}")
+    if duplicates or missing or unpruned:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Розсилка через фейковий Telegram API")
+    parser.add_argument("chats", nargs="?", type=int, default=20_000)
+    parser.add_argument("--rate", type=float, default=500, help="SEND_GLOBAL_RATE бота, повідомлень/с")
+    parser.add_argument("--max-rps", type=int, default=0, help="ліміт фейкового Telegram, далі — 429")
+    parser.add_argument("--latency", type=float, default=0.02, help="затримка кожного виклику Bot API, сек")
+    parser.add_argument("--blocked", type=float, default=0.05, help="частка чатів, що заблокували бота")
+    parser.add_argument("--users", type=int, default=20, help="користувачів, що рахують /q паралельно")
+    parser.add_argument("--think", type=float, default=0.5, help="пауза користувача між розрахунками, сек")
+    parser.add_argument("--warmup", type=float, default=5, help="сек розрахунків без розсилки (база)")
+    parser.add_argument("--restart", action="store_true", help="SIGTERM і новий процес на половині розсилки")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Масовий розрахунок файлу лотів: пропускна здатність і пік пам'яті
+Пік пам'яті не має рости з розміром файлу — рядки йдуть потоком, пачками по bulk.CHUNK_SIZE.
+Запуск: python benchmarks/bench_bulk.py [кількість рядків] [csv|xlsx]
+"""
+
+import os
+import sys
+import csv
+import time
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_batch import make_rows
+import bulk
+
+COLUMNS = ("country", "car_price", "auction_fee", "delivery_usa",
+           "sea_delivery", "engine_cc", "fuel_type", "car_age")
+
+
+def write_lots(path, n, fmt):
+    cols = make_rows(n)
+    rows = zip(*(cols[c] for c in COLUMNS))
+    if fmt == "xlsx":
+        import openpyxl
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("lots")
+        ws.append(COLUMNS)
+        for row in rows:
+            ws.append(row)
+        wb.save(path)
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+
+
+def run(n, fmt, tmp):
+    src = os.path.join(tmp, f"lots_{n}.{fmt}")
+    dst = os.path.join(tmp, f"priced_{n}.{fmt}")
+    write_lots(src, n, fmt)
+    t0 = time.perf_counter()
+    with open(src, "rb") as f:
+        stats = bulk.price_file(f, dst, fmt)
+    elapsed = time.perf_counter() - t0
+    # Пам'ять — окремим проходом: tracemalloc сповільнює в рази
+    tracemalloc.start()
+    with open(src, "rb") as f:
+        bulk.price_file(f, dst, fmt)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{n:>9,} рядків: {elapsed:7.2f} с  ({n / elapsed:10,.0f} рядків/с)  "
+          f"пік пам'яті {peak / 2**20:6.1f} МБ  "
+          f"файл {os.path.getsize(src) / 2**20:5.1f} → {os.path.getsize(dst) / 2**20:5.1f} МБ  "
+          f"помилок {stats['errors']}")
+    return stats
+
+
+def main(n, fmt):
+    with tempfile.TemporaryDirectory() as tmp:
+        # Малий файл для порівняння піку пам'яті
+        run(n // 10, fmt, tmp)
+        stats = run(n, fmt, tmp)
+    return 0 if stats["priced"] == n else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000,
+                  sys.argv[2] if len(sys.argv) > 2 else "csv"))
@@ -0,0 +1,77 @@
+"""
+Журнал розрахунків: швидкість запису пачками і час запитів /stats та /history на мільйонах рядків
+Запуск: python benchmarks/bench_history.py [кількість рядків]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import history
+from rules import default_rules
+
+DAYS = 90
+CHATS = 50_000
+
+
+def fill(log, n, seed=7):
+    rnd = random.Random(seed)
+    rules = default_rules()
+    countries = list(rules.countries)
+    fuels = ["gasoline", "diesel", "hybrid", "electric"]
+    now = time.time()
+    t0 = time.perf_counter()
+    for i in range(n):
+        country = rnd.choice(countries)
+        price = round(rnd.uniform(500, 60_000), 2)
+        total = price * rnd.uniform(1.3, 1.9)
+        c = {"duty_local": 1.0, "excise_local": 1.0, "vat_local": 1.0, "total_customs": 3.0,
+             "total_local": total * 41.5, "total_usd": total, "rates_version": 1, "rules_version": rules.version}
+        inputs = (country, price, 0.0, 400.0, 1200.0, rnd.randint(900, 4000), rnd.choice(fuels), rnd.randint(0, 20))
+        # Час створення — рівномірно за DAYS днів (у житті він зростає; тут — гірший випадок для індексу)
+        log.record(rnd.randrange(CHATS), inputs, c, rules[country].currency, {"usd": 41.5, "eur": 44.5},
+                   created_at=now - rnd.uniform(0, DAYS * 86400))
+        if log.pending >= log.batch_size:
+            log.flush()
+    log.flush()
+    return time.perf_counter() - t0
+
+
+def timed(label, fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    print(f"  {label:<40} {(time.perf_counter() - t0) * 1000:8.1f} мс")
+    return result
+
+
+def main(n):
+    with tempfile.TemporaryDirectory() as tmp:
+        log = history.QuoteLog(os.path.join(tmp, "quotes.db"))
+        elapsed = fill(log, n)
+        print(f"Записано {n:,} розрахунків за {elapsed:.1f} с ({n / elapsed:,.0f} записів/с, "
+              f"файл {os.path.getsize(os.path.join(tmp, 'quotes.db')) / 2**20:.0f} МБ)")
+        log._db.execute("ANALYZE")
+
+        now = time.time()
+        print("Запити:")
+        timed("/stats 7d by country", log.stats, now - 7 * 86400, "country")
+        timed("/stats 30d by band", log.stats, now - 30 * 86400, "band")
+        timed("/stats 7d ua by fuel", log.stats, now - 7 * 86400, "fuel", "ukraine")
+        timed("/stats 30d 10-20k by country", log.stats, now - 30 * 86400, "country", None, (2, 3))
+        timed("/stats all by day", log.stats, 0, "day")
+        rows = timed("/history <chat_id>", log.history, 123, 10)
+        timed("get(#id)", log.get, rows[0]["id"])
+
+        plan = log._db.execute("EXPLAIN QUERY PLAN SELECT country, COUNT(*), AVG(total_usd) FROM quotes "
+                               "INDEXED BY quotes_time "
+                               "WHERE created_at >= ? GROUP BY country", (now - 7 * 86400,)).fetchall()
+        print("План /stats 7d:", "; ".join(row[-1] for row in plan))
+        log.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000)
@@ -0,0 +1,273 @@
+"""
+Навантаження на один процес main.py без мережі (придатно для CI)
+Піднімає fake_telegram.py замість api.telegram.org, запускає бота в режимі polling
+і веде N імітованих користувачів усім діалогом:
+/start → країна (кнопка) → дані авто одним повідомленням → «що, якби» → заявка → контакт.
+Звіт: p50/p95/p99 кожного кроку (від апдейту до відповіді бота), пропускна здатність,
+викликів Bot API на розрахунок і на діалог, ріст пам'яті процесу бота на одну сесію.
+Ліміти надсилання за замовчуванням зняті — міряємо хендлери, а не SendScheduler
+(--telegram-limits повертає 30/с на бота і 1/с на чат).
+Запуск: python benchmarks/bench_load.py [користувачів] [--concurrency 100] [--store memory|sqlite]
+                                        [--json звіт.json] [--max-p95 мс]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import aiohttp
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from fake_telegram import FakeTelegram
+from rules import default_rules
+
+ADMIN_CHAT_ID = 1
+FIRST_CHAT_ID = 100_000
+STARTUP_TIMEOUT = 30  # сек на запуск бота до першого getUpdates
+REPLY_TIMEOUT = 30    # сек на відповідь одного кроку; довше — користувач «загубився»
+WARMUP_USERS = 50
+RESULT_MARK = "РОЗРАХУНОК"  # текст результату: виклики до нього включно — «на один розрахунок»
+
+
+def user_steps(rnd, countries):
+    """
+    (крок, тип апдейту, дані, що має бути у відповіді) — випадкові, щоб не влучати лише в кеш.
+    tap — кнопка, на яку бот лише відповідає спливаючим текстом (answerCallbackQuery), без повідомлення.
+    Дані авто — одним повідомленням: ціна, збір (0 — за таблицею), доставка США, море, об'єм, пальне, рік
+    """
+    car = " ".join(map(str, (
+        rnd.randrange(1_000, 60_000, 50), 0, rnd.randrange(300, 900, 50), rnd.randrange(900, 1600, 50),
+        rnd.randrange(1_000, 4_000, 100), rnd.choice(["gasoline", "diesel", "hybrid", "electric"]),
+        rnd.randint(2008, 2025))))
+    return [
+        ("start",        "text",     "/start",                                   "країну"),
+        ("country",      "tap",      "country:" + rnd.choice(countries),          "✅"),
+        ("car",          "text",     car,                                        RESULT_MARK),
+        ("whatif",       "callback", "whatif",                                   "ЩО, ЯКБИ"),
+        ("request",      "callback", "request",                                  "номер телефону"),
+        ("contact",      "contact",  None,                                       "Заявку надіслано"),
+    ]
+
+
+def api_calls(fake, chat_ids):
+    """
+    Середня кількість викликів Bot API на користувача за методами: до результату розрахунку включно
+    і за весь діалог (разом з answerCallbackQuery)
+    """
+    quote, dialog = {}, {}
+    for chat_id in chat_ids:
+        calls = fake.sent.get(chat_id, [])
+        end = next((n + 1 for n, (_, params) in enumerate(calls) if RESULT_MARK in params.get("text", "")),
+                   len(calls))
+        for n, (method, _) in enumerate(calls):
+            dialog[method] = dialog.get(method, 0) + 1
+            if n < end:
+                quote[method] = quote.get(method, 0) + 1
+    users = max(1, len(chat_ids))
+    return {name: {method: round(count / users, 2) for method, count in sorted(counts.items())}
+            for name, counts in (("quote", quote), ("dialog", dialog))}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid):
+    """Резидентна пам'ять процесу (Linux /proc), МБ; None — якщо недоступно"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+async def sessions_active(port):
+    """Сума bot_sessions_active з /metrics бота"""
+    async with aiohttp.ClientSession() as s:
+        async with s.get(f"http://127.0.0.1:{port}/metrics") as resp:
+            text = await resp.text()
+    return int(sum(float(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+                   if line.startswith("bot_sessions_active")))
+
+
+async def run_user(fake, chat_id, steps, think, latencies, errors):
+    prompt_id = 1
+    for step, kind, data, expect in steps:
+        t0 = time.perf_counter()
+        if kind == "text":
+            await fake.push_message(chat_id, data)
+        elif kind in ("callback", "tap"):
+            query_id = await fake.push_callback(chat_id, data, prompt_id)
+        else:
+            await fake.push_contact(chat_id)
+        try:
+            if kind == "tap":
+                params = await fake.wait_answer(query_id, REPLY_TIMEOUT)
+            else:
+                method, params = await fake.wait_reply(chat_id, REPLY_TIMEOUT)
+        except asyncio.TimeoutError:
+            errors[step] = errors.get(step, 0) + 1
+            return False
+        latencies[step].append(time.perf_counter() - t0)
+        if expect not in params.get("text", ""):
+            errors[step] = errors.get(step, 0) + 1
+            return False
+        if step == "start":
+            prompt_id = fake.next_message_id[chat_id] - 1  # повідомлення-майстер, яке далі редагується
+        if think:
+            await asyncio.sleep(think)
+    return True
+
+
+async def sample_rss(pid, peak):
+    while True:
+        value = rss_mb(pid)
+        if value is not None:
+            peak[0] = max(peak[0], value)
+        await asyncio.sleep(0.2)
+
+
+async def run(args):
+    rnd = random.Random(args.seed)
+    countries = list(default_rules().countries)
+    fake = FakeTelegram(latency=args.latency)
+    api_port, metrics_port = free_port(), free_port()
+    await fake.start(port=api_port)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, BOT_TOKEN="1:test", ADMIN_CHAT_ID=str(ADMIN_CHAT_ID), BOT_MODE="polling",
+                   TELEGRAM_API_URL=f"http://127.0.0.1:{api_port}", PORT=str(metrics_port),
+                   DATA_DIR=tmp, SESSION_STORE=args.store, RATES_SOURCE="static")
+        if not args.telegram_limits:
+            env.update(SEND_GLOBAL_RATE="100000", SEND_CHAT_RATE="1000")
+        log_path = os.path.join(tmp, "bot.log")
+        with open(log_path, "w") as log:
+            bot = subprocess.Popen([sys.executable, "main.py"], cwd=BOT_DIR, env=env,
+                                   stdout=log, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.monotonic() + STARTUP_TIMEOUT
+            while not fake.calls["getUpdates"]:
+                if bot.poll() is not None or time.monotonic() > deadline:
+                    with open(log_path) as f:
+                        sys.exit("❌ Бот не запустився:\n" + f.read()[-3000:])
+                await asyncio.sleep(0.05)
+
+            latencies = {step: [] for step, *_ in user_steps(rnd, countries)}
+            errors = {}
+            limit = asyncio.Semaphore(args.concurrency)
+
+            async def user(i):
+                async with limit:
+                    return await run_user(fake, FIRST_CHAT_ID + i, user_steps(rnd, countries),
+                                          args.think, latencies, errors)
+
+            # Прогрів: перші виклики заповнюють пули з'єднань, кеші й арени пам'яті — у звіт не йдуть
+            await asyncio.gather(*(user(-1 - i) for i in range(WARMUP_USERS)))
+            for values in latencies.values():
+                values.clear()
+            errors.clear()
+            rss_before = rss_mb(bot.pid)
+            active_before = await sessions_active(metrics_port)
+            peak = [rss_before or 0.0]
+            sampler = asyncio.create_task(sample_rss(bot.pid, peak))
+
+            t0 = time.perf_counter()
+            done = await asyncio.gather(*(user(i) for i in range(args.users)))
+            elapsed = time.perf_counter() - t0
+            sampler.cancel()
+
+            rss_after = rss_mb(bot.pid)
+            active = await sessions_active(metrics_port) - active_before
+            calls = api_calls(fake, [FIRST_CHAT_ID + i for i, ok in enumerate(done) if ok])
+        finally:
+            bot.terminate()
+            # Не блокуючи event loop: бот при зупинці ще звертається до фейкового Telegram
+            await asyncio.to_thread(bot.wait)
+            await fake.stop()
+
+    completed = sum(done)
+    report = {
+        "users": args.users, "completed": completed, "concurrency": args.concurrency,
+        "store": args.store, "elapsed_s": round(elapsed, 2),
+        "users_per_s": round(completed / elapsed, 1),
+        "updates_per_s": round(sum(map(len, latencies.values())) / elapsed, 1),
+        "steps": {}, "errors": errors,
+        "rss_mb": {"before": rss_before, "after": rss_after, "peak": peak[0]},
+        "sessions": active, "api_calls": calls,
+    }
+    for step, values in latencies.items():
+        values.sort()
+        report["steps"][step] = {"n": len(values), **{
+            name: round(percentile(values, q) * 1000, 1) for name, q in (("p50", .5), ("p95", .95), ("p99", .99))}}
+    if rss_before is not None and rss_after is not None and active:
+        report["rss_kb_per_session"] = round((rss_after - rss_before) * 1024 / active, 2)
+    return report
+
+
+def print_report(r):
+    print(f"Користувачів: {r['completed']:,}/{r['users']:,} за {r['elapsed_s']} с "
+          f"(паралельно {r['concurrency']}, сесії: {r['store']})")
+    print(f"Пропускна здатність: {r['users_per_s']:,} діалогів/с, {r['updates_per_s']:,} апдейтів/с")
+    print(f"\n  {'крок':<14} {'n':>7} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9}")
+    for step, s in r["steps"].items():
+        print(f"  {step:<14} {s['n']:>7} {s['p50']:>9} {s['p95']:>9} {s['p99']:>9}")
+    for name, label in (("quote", "на розрахунок"), ("dialog", "за весь діалог")):
+        calls = r["api_calls"][name]
+        print(f"\nBot API {label}: {sum(calls.values()):.1f} ("
+              + ", ".join(f"{method} {count:g}" for method, count in calls.items()) + ")", end="")
+    print()
+    mem = r["rss_mb"]
+    if mem["before"] is not None:
+        print(f"\nПам'ять бота: {mem['before']:.1f} → {mem['after']:.1f} МБ (пік {mem['peak']:.1f}), "
+              f"нових сесій {r['sessions']:,}, ≈ {r.get('rss_kb_per_session', 0)} КБ на сесію")
+    if r["errors"]:
+        print("❌ Помилки за кроками:", r["errors"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Навантажувальний тест бота через фейковий Telegram API")
+    parser.add_argument("users", nargs="?", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100, help="користувачів одночасно в діалозі")
+    parser.add_argument("--think", type=float, default=0.0, help="пауза користувача між кроками, сек")
+    parser.add_argument("--latency", type=float, default=0.0, help="затримка кожного виклику Bot API, сек")
+    parser.add_argument("--store", default="memory", choices=["memory", "sqlite"])
+    parser.add_argument("--telegram-limits", action="store_true", help="не знімати ліміти надсилання")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="зберегти звіт у файл (для порівняння між збірками)")
+    parser.add_argument("--max-p95", type=float, help="код виходу 1, якщо p95 будь-якого кроку більший, мс")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    slow = [step for step, s in report["steps"].items() if args.max_p95 and s["p95"] > args.max_p95]
+    if slow:
+        print(f"❌ p95 понад {args.max_p95} мс: {', '.join(slow)}")
+    if report["errors"] or slow:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
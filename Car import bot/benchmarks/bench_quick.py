@@ -0,0 +1,56 @@
+"""
+Розбір запиту одним рядком (quick.parse_quote): рядок → очікувані поля
+Тут і впаде зміна регулярок, що ламає «8 500», «12k» чи порядок сум; код виходу 1 — є невдалі.
+Запуск: python benchmarks/bench_quick.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quick import parse_quote
+
+# Рядок → очікувані поля (підмножина); None — має бути ValueError
+CASES = [
+    ("/q UA 8500 0 400 1200 1998 gas 2019", {"car_price": 8500, "auction_fee": 0, "delivery_usa": 400,
+                                              "sea_delivery": 1200, "engine_cc": 1998}),
+    ("poland 12k 2.0 diesel 2018", {"country": "poland", "car_price": 12000, "engine_cc": 2000,
+                                    "fuel_type": "diesel"}),
+    ("ua 8,500 2.0 gas 2019", {"car_price": 8500, "auction_fee": 0, "engine_cc": 2000}),
+    ("ua 8 500 2.0 gas 2019", {"car_price": 8500, "auction_fee": 0, "engine_cc": 2000}),
+    ("ua 8\u00a0500 2.0 gas 2019", {"car_price": 8500, "auction_fee": 0}),
+    ("ua 8\u202f500 2.0 gas 2019", {"car_price": 8500, "auction_fee": 0}),
+    ("ua 12 500 300 2.0 gas 2019", {"car_price": 12500, "auction_fee": 300}),
+    ("ua 8500 500 400 1200 2.0 gas 2019", {"car_price": 8500, "auction_fee": 500, "delivery_usa": 400,
+                                           "sea_delivery": 1200}),
+    ("ua 8 2.0 gas 2019", None),
+]
+
+
+def main():
+    failed = 0
+    for text, expected in CASES:
+        try:
+            got = parse_quote(text, year=2025)
+        except ValueError as e:
+            got = e
+        ok = (isinstance(got, ValueError) if expected is None else
+              isinstance(got, dict) and all(got[k] == v for k, v in expected.items()))
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} {text!r} → {got}")
+
+    n = 20_000
+    t0 = time.perf_counter()
+    for i in range(n):
+        parse_quote(CASES[i % 2][0], year=2025)
+    elapsed = time.perf_counter() - t0
+    print(f"\nРозбір: {n / elapsed:,.0f} рядків/с ({elapsed / n * 1e6:.1f} мкс на рядок)")
+
+    if failed:
+        sys.exit(f"❌ Невдалих випадків: {failed} з {len(CASES)}")
+
+
+if __name__ == "__main__":
+    main()
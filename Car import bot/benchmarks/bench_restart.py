@@ -0,0 +1,111 @@
+"""
+Деплой посеред діалогів: користувачі йдуть повним діалогом, а бот тим часом
+перезапускається (SIGTERM → новий процес на тому самому DATA_DIR).
+Кожен крок має отримати рівно одну відповідь (на кнопку країни — лише answerCallbackQuery):
+загублений апдейт — тайм-аут кроку, оброблений двічі — зайва відповідь
+(наступний крок прочитає не своє повідомлення).
+Запуск: python benchmarks/bench_restart.py [користувачів] [--restarts 5] [--store memory|sqlite]
+"""
+
+import os
+import sys
+import time
+import random
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_load import BOT_DIR, ADMIN_CHAT_ID, FIRST_CHAT_ID, free_port, run_user, user_steps
+from fake_telegram import FakeTelegram
+from rules import default_rules
+
+
+async def restart_loop(launch, procs, restarts, interval, downtime):
+    for _ in range(restarts):
+        await asyncio.sleep(interval)
+        old = procs[-1]
+        old.send_signal(signal.SIGTERM)
+        t0 = time.perf_counter()
+        await asyncio.to_thread(old.wait)
+        downtime.append(time.perf_counter() - t0)
+        procs.append(launch())
+
+
+async def run(args):
+    rnd = random.Random(args.seed)
+    countries = list(default_rules().countries)
+    fake = FakeTelegram(latency=args.latency)
+    api_port = free_port()
+    await fake.start(port=api_port)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, BOT_TOKEN="1:test", ADMIN_CHAT_ID=str(ADMIN_CHAT_ID), BOT_MODE="polling",
+                   TELEGRAM_API_URL=f"http://127.0.0.1:{api_port}", PORT=str(free_port()),
+                   DATA_DIR=tmp, SESSION_STORE=args.store, RATES_SOURCE="static")
+        log = open(os.path.join(tmp, "bot.log"), "w")
+
+        def launch():
+            return subprocess.Popen([sys.executable, "main.py"], cwd=BOT_DIR, env=env,
+                                    stdout=log, stderr=subprocess.STDOUT)
+
+        procs = [launch()]
+        latencies = {step: [] for step, *_ in user_steps(rnd, countries)}
+        errors, downtime = {}, []
+        limit = asyncio.Semaphore(args.concurrency)
+
+        async def user(i):
+            async with limit:
+                return await run_user(fake, FIRST_CHAT_ID + i, user_steps(rnd, countries),
+                                      args.think, latencies, errors)
+
+        t0 = time.perf_counter()
+        restarts = asyncio.create_task(restart_loop(launch, procs, args.restarts, args.interval, downtime))
+        try:
+            done = await asyncio.gather(*(user(i) for i in range(args.users)))
+            elapsed = time.perf_counter() - t0
+            await restarts
+        finally:
+            restarts.cancel()
+            procs[-1].terminate()
+            await asyncio.to_thread(procs[-1].wait)
+            log.close()
+            await fake.stop()
+    # Кнопка, на яку бот лише відповідає (tap), повідомлень не дає
+    taps = {step for step, kind, *_ in user_steps(random.Random(), countries) if kind == "tap"}
+    steps = sum(len(values) for step, values in latencies.items() if step not in taps)
+    replies = sum(1 for i in range(args.users) for method, _ in fake.sent[FIRST_CHAT_ID + i]
+                  if method != "answerCallbackQuery")
+    return {"users": args.users, "completed": sum(done), "elapsed_s": elapsed, "restarts": len(downtime),
+            "downtime": downtime, "steps": steps, "extra_replies": replies - steps, "errors": errors,
+            "exit_codes": [p.returncode for p in procs[:-1]]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перезапуски бота посеред діалогів через фейковий Telegram API")
+    parser.add_argument("users", nargs="?", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--think", type=float, default=0.2, help="пауза користувача між кроками, сек")
+    parser.add_argument("--latency", type=float, default=0.05, help="затримка кожного виклику Bot API, сек")
+    parser.add_argument("--restarts", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=2.0, help="сек між перезапусками")
+    parser.add_argument("--store", default="sqlite", choices=["memory", "sqlite"])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    r = asyncio.run(run(args))
+    print(f"Користувачів: {r['completed']:,}/{r['users']:,} за {r['elapsed_s']:.1f} с, "
+          f"перезапусків: {r['restarts']} (коди виходу {r['exit_codes']})")
+    if r["downtime"]:
+        print(f"Зупинка старого процесу: {min(r['downtime']):.2f}–{max(r['downtime']):.2f} с")
+    print(f"Кроків з відповіддю: {r['steps']:,}, зайвих відповідей: {r['extra_replies']}")
+    if r["errors"]:
+        print("❌ Помилки за кроками:", r["errors"])
+    if r["errors"] or r["extra_replies"] or any(r["exit_codes"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Холодний старт бота: від запуску процесу до /healthz, /readyz і відповіді на перший апдейт
+Апдейт (/start) чекає у фейковому Telegram ще до запуску — як після падіння і перезапуску.
+Кожен прогін — новий процес на тому самому DATA_DIR (бази вже існують, як після рестарту).
+Запуск: python benchmarks/bench_startup.py [прогонів]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import statistics
+import subprocess
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_load import BOT_DIR, free_port
+from fake_telegram import FakeTelegram
+
+CHAT_ID = 100
+TIMEOUT = 30
+
+
+async def wait_http(session, url, t0):
+    """Секунд від t0 до першої відповіді 200 з url"""
+    while time.perf_counter() - t0 < TIMEOUT:
+        try:
+            async with session.get(url) as resp:
+                if resp.status == 200:
+                    return time.perf_counter() - t0
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.005)
+    raise TimeoutError(url)
+
+
+async def one_run(data_dir):
+    fake = FakeTelegram()
+    api_port, port = free_port(), free_port()
+    await fake.start(port=api_port)
+    await fake.push_message(CHAT_ID, "/start")
+    env = dict(os.environ, BOT_TOKEN="1:test", ADMIN_CHAT_ID="1", BOT_MODE="polling",
+               TELEGRAM_API_URL=f"http://127.0.0.1:{api_port}", PORT=str(port), DATA_DIR=data_dir)
+    t0 = time.perf_counter()
+    bot = subprocess.Popen([sys.executable, "main.py"], cwd=BOT_DIR, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        async with aiohttp.ClientSession() as session:
+            health, ready, (_, reply) = await asyncio.gather(
+                wait_http(session, f"http://127.0.0.1:{port}/healthz", t0),
+                wait_http(session, f"http://127.0.0.1:{port}/readyz", t0),
+                fake.wait_reply(CHAT_ID, TIMEOUT))
+        first = time.perf_counter() - t0
+    finally:
+        bot.terminate()
+        # Не блокуючи event loop: бот при зупинці ще звертається до фейкового Telegram
+        await asyncio.to_thread(bot.wait)
+        await fake.stop()
+    return health, ready, first
+
+
+def main(runs):
+    with tempfile.TemporaryDirectory() as data_dir:
+        results = [asyncio.run(one_run(data_dir)) for _ in range(runs)]
+    # Перший прогін створює бази — рахуємо його окремо
+    print(f"Перший запуск (порожній DATA_DIR): healthz {results[0][0] * 1000:.0f} мс, "
+          f"readyz {results[0][1] * 1000:.0f} мс, перший апдейт {results[0][2] * 1000:.0f} мс")
+    rest = results[1:] or results
+    print(f"Перезапуск, {len(rest)} прогонів (медіана / мін):")
+    for i, label in enumerate(("/healthz", "/readyz", "відповідь на /start")):
+        values = [r[i] * 1000 for r in rest]
+        print(f"  {label:<22} {statistics.median(values):7.0f} / {min(values):.0f} мс")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
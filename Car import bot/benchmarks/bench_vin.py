@@ -0,0 +1,84 @@
+"""
+Розбір VIN: компіляція довідника, відкриття індексу (mmap) і час пошуку
+Довідник — синтетичний, розміром з вибірку NHTSA vPIC (десятки тисяч шаблонів);
+VIN — з контрольною цифрою, частина влучає в довідник, частина — ні.
+Запуск: python benchmarks/bench_vin.py [записів у довіднику]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vin
+
+ALPHABET = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"
+FUELS = ["gasoline", "diesel", "hybrid", "electric"]
+QUERIES = 100_000
+
+
+def write_reference(path, n, rnd):
+    rows = []
+    for _ in range(n):
+        wmi = rnd.choice("12345JKSVWZ") + "".join(rnd.choices(ALPHABET, k=2))
+        vds = "".join(rnd.choice(ALPHABET) if rnd.random() < 0.7 else "*" for _ in range(5))
+        year = rnd.randint(2000, 2024)
+        rows.append(f"{wmi},{vds},{year},{year + rnd.randint(0, 6)},{rnd.choice(FUELS)},{rnd.randrange(900, 6000)},Model")
+    with open(path, "w") as f:
+        f.write("wmi,vds,year_from,year_to,fuel_type,engine_cc,model\n" + "\n".join(rows) + "\n")
+    return rows
+
+
+def make_vin(prefix8, rnd):
+    body = prefix8 + "0" + rnd.choice("ABCDEFGHJKLMNPRS") + "".join(rnd.choices(ALPHABET, k=7))
+    return body[:8] + vin.check_digit(body) + body[9:]
+
+
+def timed(label, n, fn, *args):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn(*args)
+    per = (time.perf_counter() - t0) / n
+    print(f"  {label:<38} {per * 1e6:8.2f} мкс")
+
+
+def main(n):
+    rnd = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        reference, index_path = os.path.join(tmp, "ref.csv"), os.path.join(tmp, "vin_index.bin")
+        rows = write_reference(reference, n, rnd)
+        t0 = time.perf_counter()
+        vin.compile_index(reference, index_path)
+        print(f"Довідник {n:,} записів: компіляція {time.perf_counter() - t0:.2f} с, "
+              f"індекс {os.path.getsize(index_path) / 2**20:.1f} МБ")
+        t0 = time.perf_counter()
+        decoder = vin.open_decoder(reference, index_path, cache_size=QUERIES)
+        print(f"Відкриття (перевірка sha1 + mmap): {(time.perf_counter() - t0) * 1000:.1f} мс")
+
+        # Половина VIN — з WMI/VDS довідника (шаблони * заповнені), половина — випадкові
+        vins = []
+        for i in range(QUERIES):
+            if i % 2:
+                wmi, vds = rows[rnd.randrange(len(rows))].split(",")[:2]
+                prefix = wmi + "".join(rnd.choice(ALPHABET) if c == "*" else c for c in vds)
+            else:
+                prefix = "".join(rnd.choices(ALPHABET, k=8))
+            vins.append(make_vin(prefix, rnd))
+        found = sum(decoder.index.lookup(v) is not None for v in vins)
+        print(f"Знайдено в довіднику: {found:,} з {QUERIES:,}")
+
+        print("Час на VIN:")
+        it = iter(vins * 2)
+        timed("index.lookup (бінарний пошук, mmap)", QUERIES, lambda: decoder.index.lookup(next(it)))
+        it = iter(vins)
+        timed("decode, перший раз (перевірки + пошук)", QUERIES, lambda: decoder.decode(next(it)))
+        it = iter(vins)
+        timed("decode, повторно (LRU-кеш)", QUERIES, lambda: decoder.decode(next(it)))
+        decoder.index.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,117 @@
+"""
+Стеження за ціною: скільки стежень перераховується після зміни курсів чи правил і за який час
+Кожен сценарій перевіряється повним перерахунком усіх стежень: жодне, що дійшло до цілі,
+не має бути пропущене індексом чутливості.
+Запуск: python benchmarks/bench_watch.py [кількість стежень]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import watchlist
+from rates import RateSnapshot
+from rules import TariffRules, DEFAULT_RULES_PATH, default_rules
+from tariffs import RATES, get_auction_fee
+
+CHATS = 50_000
+FUELS = ["gasoline", "diesel", "hybrid", "electric"]
+
+
+def fill(watches, n, snap, rules, seed=7):
+    rnd = random.Random(seed)
+    countries = list(rules.countries)
+    items = []
+    for _ in range(n):
+        price = round(rnd.uniform(500, 60_000), 2)
+        fuel = rnd.choice(FUELS)
+        inputs = (rnd.choice(countries), price, get_auction_fee(price), 400.0, 1200.0,
+                  0 if fuel == "electric" else rnd.randint(900, 4000), fuel, rnd.randint(0, 20))
+        items.append([rnd.randrange(CHATS), inputs, rnd.uniform(0.01, 0.15)])
+    # Ціль — на 1–15% нижче поточної суми, як кнопки WATCH_DROPS у боті
+    totals = watchlist.price([inputs for _, inputs, _ in items], [0] * n, snap, rules)["total"]
+    for item, total in zip(items, totals):
+        item[2] = round(float(total) * (1 - item[2]))
+    t0 = time.perf_counter()
+    for i in range(0, n, 10_000):
+        watches.add_many(items[i:i + 10_000], snap, rules)
+    return time.perf_counter() - t0
+
+
+def shifted(snap, factor, codes=None):
+    rates = {code: ({**r, "usd": r["usd"] * factor, "eur": r["eur"] * factor} if codes is None or code in codes
+                    else r) for code, r in snap.rates.items()}
+    return RateSnapshot(snap.version + 1, rates, "bench", time.time())
+
+
+def edited_rules(rules, country, vat):
+    with open(DEFAULT_RULES_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    data["version"] = rules.version + "-bench"
+    for case in data["countries"][country]["vat"]:
+        case["terms"] = ["subtotal", vat]
+    return TariffRules(data)
+
+
+def expected(watches, snap, rules):
+    """Повний перерахунок: id стежень, що дійшли до цілі, і його час"""
+    cols = ", ".join(watchlist.INPUTS)
+    rows = watches._db.execute(f"SELECT id, target, {cols} FROM watches WHERE state = 0").fetchall()
+    t0 = time.perf_counter()
+    totals = watchlist.price([row[2:] for row in rows], [row[1] for row in rows], snap, rules)["total"]
+    elapsed = time.perf_counter() - t0
+    return {row[0] for row, total in zip(rows, totals) if total <= row[1]}, len(rows), elapsed
+
+
+def scenario(watches, label, snap, rules):
+    hit, active, full_s = expected(watches, snap, rules)
+    t0 = time.perf_counter()
+    stats = watches.refresh(snap, rules)
+    elapsed = time.perf_counter() - t0
+    triggered = {row[0] for row in watches._db.execute("SELECT id FROM watches WHERE state = 1")}
+    missed = hit - triggered
+    print(f"{label}\n"
+          f"  перераховано {stats['rules'] + stats['rates']:>7,} з {active:,} "
+          f"(правила {stats['rules']:,}, курси {stats['rates']:,}), до цілі {stats['triggered']:,}\n"
+          f"  refresh {elapsed * 1000:7.1f} мс (перерахунок {stats['reprice_s'] * 1000:.1f}, "
+          f"решта {stats['candidates_s'] * 1000:.1f}); повний перерахунок {full_s * 1000:.1f} мс"
+          f"{'' if not missed else f'  ❌ ПРОПУЩЕНО {len(missed)}'}")
+    # Сповіщення «доставлені» — наступний сценарій починає з чистого стану
+    watches.mark_notified(triggered)
+    return not missed
+
+
+def main(n):
+    rules = default_rules()
+    snap = RateSnapshot(1, RATES, "static", time.time())
+    with tempfile.TemporaryDirectory() as tmp:
+        watches = watchlist.WatchList(os.path.join(tmp, "watches.db"))
+        elapsed = fill(watches, n, snap, rules)
+        print(f"Створено {n:,} стежень за {elapsed:.1f} с ({n / elapsed:,.0f}/с)\n")
+        watches._db.execute("ANALYZE")
+
+        # (сценарій, множник курсів відносно попереднього, валюти — None: усі, нові правила)
+        steps = [
+            ("Гривня зміцніла на 0.5%", 0.995, {"UAH"}, rules),
+            ("Усі валюти зміцніли ще на 3%", 0.97, None, rules),
+            ("Курси зросли на 2%", 1.02, None, rules),
+            ("Без змін (повторний refresh)", 1.0, None, rules),
+            ("ПДВ України 20% → 14%", 1.0, None, edited_rules(rules, "ukraine", 0.14)),
+        ]
+        ok = True
+        for label, factor, codes, rules in steps:
+            if factor != 1.0:
+                snap = shifted(snap, factor, codes)
+            ok = scenario(watches, label, snap, rules) and ok
+        print(f"\nСтан: {watches.counts()}")
+        if not ok:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,55 @@
+"""
+Таблиці ставок виду «до межі включно → значення»
+Будуються один раз при імпорті; пошук — bisect за O(log n),
+для масивів — numpy.searchsorted з тією самою семантикою.
+"""
+
+from bisect import bisect_left
+
+
+class Brackets:
+    """
+    rows — [(межа, значення), ...] за зростанням межі.
+    Значення для x — перше, де x <= межа; якщо x більше за всі межі — default.
+    """
+    __slots__ = ("limits", "values", "_np")
+
+    def __init__(self, rows, default):
+        self.limits = tuple(lim for lim, _ in rows)
+        self.values = tuple(val for _, val in rows) + (default,)
+        if any(a >= b for a, b in zip(self.limits, self.limits[1:])):
+            raise ValueError("Межі таблиці мають строго зростати")
+        self._np = None
+
+    def index(self, x):
+        return bisect_left(self.limits, x)
+
+    def lookup(self, x):
+        return self.values[bisect_left(self.limits, x)]
+
+    # ----- NumPy (імпортується лише при першому пакетному виклику) -----
+    def _arrays(self):
+        if self._np is None:
+            import numpy as np
+            self._np = (np.asarray(self.limits, dtype=float), np.asarray(self.values))
+        return self._np
+
+    def index_array(self, x):
+        import numpy as np
+        return np.searchsorted(self._arrays()[0], x, side="left")
+
+    def lookup_array(self, x, column=None):
+        """
+        Значення для кожного елемента x. Якщо значення — кортежі (рядки таблиці),
+        column — масив номерів колонок, по одному на елемент x.
+        """
+        values = self._arrays()[1]
+        if column is None:
+            return values[self.index_array(x)]
+        return values[self.index_array(x), column]
+
+    def __len__(self):
+        return len(self.limits)
+
+    def __repr__(self):
+        return f"Brackets({list(zip(self.limits, self.values))}, default={self.values[-1]!r})"
@@ -0,0 +1,428 @@
+"""
+Розсилки адміністратора всім відомим чатам
+BroadcastStore (SQLite) — постійний список чатів і розсилки:
+  • чат потрапляє в список з першим апдейтом (буфер у пам'яті, запис пачками у фоні);
+    заблокував бота — позначка blocked_at, і розсилки його оминають, поки він не напише знову;
+  • розсилка ділиться на шарди за chat_id (як апдейти між воркерами), у кожного — свій курсор:
+    chat_id, до якого включно всі надсилання завершені. Після рестарту шард продовжує з курсора;
+  • шард бере в оренду будь-який процес (спершу — свій за номером воркера), тож розсилка
+    доходить до кінця і тоді, коли після рестарту воркерів стало менше;
+  • звітує адміністратору лише процес з орендою рядка reporter — одна репліка, без дублікатів.
+Broadcaster — фонова задача воркера: не більше concurrency надсилань одночасно через sender
+з PRIORITY_BULK (розрахунки користувачів не чекають), 429 — пауза retry_after у самому sender.
+"""
+
+import os
+import time
+import uuid
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import deque
+
+from telebot.asyncio_helper import ApiTelegramException
+
+import metrics
+
+FIRST_CURSOR = -(1 << 63)  # менше за будь-який chat_id (групи — від'ємні)
+DRAFT, RUNNING, DONE, CANCELLED = "draft", "running", "done", "cancelled"
+
+
+def is_gone(exc):
+    """Чат більше не отримає повідомлень: бота заблокували, акаунт видалено, чату немає"""
+    if not isinstance(exc, ApiTelegramException):
+        return False
+    return exc.error_code == 403 or (exc.error_code == 400 and "chat not found" in exc.description)
+
+
+class BroadcastStore:
+    def __init__(self, path, flush_interval=5.0):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.flush_interval = flush_interval
+        self._seen = {}  # chat_id -> час останнього апдейту, ще не записаний
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS chats (
+            chat_id INTEGER PRIMARY KEY, first_seen REAL, last_seen REAL, blocked_at REAL)""")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS campaigns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL, text TEXT, state TEXT,
+            total INTEGER, shards INTEGER, report_message_id INTEGER, started_at REAL, finished_at REAL)""")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS campaign_shards (
+            campaign_id INTEGER, shard INTEGER, cursor INTEGER,
+            sent INTEGER DEFAULT 0, blocked INTEGER DEFAULT 0, failed INTEGER DEFAULT 0,
+            done_at REAL, lease_until REAL DEFAULT 0, owner TEXT, PRIMARY KEY (campaign_id, shard))""")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS reporter (
+            id INTEGER PRIMARY KEY CHECK (id = 0), owner TEXT, lease_until REAL)""")
+
+    # ----- відомі чати -----
+    def seen(self, chat_id):
+        """Викликається на кожен апдейт — лише пам'ять; на диск — у run()"""
+        self._seen[chat_id] = time.time()
+
+    @property
+    def pending(self):
+        return len(self._seen)
+
+    def flush(self):
+        seen, self._seen = self._seen, {}
+        if not seen:
+            return
+        # Чат, що написав, знову отримує розсилки — навіть якщо раніше блокував бота
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO chats (chat_id, first_seen, last_seen) VALUES (?, ?, ?) "
+                "ON CONFLICT (chat_id) DO UPDATE SET last_seen = excluded.last_seen, blocked_at = NULL",
+                [(chat_id, at, at) for chat_id, at in seen.items()])
+
+    def add_many(self, chat_ids):
+        """Чати з інших джерел (журнал розрахунків) — без зміни вже відомих"""
+        now = time.time()
+        with self._lock:
+            self._db.executemany("INSERT OR IGNORE INTO chats (chat_id, first_seen, last_seen) VALUES (?, ?, ?)",
+                                 ((chat_id, now, now) for chat_id in chat_ids))
+
+    def block(self, chat_ids):
+        for chat_id in chat_ids:
+            self._seen.pop(chat_id, None)  # інакше наступний flush зняв би позначку
+        with self._lock:
+            self._db.executemany("UPDATE chats SET blocked_at = ? WHERE chat_id = ?",
+                                 [(time.time(), chat_id) for chat_id in chat_ids])
+
+    def chat_counts(self):
+        with self._lock:
+            total, blocked = self._db.execute("SELECT COUNT(*), COUNT(blocked_at) FROM chats").fetchone()
+        return {"active": total - blocked, "blocked": blocked}
+
+    def recipients(self, after, shard, shards, limit):
+        """Незаблоковані чати шарда з chat_id > after за зростанням"""
+        sql = "SELECT chat_id FROM chats WHERE chat_id > ? AND blocked_at IS NULL"
+        args = [after]
+        if shards > 1:
+            # Як WorkerPool.dispatch: Python-овий % для від'ємних chat_id — невід'ємний
+            sql += " AND ((chat_id % ?) + ?) % ? = ?"
+            args += [shards, shards, shards, shard]
+        with self._lock:
+            return [row[0] for row in self._db.execute(sql + " ORDER BY chat_id LIMIT ?", (*args, limit))]
+
+    async def run(self, seed=None):
+        """Фоновий запис буфера; seed() → chat_id — для порожнього списку при першому запуску"""
+        if seed is not None and not sum((await asyncio.to_thread(self.chat_counts)).values()):
+            await asyncio.to_thread(lambda: self.add_many(seed()))
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logging.error(f"Список чатів для розсилок не записано: {e}")
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+    # ----- розсилки -----
+    def create(self, text):
+        with self._lock:
+            return self._db.execute("INSERT INTO campaigns (created_at, text, state) VALUES (?, ?, ?)",
+                                    (time.time(), text, DRAFT)).lastrowid
+
+    def get(self, campaign_id):
+        with self._lock:
+            row = self._db.execute("SELECT id, text, state, total, report_message_id FROM campaigns WHERE id = ?",
+                                   (campaign_id,)).fetchone()
+        return None if row is None else dict(zip(("id", "text", "state", "total", "report_message_id"), row))
+
+    def running(self):
+        with self._lock:
+            row = self._db.execute("SELECT id FROM campaigns WHERE state = ? ORDER BY id LIMIT 1",
+                                   (RUNNING,)).fetchone()
+        return None if row is None else row[0]
+
+    def start(self, campaign_id, shards, report_message_id):
+        """Чернетка → розсилка на shards шардів. Кількість отримувачів або None (вже йде інша / не чернетка)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                busy = self._db.execute("SELECT 1 FROM campaigns WHERE state = ?", (RUNNING,)).fetchone()
+                state = self._db.execute("SELECT state FROM campaigns WHERE id = ?", (campaign_id,)).fetchone()
+                if busy or state is None or state[0] != DRAFT:
+                    self._db.execute("ROLLBACK")
+                    return None
+                total = self._db.execute("SELECT COUNT(*) FROM chats WHERE blocked_at IS NULL").fetchone()[0]
+                self._db.execute("UPDATE campaigns SET state = ?, total = ?, shards = ?, report_message_id = ?, "
+                                 "started_at = ? WHERE id = ?",
+                                 (RUNNING, total, shards, report_message_id, now, campaign_id))
+                self._db.executemany("INSERT INTO campaign_shards (campaign_id, shard, cursor) VALUES (?, ?, ?)",
+                                     [(campaign_id, shard, FIRST_CURSOR) for shard in range(shards)])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return total
+
+    def cancel(self, campaign_id):
+        """Чернетка чи розсилка → скасована; False — вже завершена"""
+        with self._lock:
+            cur = self._db.execute("UPDATE campaigns SET state = ?, finished_at = ? WHERE id = ? AND state IN (?, ?)",
+                                   (CANCELLED, time.time(), campaign_id, DRAFT, RUNNING))
+        return cur.rowcount > 0
+
+    def claim(self, owner, lease, preferred=0):
+        """
+        Незавершений шард без живої оренди: (campaign_id, text, cursor, shard, shards) або None.
+        Спершу — шард preferred (номер воркера: його чати й так у цьому процесі), далі — будь-який.
+        shards — з розсилки, а не з поточного WORKERS: після зміни кількості воркерів шарди ті самі.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT c.id, c.text, s.cursor, s.shard, c.shards FROM campaigns c "
+                    "JOIN campaign_shards s ON s.campaign_id = c.id "
+                    "WHERE c.state = ? AND s.done_at IS NULL AND s.lease_until <= ? "
+                    "ORDER BY c.id, s.shard != ?, s.shard LIMIT 1", (RUNNING, now, preferred)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE campaign_shards SET lease_until = ?, owner = ? "
+                                     "WHERE campaign_id = ? AND shard = ?", (now + lease, owner, row[0], row[3]))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return row
+
+    def save_progress(self, campaign_id, shard, owner, cursor, counts, lease, done=False):
+        """
+        Курсор і лічильники шарда (counts — приріст: sent, blocked, failed), подовження оренди;
+        done — шард пройдено. Повертає стан розсилки (адміністратор міг її зупинити)
+        або None — оренду вже взяв інший процес, шард треба покинути.
+        """
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE campaign_shards SET cursor = ?, sent = sent + ?, blocked = blocked + ?, failed = failed + ?, "
+                "lease_until = ?, done_at = ? WHERE campaign_id = ? AND shard = ? AND owner = ?",
+                (cursor, counts["sent"], counts["blocked"], counts["failed"], 0 if done else now + lease,
+                 now if done else None, campaign_id, shard, owner))
+            if not cur.rowcount:
+                return None
+            return self._db.execute("SELECT state FROM campaigns WHERE id = ?", (campaign_id,)).fetchone()[0]
+
+    def release(self, campaign_id, shard, owner):
+        with self._lock:
+            self._db.execute("UPDATE campaign_shards SET lease_until = 0 WHERE campaign_id = ? AND shard = ? "
+                             "AND owner = ?", (campaign_id, shard, owner))
+
+    def take_reporter(self, owner, lease):
+        """Оренда ролі звітувальника: True — вона в owner (взята щойно або подовжена)"""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO reporter (id, owner, lease_until) VALUES (0, ?, ?) ON CONFLICT (id) DO UPDATE "
+                "SET owner = excluded.owner, lease_until = excluded.lease_until "
+                "WHERE reporter.owner = excluded.owner OR reporter.lease_until <= ?", (owner, now + lease, now))
+            return self._db.execute("SELECT owner FROM reporter").fetchone()[0] == owner
+
+    def progress(self, campaign_id):
+        """Зведення за всіма шардами: total, sent, blocked, failed, shards_done, state, started_at, finished_at"""
+        with self._lock:
+            c = self._db.execute("SELECT total, shards, state, started_at, finished_at, report_message_id "
+                                 "FROM campaigns WHERE id = ?", (campaign_id,)).fetchone()
+            s = self._db.execute("SELECT COALESCE(SUM(sent), 0), COALESCE(SUM(blocked), 0), "
+                                 "COALESCE(SUM(failed), 0), COUNT(done_at) FROM campaign_shards "
+                                 "WHERE campaign_id = ?", (campaign_id,)).fetchone()
+        p = dict(zip(("total", "shards", "state", "started_at", "finished_at", "report_message_id"), c))
+        p.update(zip(("sent", "blocked", "failed", "shards_done"), s))
+        p["id"] = campaign_id
+        p["processed"] = p["sent"] + p["blocked"] + p["failed"]
+        return p
+
+    def finish(self, campaign_id):
+        """Усі шарди пройдено → розсилку завершено; True — саме цей виклик її завершив"""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE campaigns SET state = ?, finished_at = ? WHERE id = ? AND state = ? AND shards = "
+                "(SELECT COUNT(done_at) FROM campaign_shards WHERE campaign_id = ?)",
+                (DONE, time.time(), campaign_id, RUNNING, campaign_id))
+        return cur.rowcount > 0
+
+
+class Broadcaster:
+    """
+    send(chat_id, text) — корутина одного повідомлення розсилки;
+    report(progress, rate) — корутина звіту адміністратору (rate — повідомлень/с, None — фінальний).
+    """
+
+    def __init__(self, store, send, report, concurrency=30, batch_size=100, lease=60, poll=5,
+                 report_interval=15):
+        self.store = store
+        self.send = send
+        self.report = report
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.lease = lease
+        self.poll = poll  # сек між перевірками нових розсилок: notify() будить лише свій воркер
+        self.report_interval = report_interval
+        self.owner = uuid.uuid4().hex  # процес в орендах шардів і звітів
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def stop(self, timeout=None):
+        """Не брати нових отримувачів, дочекатися надсилань, що вже йдуть, і зберегти курсор"""
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def run(self, preferred=0):
+        """preferred — номер воркера: спершу він бере свій шард"""
+        await asyncio.gather(self._send_loop(preferred), self._report_loop())
+
+    async def _send_loop(self, preferred):
+        while not self._stopping:
+            self._wakeup.clear()
+            job = None
+            try:
+                job = await asyncio.to_thread(self.store.claim, self.owner, self.lease, preferred)
+                if job is not None:
+                    self._idle.clear()
+                    try:
+                        await self._send_shard(*job)
+                    finally:
+                        self._idle.set()
+            except Exception as e:
+                logging.error(f"Broadcaster: {e}")
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _send_shard(self, campaign_id, text, cursor, shard, shards):
+        slots = asyncio.Semaphore(self.concurrency)
+        order = deque()   # chat_id у порядку надсилання, ще не враховані в курсорі
+        results = {}      # chat_id -> sent | blocked | failed
+        tasks = set()
+        gone = []
+
+        async def deliver(chat_id):
+            try:
+                await self.send(chat_id, text)
+                result = "sent"
+            except Exception as e:
+                result = "blocked" if is_gone(e) else "failed"
+                if result == "failed":
+                    logging.warning(f"Розсилка #{campaign_id}: чат {chat_id} — {e}")
+            finally:
+                slots.release()
+            results[chat_id] = result
+            metrics.BROADCAST_SENT.labels(result).inc()
+
+        def fold():
+            """Курсор — до першого незавершеного надсилання; повертає приріст лічильників"""
+            nonlocal cursor
+            counts = {"sent": 0, "blocked": 0, "failed": 0}
+            while order and order[0] in results:
+                chat_id = order.popleft()
+                result = results.pop(chat_id)
+                counts[result] += 1
+                if result == "blocked":
+                    gone.append(chat_id)
+                cursor = chat_id
+            return counts
+
+        saved = time.monotonic()
+        renew = self.lease / 3  # зберігати не рідше: повільна пачка (черга sender) не втратить оренду
+
+        async def save(done=False):
+            nonlocal saved
+            counts = fold()
+            blocked, gone[:] = gone[:], []
+
+            def write():
+                self.store.block(blocked)
+                return self.store.save_progress(campaign_id, shard, self.owner, cursor, counts, self.lease, done)
+            saved = time.monotonic()
+            return await asyncio.to_thread(write)
+
+        fetched = cursor
+        state = RUNNING
+        try:
+            while state == RUNNING and not self._stopping:
+                batch = await asyncio.to_thread(self.store.recipients, fetched, shard, shards, self.batch_size)
+                if not batch:
+                    break
+                for chat_id in batch:
+                    await slots.acquire()
+                    if self._stopping:
+                        slots.release()
+                        break
+                    order.append(chat_id)
+                    task = asyncio.create_task(deliver(chat_id))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    fetched = chat_id
+                    if time.monotonic() - saved > renew:
+                        state = await save()
+                        if state != RUNNING:
+                            break
+                if state == RUNNING:
+                    state = await save()
+            while tasks:
+                await asyncio.wait(tasks, timeout=renew)
+                if tasks and state is not None:
+                    state = await save()
+            if state is None:
+                logging.warning(f"Розсилка #{campaign_id}: шард {shard} уже в іншого процесу")
+                return
+            finished = state == RUNNING and not self._stopping
+            await save(done=finished)
+            if not finished:
+                await asyncio.to_thread(self.store.release, campaign_id, shard, self.owner)
+        except asyncio.CancelledError:
+            # Примусова зупинка: зберігаємо те, що вже точно надіслано, решту шард повторить
+            counts = fold()
+            self.store.block(gone)
+            self.store.save_progress(campaign_id, shard, self.owner, cursor, counts, self.lease)
+            self.store.release(campaign_id, shard, self.owner)
+            raise
+
+    async def _report_loop(self):
+        last = None  # (campaign_id, час, оброблено) попереднього звіту — для швидкості
+        while True:
+            await asyncio.sleep(self.report_interval)
+            try:
+                # Звітує один процес на всі воркери й репліки; оренда — на кілька інтервалів
+                if not await asyncio.to_thread(self.store.take_reporter, self.owner, self.report_interval * 3):
+                    last = None
+                    continue
+                campaign_id = await asyncio.to_thread(self.store.running)
+                if campaign_id is None:
+                    last = None
+                    continue
+                if await asyncio.to_thread(self.store.finish, campaign_id):
+                    await self.report(await asyncio.to_thread(self.store.progress, campaign_id), None)
+                    last = None
+                    continue
+                p = await asyncio.to_thread(self.store.progress, campaign_id)
+                now = time.monotonic()
+                if last is not None and last[0] == campaign_id and now > last[1]:
+                    rate = (p["processed"] - last[2]) / (now - last[1])
+                else:
+                    rate = p["processed"] / max(1.0, time.time() - p["started_at"])
+                last = (campaign_id, now, p["processed"])
+                await self.report(p, rate)
+            except Exception as e:
+                logging.error(f"Звіт розсилки: {e}")
@@ -0,0 +1,208 @@
+"""
+Масовий розрахунок лотів з файлу (CSV / XLSX): на виході той самий файл + колонки розрахунку
+Рядки читаються генератором і рахуються пачками через batch.quote_batch,
+тож пам'ять не залежить від розміру файлу.
+
+Колонки (регістр неважливий, порядок довільний):
+  country, car_price, engine_cc, fuel_type, car_age або year — обов'язкові
+  auction_fee (0 або порожньо — за таблицею Copart/IAAI), delivery_usa, sea_delivery
+"""
+
+import csv
+import io
+import math
+import datetime
+
+import numpy as np
+
+from batch import quote_batch, RESULT_FIELDS
+from rules import default_rules
+from tariffs import FUEL_ALIASES
+
+CHUNK_SIZE = 5000
+
+FORMATS = {".csv": "csv", ".xlsx": "xlsx"}
+
+COLUMN_ALIASES = {
+    "country":      ("country", "країна"),
+    "car_price":    ("car_price", "price", "ціна"),
+    "auction_fee":  ("auction_fee", "fee", "аукціонний збір"),
+    "delivery_usa": ("delivery_usa", "доставка сша"),
+    "sea_delivery": ("sea_delivery", "морська доставка"),
+    "engine_cc":    ("engine_cc", "engine", "об'єм"),
+    "fuel_type":    ("fuel_type", "fuel", "пальне"),
+    "car_age":      ("car_age", "age", "вік"),
+    "year":         ("year", "рік"),
+}
+REQUIRED_COLUMNS = ("country", "car_price", "engine_cc", "fuel_type")
+
+# Префікс — щоб не плутати з вхідними колонками (auction_fee є і там, і там)
+OUTPUT_COLUMNS = ("currency", "rules_version") + tuple("calc_" + f for f in RESULT_FIELDS) + ("error",)
+
+
+def file_format(filename):
+    for ext, fmt in FORMATS.items():
+        if (filename or "").lower().endswith(ext):
+            return fmt
+    return None
+
+
+# ===== ЧИТАННЯ =====
+def read_rows(stream, fmt):
+    """Рядки файлу як списки значень (перший — заголовок)"""
+    if fmt == "xlsx":
+        import openpyxl
+        wb = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        try:
+            for row in wb.worksheets[0].iter_rows(values_only=True):
+                yield ["" if v is None else v for v in row]
+        finally:
+            wb.close()
+        return
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(text, dialect)
+
+
+def _column_index(header):
+    names = {str(h).strip().lower(): i for i, h in enumerate(header)}
+    index = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                index[field] = names[alias]
+                break
+    missing = [f for f in REQUIRED_COLUMNS if f not in index]
+    if "car_age" not in index and "year" not in index:
+        missing.append("car_age / year")
+    if missing:
+        raise ValueError(f"У файлі немає колонок: {', '.join(missing)}")
+    return index
+
+
+def _number(value, name, default=None):
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        text = str(value).strip()
+        if not text:
+            if default is None:
+                raise ValueError(f"порожнє поле {name}")
+            return default
+        try:
+            # Як і в діалозі: кома — десятковий роздільник, пробіли ігноруються
+            number = float(text.replace(",", ".").replace(" ", "").replace("\u202f", ""))
+        except ValueError:
+            raise ValueError(f"{name}: «{text}» — не число")
+    # nan / inf float() приймає, але в розрахунок вони не мають потрапити
+    if not math.isfinite(number):
+        raise ValueError(f"{name}: «{value}» — не число")
+    return number
+
+
+def parse_lot(row, index, year, aliases):
+    """
+    Нормалізує рядок файлу до аргументів quote_batch; ValueError — з поясненням для користувача.
+    aliases — назви країн з правил (TariffRules.aliases).
+    """
+    def cell(field):
+        i = index.get(field)
+        return row[i] if i is not None and i < len(row) else ""
+
+    country = aliases.get(str(cell("country")).strip().lower())
+    if country is None:
+        raise ValueError(f"невідома країна «{cell('country')}»")
+    fuel = FUEL_ALIASES.get(str(cell("fuel_type")).strip().lower())
+    if fuel is None:
+        raise ValueError(f"невідомий тип пального «{cell('fuel_type')}»")
+    price = _number(cell("car_price"), "car_price")
+    if price <= 0:
+        raise ValueError("ціна має бути більше 0")
+    engine_cc = int(_number(cell("engine_cc"), "engine_cc"))
+    if engine_cc < 0:
+        raise ValueError("від'ємний об'єм двигуна")
+    age_value = _number(cell("car_age") if "car_age" in index else cell("year"), "car_age")
+    age = (year - int(age_value)) if age_value > 1900 else int(age_value)
+    if age < 0:
+        raise ValueError("некоректний рік")
+    return (country, price, _number(cell("auction_fee"), "auction_fee", 0.0),
+            _number(cell("delivery_usa"), "delivery_usa", 0.0),
+            _number(cell("sea_delivery"), "sea_delivery", 0.0), engine_cc, fuel, age)
+
+
+# ===== РОЗРАХУНОК =====
+def _price_chunk(chunk, rates, rules):
+    """chunk — [(вихідний рядок, лот або текст помилки)]; повертає вихідні рядки з результатом"""
+    lots = [lot for _, lot in chunk if isinstance(lot, tuple)]
+    if lots:
+        res = quote_batch(*zip(*lots), rates=rates, rules=rules)
+        results = iter(zip(*(np.round(res[f], 2).tolist() for f in RESULT_FIELDS)))
+    empty = [""] * (len(OUTPUT_COLUMNS) - 1)
+    countries = rules.countries
+    out = []
+    for row, lot in chunk:
+        if isinstance(lot, tuple):
+            out.append([*row, countries[lot[0]].currency, rules.version, *next(results), ""])
+        else:
+            out.append([*row, *empty, lot])
+    return out
+
+
+def price_rows(rows, rates=None, stats=None, chunk_size=CHUNK_SIZE, max_rows=None, rules=None):
+    """
+    Генератор: рядки файлу (заголовок першим) → вихідні рядки з колонками OUTPUT_COLUMNS.
+    stats — dict, куди по ходу пишуться rows / priced / errors.
+    rules — одна версія правил на весь файл (за замовчуванням — з репозиторію).
+    """
+    stats = {} if stats is None else stats
+    rules = rules or default_rules()
+    stats.update(rows=0, priced=0, errors=0)
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        raise ValueError("Файл порожній")
+    index = _column_index(header)
+    year = datetime.datetime.now().year
+    yield list(header) + list(OUTPUT_COLUMNS)
+
+    chunk = []
+    for row in rows:
+        if not any(str(v).strip() for v in row):
+            continue
+        stats["rows"] += 1
+        if max_rows and stats["rows"] > max_rows:
+            raise ValueError(f"Забагато рядків (максимум {max_rows:,})")
+        try:
+            chunk.append((row, parse_lot(row, index, year, rules.aliases)))
+            stats["priced"] += 1
+        except ValueError as e:
+            chunk.append((row, str(e)))
+            stats["errors"] += 1
+        if len(chunk) >= chunk_size:
+            yield from _price_chunk(chunk, rates, rules)
+            chunk = []
+    if chunk:
+        yield from _price_chunk(chunk, rates, rules)
+
+
+# ===== ЗАПИС =====
+def price_file(src, dst_path, fmt, rates=None, stats=None, max_rows=None, rules=None):
+    """Читає лоти з потоку src, пише розрахований файл того ж формату в dst_path; повертає stats"""
+    stats = {} if stats is None else stats
+    rows = price_rows(read_rows(src, fmt), rates, stats, max_rows=max_rows, rules=rules)
+    if fmt == "xlsx":
+        import openpyxl
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Розрахунок")
+        for row in rows:
+            ws.append(row)
+        wb.save(dst_path)
+    else:
+        with open(dst_path, "w", encoding="utf-8-sig", newline="") as f:
+            csv.writer(f).writerows(rows)
+    return stats
@@ -0,0 +1,261 @@
+"""
+Локальний фейковий Telegram Bot API для навантажувального тестування
+Приймає ті самі запити, що й api.telegram.org (getUpdates, sendMessage, ...),
+і дозволяє підкидати боту апдейти від імітованих користувачів.
+
+Запуск:   python fake_telegram.py --port 8081 --latency 0.05
+Бот:      TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_TOKEN=1:test ADMIN_CHAT_ID=1 python main.py
+Апдейти:  POST /_push {"chat_id": 100, "text": "/start"}
+Відповіді: GET /_sent?chat_id=100
+Блокування: POST /_push {"block": [100, 101]} — sendMessage цим чатам відповідає 403
+"""
+
+import time
+import asyncio
+import argparse
+import logging
+from collections import defaultdict, deque
+from urllib.parse import parse_qsl
+
+import aiohttp
+from aiohttp import web
+
+
+class FakeTelegram:
+    def __init__(self, latency=0.0, max_rps=0):
+        self.latency = latency          # штучна затримка кожного API-виклику, сек
+        self.max_rps = max_rps          # >0 — як Telegram, відповідати 429 при перевищенні
+        self._recent = deque()
+        self.rejected_429 = 0
+        self.webhook_url = None
+        self.updates = []
+        self.next_update_id = 1
+        self.next_message_id = defaultdict(lambda: 1)
+        self.sent = defaultdict(list)   # chat_id -> [(method, params)], з answerCallbackQuery
+        self.calls = defaultdict(int)   # method -> кількість викликів
+        self.inline_answers = {}        # inline_query_id -> results (JSON)
+        self.files = {}                 # file_id -> (file_path, bytes)
+        self.blocked = set()            # chat_id, що «заблокували бота»: sendMessage → 403
+        self._new_update = asyncio.Condition()
+        self._inbox = defaultdict(asyncio.Queue)
+        self._answers = {}              # callback_query_id -> Future з параметрами answerCallbackQuery
+
+    # ----- апдейти від "користувачів" -----
+    async def push_update(self, update):
+        update["update_id"] = self.next_update_id
+        self.next_update_id += 1
+        if self.webhook_url:
+            async with aiohttp.ClientSession() as s:
+                await s.post(self.webhook_url, json=update)
+            return
+        async with self._new_update:
+            self.updates.append(update)
+            self._new_update.notify_all()
+
+    def _user(self, chat_id):
+        return {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"}
+
+    def _chat(self, chat_id):
+        return {"id": chat_id, "type": "private", "first_name": f"User{chat_id}"}
+
+    def _message(self, chat_id, **content):
+        msg_id = self.next_message_id[chat_id]
+        self.next_message_id[chat_id] += 1
+        return {"message_id": msg_id, "date": int(time.time()),
+                "chat": self._chat(chat_id), "from": self._user(chat_id), **content}
+
+    async def push_message(self, chat_id, text):
+        msg = self._message(chat_id, text=text)
+        if text.startswith("/"):
+            cmd = text.split()[0]
+            msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(cmd)}]
+        await self.push_update({"message": msg})
+
+    async def push_contact(self, chat_id, phone="+380000000000"):
+        contact = {"phone_number": phone, "first_name": f"User{chat_id}", "user_id": chat_id}
+        await self.push_update({"message": self._message(chat_id, contact=contact)})
+
+    async def push_document(self, chat_id, file_name, content):
+        file_id = f"file{len(self.files) + 1}"
+        self.files[file_id] = (f"documents/{file_id}_{file_name}", content)
+        document = {"file_id": file_id, "file_unique_id": file_id,
+                    "file_name": file_name, "file_size": len(content)}
+        await self.push_update({"message": self._message(chat_id, document=document)})
+
+    async def push_inline_query(self, chat_id, query):
+        query_id = f"{chat_id}:{self.next_update_id}"
+        await self.push_update({"inline_query": {"id": query_id, "from": self._user(chat_id),
+                                                 "query": query, "offset": ""}})
+        return query_id
+
+    async def push_callback(self, chat_id, data, message_id=1):
+        msg = {"message_id": message_id, "date": int(time.time()),
+               "chat": self._chat(chat_id), "text": "..."}
+        query_id = f"{chat_id}:{self.next_update_id}"
+        await self.push_update({"callback_query": {
+            "id": query_id, "from": self._user(chat_id),
+            "chat_instance": str(chat_id), "message": msg, "data": data}})
+        return query_id
+
+    async def wait_reply(self, chat_id, timeout=30):
+        """Чекає наступний вихідний виклик бота в цей чат: (method, params)"""
+        return await asyncio.wait_for(self._inbox[chat_id].get(), timeout)
+
+    async def wait_answer(self, query_id, timeout=30):
+        """Чекає answerCallbackQuery на кнопку query_id (з push_callback): params"""
+        answer = self._answers.setdefault(query_id, asyncio.get_running_loop().create_future())
+        try:
+            return await asyncio.wait_for(asyncio.shield(answer), timeout)
+        finally:
+            self._answers.pop(query_id, None)
+
+    # ----- Bot API -----
+    async def _get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        if not self.updates and timeout:
+            async with self._new_update:
+                try:
+                    await asyncio.wait_for(self._new_update.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        return self.updates[:int(params.get("limit") or 100)]
+
+    @staticmethod
+    async def _read_params(request):
+        # telebot шле параметри формою навіть у GET-запитах, тож розбираємо тіло вручну
+        if request.content_type == "application/json":
+            return await request.json()
+        if request.content_type == "multipart/form-data":
+            params = {}
+            reader = await request.multipart()
+            async for part in reader:
+                params[part.name] = await (part.text() if part.filename is None else part.read())
+            return params
+        return dict(parse_qsl(await request.text()))
+
+    async def handle_api(self, request):
+        method = request.match_info["method"]
+        params = await self._read_params(request)
+        self.calls[method] += 1
+        if method == "getUpdates":
+            return web.json_response({"ok": True, "result": await self._get_updates(params)})
+        if self.max_rps and "chat_id" in params and self._flooded():
+            self.rejected_429 += 1
+            return web.json_response({"ok": False, "error_code": 429,
+                                      "description": "Too Many Requests: retry after 1",
+                                      "parameters": {"retry_after": 1}}, status=429)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == "sendMessage" and int(params["chat_id"]) in self.blocked:
+            return web.json_response({"ok": False, "error_code": 403,
+                                      "description": "Forbidden: bot was blocked by the user"}, status=403)
+
+        result = True
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+        elif method == "setWebhook":
+            self.webhook_url = params.get("url")
+        elif method == "deleteWebhook":
+            self.webhook_url = None
+        elif method == "answerInlineQuery":
+            self.inline_answers[params["inline_query_id"]] = params.get("results")
+        elif method == "getFile":
+            file_id = params["file_id"]
+            path, content = self.files[file_id]
+            result = {"file_id": file_id, "file_unique_id": file_id,
+                      "file_size": len(content), "file_path": path}
+        elif method in ("sendMessage", "editMessageText", "sendDocument"):
+            chat_id = int(params["chat_id"])
+            if method == "editMessageText":
+                result = {"message_id": int(params["message_id"]), "date": int(time.time()),
+                          "chat": self._chat(chat_id), "text": params.get("text", "")}
+            else:
+                result = self._message(chat_id, text=params.get("text") or params.get("caption", ""))
+                result["from"] = {"id": 1, "is_bot": True, "first_name": "FakeBot"}
+
+        if "chat_id" in params:
+            chat_id = int(params["chat_id"])
+            self.sent[chat_id].append((method, params))
+            self._inbox[chat_id].put_nowait((method, params))
+        elif method == "answerCallbackQuery":
+            # id кнопки — «chat_id:update_id» (push_callback): у підрахунок викликів чату, але не відповідь
+            query_id = params["callback_query_id"]
+            self.sent[int(query_id.split(":")[0])].append((method, params))
+            # Відповідь могла прийти раніше за wait_answer (webhook відповідає ще під час push)
+            answer = self._answers.setdefault(query_id, asyncio.get_running_loop().create_future())
+            if not answer.done():
+                answer.set_result(params)
+        return web.json_response({"ok": True, "result": result})
+
+    async def handle_file(self, request):
+        path = request.match_info["path"]
+        for file_path, content in self.files.values():
+            if file_path == path:
+                return web.Response(body=content)
+        return web.Response(status=404)
+
+    def _flooded(self):
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1.0:
+            self._recent.popleft()
+        if len(self._recent) >= self.max_rps:
+            return True
+        self._recent.append(now)
+        return False
+
+    # ----- керування -----
+    async def handle_push(self, request):
+        body = await request.json()
+        if "update" in body:
+            await self.push_update(body["update"])
+        elif "contact" in body:
+            await self.push_contact(int(body["chat_id"]), body["contact"])
+        elif "block" in body:
+            self.blocked.update(int(chat_id) for chat_id in body["block"])
+        elif "callback" in body:
+            await self.push_callback(int(body["chat_id"]), body["callback"])
+        else:
+            await self.push_message(int(body["chat_id"]), body["text"])
+        return web.json_response({"ok": True})
+
+    async def handle_sent(self, request):
+        chat_id = request.query.get("chat_id")
+        if chat_id is None:
+            return web.json_response({"calls": self.calls, "rejected_429": self.rejected_429})
+        return web.json_response(self.sent.get(int(chat_id), []))
+
+    def make_app(self):
+        app = web.Application(client_max_size=50 * 2**20)  # як у Telegram: файли до 50 МБ
+        app.router.add_post("/bot{token}/{method}", self.handle_api)
+        app.router.add_get("/bot{token}/{method}", self.handle_api)
+        app.router.add_get("/file/bot{token}/{path:.+}", self.handle_file)
+        app.router.add_post("/_push", self.handle_push)
+        app.router.add_get("/_sent", self.handle_sent)
+        return app
+
+    async def start(self, host="127.0.0.1", port=8081):
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+async def _serve(args):
+    fake = FakeTelegram(latency=args.latency, max_rps=args.max_rps)
+    await fake.start(args.host, args.port)
+    logging.info(f"✅ Fake Telegram API: http://{args.host}:{args.port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Фейковий Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="затримка API-виклику, сек")
+    parser.add_argument("--max-rps", type=int, default=0, help="ліміт повідомлень/с, далі — 429")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    asyncio.run(_serve(parser.parse_args()))
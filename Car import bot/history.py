@@ -0,0 +1,248 @@
+"""
+Журнал розрахунків (append-only, SQLite)
+Хендлер лише кладе запис у буфер пам'яті; фонова задача пише буфер пачками
+в окремому потоці, тож диск не затримує відповідь користувачу.
+id розрахунку видається одразу (до запису) — на нього посилається заявка.
+Індекси: чат, країна і ціновий діапазон — з часом; для /stats — покривний індекс за часом,
+тож агрегати за період рахуються з індексу без читання самих рядків.
+"""
+
+import os
+import re
+import time
+import random
+import sqlite3
+import asyncio
+import logging
+import threading
+
+PRICE_BAND = 5000  # USD — крок цінового діапазону для статистики
+ID_EPOCH = 1704067200  # 2024-01-01: з цієї точки мілісекунди в id вистачить на десятиліття
+
+# Поля запису в порядку колонок таблиці
+COLUMNS = (
+    "id", "created_at", "chat_id", "country", "car_price", "auction_fee", "delivery_usa",
+    "sea_delivery", "engine_cc", "fuel_type", "car_age", "price_band",
+    "duty_local", "excise_local", "vat_local", "total_customs", "total_local", "total_usd",
+    "currency", "rate_usd", "rate_eur", "rates_version", "rules_version",
+)
+
+# /stats ... by <розріз> -> вираз SQL
+STATS_DIMENSIONS = {
+    "country": "country",
+    "band":    "price_band",
+    "fuel":    "fuel_type",
+    "day":     "date(created_at, 'unixepoch')",
+}
+
+
+def price_band(car_price):
+    return int(car_price // PRICE_BAND)
+
+
+def band_label(band, last=None):
+    """«10–15k»; з last — діапазон від band до last включно"""
+    last = band if last is None else last
+    return f"{band * PRICE_BAND // 1000}–{(last + 1) * PRICE_BAND // 1000}k"
+
+
+_PERIOD = re.compile(r"^(\d+)(h|d|w|г|д|т)$")
+_PERIOD_SECONDS = {"h": 3600, "г": 3600, "d": 86400, "д": 86400, "w": 7 * 86400, "т": 7 * 86400}
+_PRICE = re.compile(r"^(\d+)k?(?:-(\d+)k)?$")
+
+
+def parse_stats_args(text, aliases, now=None):
+    """
+    «/stats last 7d by country», «/stats 24h ua», «/stats 30d by band 10-20k» →
+    dict(since, by, country, bands, period) для QuoteLog.stats; ValueError — з поясненням.
+    """
+    now = now or time.time()
+    query = {"since": now - 7 * 86400, "by": "country", "country": None, "bands": None, "period": "7d"}
+    tokens = iter(text.lower().split()[1:])
+    for token in tokens:
+        if token in ("last", "за"):
+            continue
+        if token == "by":
+            query["by"] = next(tokens, "")
+            if query["by"] not in STATS_DIMENSIONS:
+                raise ValueError(f"розріз — один з: {', '.join(STATS_DIMENSIONS)}")
+            continue
+        if token == "all":
+            query["since"], query["period"] = 0, "весь час"
+            continue
+        m = _PERIOD.match(token)
+        if m:
+            query["since"] = now - int(m.group(1)) * _PERIOD_SECONDS[m.group(2)]
+            query["period"] = token
+            continue
+        if token in aliases:
+            query["country"] = aliases[token]
+            continue
+        m = _PRICE.match(token)
+        if m and (m.group(2) or token.endswith("k")):
+            low = int(m.group(1)) * 1000
+            high = int(m.group(2)) * 1000 - 1 if m.group(2) else low
+            query["bands"] = (price_band(low), price_band(high))
+            continue
+        raise ValueError(f"незрозуміло: «{token}»")
+    return query
+
+
+class QuoteLog:
+    def __init__(self, path, flush_interval=1.0, batch_size=1000):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = []
+        self._writing = ()  # пачка, яку зараз пише потік: get() бачить і її
+        self._wakeup = None
+        self._seq = random.getrandbits(12)  # кілька процесів з однаковим pid & 0x3FF не стартують з одного id
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # журнал, не заявки: збій живлення може забрати останні записи
+        self._db.execute("""CREATE TABLE IF NOT EXISTS quotes (
+            id INTEGER PRIMARY KEY, created_at REAL, chat_id INTEGER, country TEXT,
+            car_price REAL, auction_fee REAL, delivery_usa REAL, sea_delivery REAL,
+            engine_cc INTEGER, fuel_type TEXT, car_age INTEGER, price_band INTEGER,
+            duty_local REAL, excise_local REAL, vat_local REAL, total_customs REAL,
+            total_local REAL, total_usd REAL, currency TEXT, rate_usd REAL, rate_eur REAL,
+            rates_version INTEGER, rules_version TEXT)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS quotes_chat ON quotes (chat_id, created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS quotes_country ON quotes (country, created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS quotes_band ON quotes (price_band, created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS quotes_time ON quotes "
+                         "(created_at, country, price_band, fuel_type, total_usd)")
+        # Збіг id (та сама мілісекунда, pid і лічильник) малоймовірний; краще втратити дубль, ніж усю пачку
+        self._insert = f"INSERT OR IGNORE INTO quotes ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+    def _next_id(self, now):
+        """
+        Зростає з часом (вставки — в кінець B-дерева) і не перетинається між процесами:
+        мілісекунди від ID_EPOCH << 22 | pid (10 біт) << 12 | лічильник (12 біт)
+        """
+        self._seq = (self._seq + 1) & 0xFFF
+        return (int((now - ID_EPOCH) * 1000) << 22) | ((os.getpid() & 0x3FF) << 12) | self._seq
+
+    def record(self, chat_id, inputs, c, currency, rate, created_at=None):
+        """
+        inputs — (країна, ціна, збір, доставка США, море, об'єм, пальне, вік), c — результат build_quote,
+        currency / rate — код і курс валюти країни зі знімка. Повертає id розрахунку; запис на диск — у фоні.
+        """
+        now = created_at or time.time()
+        quote_id = self._next_id(now)
+        self._pending.append((
+            quote_id, now, chat_id, *inputs[:8], price_band(inputs[1]),
+            c["duty_local"], c["excise_local"], c["vat_local"], c["total_customs"],
+            c["total_local"], c["total_usd"], currency, rate["usd"], rate["eur"],
+            c["rates_version"], c["rules_version"],
+        ))
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return quote_id
+
+    def _write(self, batch):
+        """Одна транзакція на пачку"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(self._insert, batch)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def flush(self):
+        """Синхронно пише буфер; повертає кількість рядків"""
+        batch, self._pending = self._pending, []
+        if batch:
+            self._write(batch)
+        return len(batch)
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        write = None
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                # Буфер забираємо в потоці event loop — record() у цей час не виконується
+                batch, self._pending = self._pending, []
+                if not batch:
+                    continue
+                self._writing = batch
+                write = asyncio.ensure_future(asyncio.to_thread(self._write, batch))
+                try:
+                    await asyncio.shield(write)
+                except Exception as e:
+                    logging.error(f"Журнал розрахунків: {e}")
+                    self._pending[:0] = batch  # спробуємо наступного разу
+                finally:
+                    self._writing = ()
+        finally:
+            # Скасування не зупиняє потік: дочікуємося пачки, що пишеться, і лише тоді дописуємо решту
+            if write is not None and not write.done():
+                try:
+                    await write
+                except Exception as e:
+                    logging.error(f"Журнал розрахунків: {e}")
+                    self._pending[:0] = batch
+            self.flush()  # зупинка бота — дописуємо те, що встигли порахувати
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    # ----- читання (викликати через asyncio.to_thread: агрегати по мільйонах рядків) -----
+    def get(self, quote_id):
+        for row in (*self._pending, *self._writing):
+            if row[0] == quote_id:
+                return dict(zip(COLUMNS, row))
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(COLUMNS)} FROM quotes WHERE id = ?",
+                                   (quote_id,)).fetchone()
+        return None if row is None else dict(zip(COLUMNS, row))
+
+    def history(self, chat_id, limit=10):
+        """Останні розрахунки чату, новіші першими"""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM quotes WHERE chat_id = ? ORDER BY created_at DESC LIMIT ?",
+                (chat_id, limit)).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def chat_ids(self):
+        """Усі чати, що колись отримали розрахунок (з індексу quotes_chat)"""
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT DISTINCT chat_id FROM quotes")]
+
+    def stats(self, since, by="country", country=None, bands=None):
+        """
+        [(значення розрізу, кількість, середнє / мін / макс під ключ у USD)] за період від since.
+        country — лише одна країна; bands — (від, до) номерів цінових діапазонів включно.
+        """
+        where, args = ["created_at >= ?"], [since]
+        if country:
+            where.append("country = ?")
+            args.append(country)
+        if bands:
+            where.append("price_band BETWEEN ? AND ?")
+            args.extend(bands)
+        key = STATS_DIMENSIONS[by]
+        # Планувальник любить skip-scan по quotes_country / quotes_band і читає самі рядки заради total_usd;
+        # покривний індекс за часом удвічі швидший. З фільтром країни лишаємо вибір йому.
+        hint = "" if country else "INDEXED BY quotes_time"
+        with self._lock:
+            return self._db.execute(
+                f"SELECT {key} AS k, COUNT(*), AVG(total_usd), MIN(total_usd), MAX(total_usd) "
+                f"FROM quotes {hint} WHERE {' AND '.join(where)} GROUP BY k ORDER BY COUNT(*) DESC",
+                args).fetchall()
+
+    def close(self):
+        # Той самий замок, що й у запису пачки: з'єднання не закриється посеред транзакції
+        self.flush()
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,175 @@
+"""
+Черга заявок для адміністратора
+Заявка спершу записується в SQLite (це й є підтвердження для користувача),
+а фоновий LeadWorker доставляє її в ADMIN_CHAT_ID: 429 — чекає retry_after,
+інші помилки — повтор з експоненційною паузою. Після рестарту недоставлені
+заявки підхоплюються з бази, тож жодна не губиться (доставка — at-least-once).
+Кілька процесів можуть ділити одну базу: due() бере заявки в оренду на lease сек.
+"""
+
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+
+from telebot.asyncio_helper import ApiTelegramException
+
+from sender import retry_after_of
+
+DIGEST_SEPARATOR = "\n\n" + "─" * 20 + "\n\n"
+MAX_MESSAGE_LEN = 4096
+
+
+class LeadQueue:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")  # заявка має пережити і збій живлення
+        self._db.execute("""CREATE TABLE IF NOT EXISTS leads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER, text TEXT, created_at REAL,
+            attempts INTEGER DEFAULT 0, next_attempt_at REAL DEFAULT 0, sent_at REAL,
+            quote_id INTEGER)""")
+        # База від попередньої версії — без посилання на розрахунок
+        if "quote_id" not in {row[1] for row in self._db.execute("PRAGMA table_info(leads)")}:
+            self._db.execute("ALTER TABLE leads ADD COLUMN quote_id INTEGER")
+        self._db.execute("CREATE INDEX IF NOT EXISTS leads_pending ON leads (next_attempt_at) "
+                         "WHERE sent_at IS NULL")
+
+    def push(self, chat_id, text, quote_id=None):
+        """quote_id — розрахунок з журналу (history.QuoteLog), який бачив користувач"""
+        with self._lock:
+            cur = self._db.execute("INSERT INTO leads (chat_id, text, created_at, quote_id) VALUES (?, ?, ?, ?)",
+                                   (chat_id, text, time.time(), quote_id))
+            return cur.lastrowid
+
+    def due(self, limit, lease=60):
+        """Заявки, яким настав час; до mark_sent/reschedule інші процеси їх не бачать lease сек"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT id, text, attempts FROM leads WHERE sent_at IS NULL AND next_attempt_at <= ? "
+                    "ORDER BY id LIMIT ?", (now, limit)).fetchall()
+                self._db.executemany("UPDATE leads SET next_attempt_at = ? WHERE id = ?",
+                                     [(now + lease, row[0]) for row in rows])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return rows
+
+    def next_due_in(self):
+        """Секунд до найближчої відкладеної заявки (None — черга порожня)"""
+        with self._lock:
+            row = self._db.execute("SELECT MIN(next_attempt_at) FROM leads WHERE sent_at IS NULL").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def mark_sent(self, ids):
+        with self._lock:
+            self._db.executemany("UPDATE leads SET sent_at = ? WHERE id = ?",
+                                 [(time.time(), i) for i in ids])
+
+    def reschedule(self, ids, delay):
+        with self._lock:
+            self._db.executemany(
+                "UPDATE leads SET attempts = attempts + 1, next_attempt_at = ? WHERE id = ?",
+                [(time.time() + delay, i) for i in ids])
+
+    def release(self, ids):
+        """Повертає взяті в оренду заявки в чергу без збільшення лічильника спроб"""
+        with self._lock:
+            self._db.executemany("UPDATE leads SET next_attempt_at = ? WHERE id = ?",
+                                 [(time.time(), i) for i in ids])
+
+    def pending_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM leads WHERE sent_at IS NULL").fetchone()[0]
+
+
+class LeadWorker:
+    """
+    send(text, parse_mode) — корутина надсилання адміністратору.
+    digest_size > 1 — кілька заявок, що накопичились, ідуть одним повідомленням;
+    digest_window — скільки секунд чекати, щоб зібрати дайджест після нової заявки.
+    """
+
+    def __init__(self, queue, send, digest_size=1, digest_window=0, base_delay=5, max_delay=600):
+        self.queue = queue
+        self.send = send
+        self.digest_size = digest_size
+        self.digest_window = digest_window
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _pack(self, rows):
+        """Стільки заявок, скільки влазить в одне повідомлення (мінімум одна)"""
+        batch, length = [], 0
+        for row in rows:
+            extra = len(row[1]) + (len(DIGEST_SEPARATOR) if batch else 0)
+            if batch and length + extra > MAX_MESSAGE_LEN:
+                break
+            batch.append(row)
+            length += extra
+        return batch
+
+    async def _deliver(self, batch):
+        text = DIGEST_SEPARATOR.join(row[1] for row in batch)
+        if len(batch) > 1:
+            text = f"📦 *Заявок: {len(batch)}*" + DIGEST_SEPARATOR + text
+        try:
+            await self.send(text, "Markdown")
+        except ApiTelegramException as e:
+            if e.error_code != 400:
+                raise
+            # Імена користувачів можуть зламати Markdown — шлемо як звичайний текст
+            await self.send(text, None)
+
+    async def drain(self):
+        """Надсилає всі заявки, яким настав час. Повертає False, якщо треба почекати."""
+        while True:
+            rows = self.queue.due(self.digest_size)
+            if not rows:
+                return True
+            batch = self._pack(rows)
+            ids = [row[0] for row in batch]
+            try:
+                await self._deliver(batch)
+            except Exception as e:
+                wait = retry_after_of(e)
+                if wait is not None:
+                    logging.warning(f"Заявки: ліміт Telegram, пауза {wait} с")
+                    await asyncio.sleep(wait)
+                    self.queue.release(ids)
+                    continue
+                attempts = max(row[2] for row in batch)
+                delay = min(self.base_delay * 2 ** attempts, self.max_delay)
+                logging.error(f"Помилка надсилання заявок {ids} адміністратору: {e}. "
+                              f"Повтор через {delay} с")
+                self.queue.reschedule(ids, delay)
+                return False
+            self.queue.mark_sent(ids)
+
+    async def run(self):
+        while True:
+            # Скидаємо до drain: notify() під час надсилання не загубиться
+            self._wakeup.clear()
+            try:
+                await self.drain()
+            except Exception as e:
+                logging.error(f"LeadWorker: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.queue.next_due_in())
+                if self.digest_window:
+                    await asyncio.sleep(self.digest_window)
+            except asyncio.TimeoutError:
+                pass
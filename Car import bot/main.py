@@ -1,50 +1,111 @@
 """
 Telegram-бот для розрахунку вартості авто з США
-Підтримувані країни розмитнення: Україна, Польща, Литва, Грузія
-Встановлення: pip install pyTelegramBotAPI
-Запуск: python car_import_bot.py
+Країни розмитнення і їхні ставки — у tariff_rules.json (оновлюються без перезапуску)
+Встановлення: pip install -r requirements.txt
+Запуск: python main.py  (BOT_MODE=polling | webhook)
 """
 
+import io
 import os
+import re
+import time
+import signal
+import asyncio
+import tempfile
 import logging
 import datetime
-import telebot
-from telebot import types
+import zlib
+
+STARTED_AT = time.monotonic()  # до важких імпортів: /readyz і лог рахують холодний старт від цієї точки
+
+from aiohttp import web
+from telebot import types, asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException
+
+import metrics
+from quick import parse_quote, DEFAULT_DELIVERY_USA, DEFAULT_SEA_DELIVERY
+from sessions import Session, open_store
+from tariffs import get_auction_fee
+from rates import RateProvider, make_source
+from rules import RulesProvider, DEFAULT_RULES_PATH
+from quote_cache import QuoteCache
+from leads import LeadQueue, LeadWorker
+from history import QuoteLog, parse_stats_args, band_label
+from sender import SendScheduler, PRIORITY_RESULT, PRIORITY_PROMPT, PRIORITY_BULK
+from workers import WorkerPool, receive_updates
+from watchlist import WatchList, WatchWorker
+from broadcast import BroadcastStore, Broadcaster, RUNNING, DONE
+from vin import open_decoder, looks_like_vin, DEFAULT_REFERENCE_PATH as DEFAULT_VIN_REFERENCE
 
 # ===== НАЛАШТУВАННЯ =====
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 ADMIN_CHAT_ID = os.environ.get("ADMIN_CHAT_ID")
+BOT_MODE = os.environ.get("BOT_MODE", "polling")        # polling | webhook
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")          # напр. https://car-bot.up.railway.app
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+PORT = int(os.environ.get("PORT", "8080"))
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL")    # напр. http://127.0.0.1:8081 (fake_telegram.py)
+DATA_DIR = os.environ.get("DATA_DIR", "data")
+SESSION_STORE = os.environ.get("SESSION_STORE", "sqlite")  # sqlite | memory
+SESSION_TTL = int(os.environ.get("SESSION_TTL", str(24 * 3600)))
+SESSION_MAX = int(os.environ.get("SESSION_MAX", "100000"))
+RATES_SOURCE = os.environ.get("RATES_SOURCE", "static")  # static | шлях до .json | http(s)://...
+RATES_REFRESH = int(os.environ.get("RATES_REFRESH", "3600"))
+QUOTE_CACHE_SIZE = int(os.environ.get("QUOTE_CACHE_SIZE", "10000"))
+TARIFF_RULES = os.environ.get("TARIFF_RULES", DEFAULT_RULES_PATH)  # файл митних правил країн
+TARIFF_RULES_CHECK = int(os.environ.get("TARIFF_RULES_CHECK", "30"))  # сек між перевірками файлу
+LEAD_DIGEST = int(os.environ.get("LEAD_DIGEST", "1"))             # заявок в одному повідомленні
+LEAD_DIGEST_WINDOW = float(os.environ.get("LEAD_DIGEST_WINDOW", "0"))  # сек очікування дайджесту
+SEND_GLOBAL_RATE = float(os.environ.get("SEND_GLOBAL_RATE", "30"))  # повідомлень/с на бота
+SEND_CHAT_RATE = float(os.environ.get("SEND_CHAT_RATE", "1"))       # повідомлень/с в один чат
+BULK_MAX_ROWS = int(os.environ.get("BULK_MAX_ROWS", "100000"))     # рядків у файлі лотів
+WORKERS = int(os.environ.get("WORKERS", "1"))                       # процесів-обробників (webhook)
+WORKER_METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", str(PORT + 1)))  # воркер i — порт +i
+VIN_REFERENCE = os.environ.get("VIN_REFERENCE", DEFAULT_VIN_REFERENCE)  # довідник WMI/VDS → пальне, об'єм
+VIN_CACHE_SIZE = int(os.environ.get("VIN_CACHE_SIZE", "10000"))
+WATCH_MAX_PER_CHAT = int(os.environ.get("WATCH_MAX_PER_CHAT", "10"))  # стежень за ціною на користувача
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", "30"))  # надсилань розсилки одночасно
+SHUTDOWN_TIMEOUT = float(os.environ.get("SHUTDOWN_TIMEOUT", "8"))  # сек на дообробку при зупинці (Docker чекає 10)
 
 if not BOT_TOKEN:
     raise RuntimeError("❌ Змінна середовища BOT_TOKEN не задана!")
 if not ADMIN_CHAT_ID:
     raise RuntimeError("❌ Змінна середовища ADMIN_CHAT_ID не задана!")
+try:
+    # Числом, як chat.id в апдейтах: інакше в планувальнику надсилань «123» і 123 — різні чати
+    ADMIN_CHAT_ID = int(ADMIN_CHAT_ID)
+except ValueError:
+    raise RuntimeError(f"❌ ADMIN_CHAT_ID має бути числовим id чату, а не «{ADMIN_CHAT_ID}»")
+if BOT_MODE not in ("polling", "webhook"):
+    raise RuntimeError(f"❌ Невідомий BOT_MODE: {BOT_MODE} (очікується polling або webhook)")
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    raise RuntimeError("❌ Для BOT_MODE=webhook потрібна змінна WEBHOOK_URL!")
+if WORKERS > 1 and BOT_MODE != "webhook":
+    raise RuntimeError("❌ WORKERS > 1 підтримується лише з BOT_MODE=webhook")
+if WORKERS > 1 and SESSION_STORE == "memory":
+    # Кожен воркер записав би свої сесії в той самий sessions.json — лишились би лише сесії останнього
+    raise RuntimeError("❌ WORKERS > 1 потребує спільного сховища сесій: SESSION_STORE=sqlite")
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
-bot = telebot.TeleBot(BOT_TOKEN)
-
-# ===== КУРСИ ВАЛЮТ (оновлювати вручну або підключити API) =====
-RATES = {
-    "UAH": {"usd": 41.5,  "eur": 44.5,  "symbol": "грн", "code": "UAH"},
-    "PLN": {"usd": 4.05,  "eur": 4.28,  "symbol": "злот.", "code": "PLN"},
-    "EUR": {"usd": 0.93,  "eur": 1.0,   "symbol": "EUR",  "code": "EUR"},  # Литва — євро
-    "GEL": {"usd": 2.68,  "eur": 2.88,  "symbol": "ларі", "code": "GEL"},
-}
+if TELEGRAM_API_URL:
+    asyncio_helper.API_URL = TELEGRAM_API_URL.rstrip("/") + "/bot{0}/{1}"
+    asyncio_helper.FILE_URL = TELEGRAM_API_URL.rstrip("/") + "/file/bot{0}/{1}"
+bot = AsyncTeleBot(BOT_TOKEN)
+# Усі вихідні виклики — через sender (ліміти Telegram, пріоритети, повтори після 429).
+# Глобальний ліміт бота ділиться між воркерами; чат завжди в одному воркері, тож його ліміт — цілий.
+sender = SendScheduler(bot, global_rate=SEND_GLOBAL_RATE / WORKERS, chat_rate=SEND_CHAT_RATE)
 
 # ===== КНОПКИ =====
 BTN_CANCEL  = "❌ Скасувати"
 BTN_CONTACT = "📞 Надіслати мій номер"
 
-BTN_COUNTRY = {
-    "🇺🇦 Україна": "ukraine",
-    "🇵🇱 Польща":  "poland",
-    "🇱🇹 Литва":   "lithuania",
-    "🇬🇪 Грузія":  "georgia",
-}
-COUNTRY_NAMES = {v: k for k, v in BTN_COUNTRY.items()}
+# Країни — з тарифних правил; заповнюються в apply_rules і оновлюються разом з правилами
+BTN_COUNTRY = {}
+COUNTRY_NAMES = {}
 
 BTN_FUEL = {
     "⛽️ Бензин": "gasoline",
@@ -60,386 +121,830 @@ FUEL_NAMES = {
 }
 
 
-# ===== ТАБЛИЦЯ АУКЦІОННИХ ЗБОРІВ (Copart / IAAI) =====
-def get_auction_fee(price_usd: float) -> float:
-    table = [
-        (100, 1), (499, 89), (999, 129), (1499, 179), (1999, 229),
-        (2999, 279), (3999, 329), (4999, 379), (5999, 429), (6999, 479),
-        (7999, 529), (8999, 579), (9999, 629), (14999, 729), (19999, 829),
-        (29999, 979), (49999, 1279), (74999, 1579), (99999, 1879),
-    ]
-    for limit, fee in table:
-        if price_usd <= limit:
-            return fee
-    return 2179
-
-
-# ============================================================
-#  РОЗРАХУНКИ ПО КРАЇНАХ
-# ============================================================
-
-def calc_ukraine(customs_usd, engine_cc, fuel_type, car_age):
-    """Україна: мито + акциз + ПДВ"""
-    r = RATES["UAH"]
-    usd2uah = r["usd"]
-    usd2eur = r["usd"] / r["eur"]
-    customs_eur = customs_usd * usd2eur
-
-    if fuel_type == "electric":
-        vat = customs_usd * usd2uah * 0.20
-        return {
-            "duty_local": 0, "duty_note": "0% — пільга для електро",
-            "excise_local": 0, "excise_note": "пільга для електро",
-            "vat_local": vat, "vat_note": "20% від митної вартості",
-            "total_customs": vat,
-            "currency": r["symbol"],
-        }
-
-    # Мито
-    rate_map = [(3, 0.10, "10% до 3 р."), (5, 0.15, "15% 3–5 р."),
-                (8, 0.20, "20% 5–8 р."), (999, 0.25, "25% понад 8 р.")]
-    duty_rate, duty_note = next((rt, nt) for ag, rt, nt in rate_map if car_age <= ag)
-    duty_eur = customs_eur * duty_rate
-    duty_uah = duty_eur * r["eur"]
-
-    # Акциз (EUR/см³)
-    exc_tbl = [
-        (1500,  (0.012, 0.024, 0.048, 0.072)),
-        (2000,  (0.024, 0.048, 0.096, 0.144)),
-        (2500,  (0.048, 0.096, 0.144, 0.216)),
-        (3000,  (0.072, 0.144, 0.216, 0.288)),
-        (3500,  (0.096, 0.192, 0.288, 0.384)),
-        (4500,  (0.144, 0.288, 0.432, 0.576)),
-        (99999, (0.192, 0.384, 0.576, 0.768)),
-    ]
-    ai = 0 if car_age <= 3 else (1 if car_age <= 5 else (2 if car_age <= 8 else 3))
-    fc = 1.2 if fuel_type == "diesel" else (0.5 if fuel_type == "hybrid" else 1.0)
-    er = 0.192
-    for lim, rates in exc_tbl:
-        if engine_cc <= lim:
-            er = rates[ai]; break
-    er *= fc
-    excise_eur = er * engine_cc
-    excise_uah = excise_eur * r["eur"]
-
-    vat_base = customs_usd * usd2uah + duty_uah + excise_uah
-    vat = vat_base * 0.20
-
-    total = duty_uah + excise_uah + vat
-    return {
-        "duty_local": duty_uah, "duty_note": duty_note,
-        "duty_eur": duty_eur,
-        "excise_local": excise_uah, "excise_note": f"{er:.4f} EUR × {engine_cc} см³",
-        "excise_eur": excise_eur,
-        "vat_local": vat, "vat_note": "20% від (вартість + мито + акциз)",
-        "total_customs": total,
-        "currency": r["symbol"],
-    }
-
-
-def calc_poland(customs_usd, engine_cc, fuel_type, car_age):
-    """Польща (ЄС): мито 6.5% + акциз + ПДВ 23%"""
-    r = RATES["PLN"]
-    usd2pln = r["usd"]
-    usd2eur = r["usd"] / r["eur"]
-    customs_eur = customs_usd * usd2eur
-
-    # Мито ЄС — 6.5% від митної вартості в EUR
-    duty_eur = customs_eur * 0.065
-    duty_pln = duty_eur * r["eur"]
-    duty_note = "6.5% (ставка ЄС)"
-
-    # Акциз (тільки для авто старше 2 років і об'єм > 2000 см³)
-    excise_eur = 0.0
-    excise_note = "0"
-    if car_age > 2 and engine_cc > 2000:
-        excise_eur = customs_eur * 0.184  # 18.4% для великих авто
-        excise_note = f"18.4% (об'єм > 2000 см³, вік > 2 р.)"
-    elif fuel_type == "electric":
-        excise_note = "0 — електромобіль"
-    excise_pln = excise_eur * r["eur"]
-
-    # ПДВ 23% від (митна вартість + мито + акциз)
-    vat_base_pln = customs_usd * usd2pln + duty_pln + excise_pln
-    vat = vat_base_pln * 0.23
-    vat_note = "23% від (вартість + мито + акциз)"
-
-    total = duty_pln + excise_pln + vat
-    return {
-        "duty_local": duty_pln, "duty_note": duty_note, "duty_eur": duty_eur,
-        "excise_local": excise_pln, "excise_note": excise_note, "excise_eur": excise_eur,
-        "vat_local": vat, "vat_note": vat_note,
-        "total_customs": total,
-        "currency": r["symbol"],
-    }
-
-
-def calc_lithuania(customs_usd, engine_cc, fuel_type, car_age):
-    """Литва (ЄС): мито 6.5% + ПДВ 21%, розрахунок в EUR"""
-    r = RATES["EUR"]
-    usd2eur = r["usd"]
-    customs_eur = customs_usd * usd2eur
-
-    duty_eur = customs_eur * 0.065
-    duty_note = "6.5% (ставка ЄС)"
-
-    excise_eur = 0.0
-    excise_note = "0"
-    if fuel_type not in ("electric",) and engine_cc > 2000 and car_age > 2:
-        excise_eur = customs_eur * 0.15
-        excise_note = f"15% (об'єм > 2000 см³)"
-
-    vat_base = customs_eur + duty_eur + excise_eur
-    vat = vat_base * 0.21
-    vat_note = "21% від (вартість + мито + акциз)"
-
-    total = duty_eur + excise_eur + vat
-    return {
-        "duty_local": duty_eur, "duty_note": duty_note, "duty_eur": duty_eur,
-        "excise_local": excise_eur, "excise_note": excise_note, "excise_eur": excise_eur,
-        "vat_local": vat, "vat_note": vat_note,
-        "total_customs": total,
-        "currency": r["symbol"],
-    }
-
-
-def calc_georgia(customs_usd, engine_cc, fuel_type, car_age):
-    """Грузія: мито 0% + акциз залежно від об'єму + ПДВ 18%"""
-    r = RATES["GEL"]
-    usd2gel = r["usd"]
-    customs_gel = customs_usd * usd2gel
-
-    # Мито 0% (Грузія має дуже низькі ставки)
-    duty_gel = 0.0
-    duty_note = "0% (пільгова ставка Грузії)"
-
-    # Акциз: фіксована ставка в USD залежно від об'єму і віку
-    excise_usd_map = [
-        (1000,  0.05), (1500,  0.10), (2000,  0.20),
-        (2500,  0.35), (3000,  0.50), (3500,  0.75), (99999, 1.00),
-    ]
-    if fuel_type == "electric":
-        excise_gel = 0.0
-        excise_note = "0 — електромобіль"
-    else:
-        age_coef = 1.0 if car_age <= 3 else (1.5 if car_age <= 7 else 2.0)
-        base_rate = 0.20
-        for lim, rate in excise_usd_map:
-            if engine_cc <= lim:
-                base_rate = rate; break
-        excise_usd_val = base_rate * engine_cc * age_coef / 100
-        excise_gel = excise_usd_val * usd2gel
-        excise_note = f"{base_rate} USD/см³ × {engine_cc} × к-т {age_coef}"
-
-    vat_base_gel = customs_gel + duty_gel + excise_gel
-    vat = vat_base_gel * 0.18
-    vat_note = "18% від (вартість + акциз)"
-
-    total = duty_gel + excise_gel + vat
-    return {
-        "duty_local": duty_gel, "duty_note": duty_note,
-        "excise_local": excise_gel, "excise_note": excise_note,
-        "vat_local": vat, "vat_note": vat_note,
-        "total_customs": total,
-        "currency": r["symbol"],
-    }
-
-
-COUNTRY_CALCULATORS = {
-    "ukraine":   (calc_ukraine,   RATES["UAH"]),
-    "poland":    (calc_poland,    RATES["PLN"]),
-    "lithuania": (calc_lithuania, RATES["EUR"]),
-    "georgia":   (calc_georgia,   RATES["GEL"]),
-}
+
+# ===== КУРСИ ВАЛЮТ =====
+rate_provider = RateProvider(make_source(RATES_SOURCE), RATES_REFRESH,
+                             cache_path=os.path.join(DATA_DIR, "rates.json"))
+
+# Версія курсів входить у ключ, але старі записи одразу звільняємо
+quote_cache = QuoteCache(QUOTE_CACHE_SIZE)
+rate_provider.listeners.append(quote_cache.clear)
+
+
+# ===== ТАРИФНІ ПРАВИЛА =====
+# Файл перечитується у фоні; розрахунок бере rules_provider.current() один раз,
+# тож мито, акциз і ПДВ завжди з однієї версії правил
+rules_provider = RulesProvider(TARIFF_RULES, TARIFF_RULES_CHECK)
+rules_provider.listeners.append(quote_cache.clear)
+
+
+# ===== VIN =====
+# Індекс довідника — у DATA_DIR; перекомпілюється при запуску, якщо довідник змінився
+vin_decoder = open_decoder(VIN_REFERENCE, os.path.join(DATA_DIR, "vin_index.bin"), VIN_CACHE_SIZE)
+
+
+# ===== ЗАЯВКИ =====
+async def send_to_admin(text, parse_mode):
+    await sender.send_message(ADMIN_CHAT_ID, text, parse_mode=parse_mode)
+
+lead_queue = LeadQueue(os.path.join(DATA_DIR, "leads.db"))
+lead_worker = LeadWorker(lead_queue, send_to_admin, LEAD_DIGEST, LEAD_DIGEST_WINDOW)
+
+
+# ===== ЖУРНАЛ РОЗРАХУНКІВ =====
+# Кожен показаний розрахунок; пишеться у фоні пачками (quote_log.run)
+quote_log = QuoteLog(os.path.join(DATA_DIR, "quotes.db"))
 
 
 # ===== СТАН КОРИСТУВАЧІВ =====
-user_data = {}
+sessions = open_store(SESSION_STORE, DATA_DIR, ttl=SESSION_TTL, max_size=SESSION_MAX)
+
+# Дані авто одним повідомленням — основний шлях; окремі кроки нижче лише дозаповнюють те, чого бракує
+CAR_LINE_HINT = (
+    "`8500 2.0 diesel 2019`\n_ціна (USD), об'єм, пальне, рік_\n"
+    f"Доставка — {DEFAULT_DELIVERY_USA:.0f} + {DEFAULT_SEA_DELIVERY:.0f} USD, збір — за таблицею Copart/IAAI; "
+    "свої суми — одразу після ціни: `8500 0 450 1100 2.0 diesel 2019`"
+)
+VIN_HINT = "🔎 Або вставте *VIN* — рік, пальне й об'єм заповню сам"
+START_QUESTION = ("🌍 Оберіть *країну розмитнення* і надішліть *дані авто* одним повідомленням:\n"
+                  + CAR_LINE_HINT + "\n\n" + VIN_HINT)
 
 STEP_QUESTIONS = {
-    "country":      "🌍 *Крок 1 з 8*\n\nОберіть *країну розмитнення*:",
-    "car_price":    "💵 *Крок 2 з 8*\n\nВведіть *ціну автомобіля* на аукціоні (у USD):\n_Приклад: 8500_",
-    "auction_fee":  "🏷 *Крок 3 з 8*\n\nАукціонний збір:\nВведіть *0* — і я розрахую автоматично за таблицею Copart/IAAI\nАбо введіть суму вручну (USD):",
-    "delivery_usa": "🚚 *Крок 4 з 8*\n\nВведіть вартість *доставки по США* до порту (USD):\n_Приклад: 400_",
-    "sea_delivery": "🚢 *Крок 5 з 8*\n\nВведіть вартість *морської доставки* до вашої країни (USD):\n_Орієнтовно 900–1500 USD_",
-    "engine_cc":    "⚙️ *Крок 6 з 8*\n\nВведіть *об'єм двигуна* у куб. см (см³):\n_Приклад: 1998_\n_Для електромобіля введіть 0_",
-    "fuel_type":    "⛽️ *Крок 7 з 8*\n\nОберіть *тип пального*:",
-    "car_age":      "📅 *Крок 8 з 8*\n\nВведіть *рік випуску* автомобіля (наприклад: 2019)\nабо кількість *повних років* (наприклад: 5):",
+    "country":      "🌍 Оберіть *країну розмитнення*:",
+    "car_price":    "💵 Введіть *ціну автомобіля* на аукціоні (у USD):\n_Приклад: 8500_\n\n"
+                    "Або все одним повідомленням:\n" + CAR_LINE_HINT + "\n\n" + VIN_HINT,
+    "auction_fee":  "🏷 *Аукціонний збір*\n\nНатисніть кнопку — і я розрахую автоматично за таблицею Copart/IAAI\nАбо введіть суму вручну (USD):",
+    "delivery_usa": "🚚 Введіть вартість *доставки по США* до порту (USD):\n_Приклад: 400_",
+    "sea_delivery": "🚢 Введіть вартість *морської доставки* до вашої країни (USD):\n_Орієнтовно 900–1500 USD_",
+    "engine_cc":    "⚙️ Введіть *об'єм двигуна* у куб. см (см³):\n_Приклад: 1998_\n_Для електромобіля введіть 0_",
+    "fuel_type":    "⛽️ Оберіть *тип пального*:",
+    "car_age":      "📅 Введіть *рік випуску* автомобіля (наприклад: 2019)\nабо кількість *повних років* (наприклад: 5):",
 }
+# «8 500» на кроці ціни — одне число з розділеними тисячами, а не дані авто одним повідомленням
+SPACED_NUMBER = re.compile(r"\d{1,3}(?:[ \u00a0\u202f]\d{3})+(?:[.,]\d+)?")
+
+
+def advance(s, step):
+    """Перехід на наступний крок: зберігає сесію і рахує воронку"""
+    s.step = step
+    sessions.save(s)
+    metrics.FUNNEL.labels(step).inc()
 
 
 # ===== КЛАВІАТУРИ =====
-def remove_keyboard():
-    return types.ReplyKeyboardRemove()
-
-def cancel_keyboard():
-    m = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=False)
-    m.add(BTN_CANCEL)
-    return m
-
-def country_keyboard():
-    m = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    m.add("🇺🇦 Україна", "🇵🇱 Польща")
-    m.add("🇱🇹 Литва",   "🇬🇪 Грузія")
-    m.add(BTN_CANCEL)
-    return m
-
-def fuel_keyboard():
-    m = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    m.add("⛽️ Бензин", "🛢 Дизель")
-    m.add("🔋 Гібрид",  "⚡️ Електро")
-    m.add(BTN_CANCEL)
-    return m
-
-def contact_keyboard():
-    m = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    m.add(types.KeyboardButton(BTN_CONTACT, request_contact=True))
-    m.add(BTN_CANCEL)
-    return m
+# Будуються один раз при старті й одразу серіалізуються в JSON:
+# telebot передає рядок як є, без to_json() на кожне повідомлення
+def _inline(*rows):
+    m = types.InlineKeyboardMarkup()
+    for row in rows:
+        m.row(*(types.InlineKeyboardButton(text, callback_data=data) for text, data in row))
+    return m.to_json()
+
+BTN_CANCEL_INLINE = ("❌ Скасувати", "cancel")
+
+CANCEL_KB = _inline([BTN_CANCEL_INLINE])
+FUEL_KB = _inline(
+    [("⛽️ Бензин", "fuel:gasoline"), ("🛢 Дизель", "fuel:diesel")],
+    [("🔋 Гібрид", "fuel:hybrid"), ("⚡️ Електро", "fuel:electric")],
+    [BTN_CANCEL_INLINE])
+FEE_KB = _inline([("🧮 За таблицею Copart/IAAI", "fee:auto")], [BTN_CANCEL_INLINE])
+BTN_WHATIF_INLINE = ("📊 Що, якби…", "whatif")
+BTN_COMPARE_INLINE = ("🌍 Порівняти всі країни", "compare")
+RESULT_ROWS = ([BTN_COMPARE_INLINE],
+               [BTN_WHATIF_INLINE],
+               [("🔔 Стежити за ціною", "watch")],
+               [("📩 Залишити заявку", "request")],
+               [("🔄 Новий розрахунок", "restart")])
+RESULT_KB = _inline(*RESULT_ROWS)
+# Під порівнянням — ті самі кнопки, крім самого порівняння
+RESULT_KB_NO_COMPARE = _inline(*(row for row in RESULT_ROWS if row != [BTN_COMPARE_INLINE]))
+# Сітка «що, якби» перемикає вісь колонок у тому ж повідомленні
+WHATIF_KB = {
+    "engine_cc": _inline([("💵 Рік × ціна", "whatif:car_price")],
+                         [("📩 Залишити заявку", "request")],
+                         [("🔄 Новий розрахунок", "restart")]),
+    "car_price": _inline([("⚙️ Рік × об'єм", "whatif:engine_cc")],
+                         [("📩 Залишити заявку", "request")],
+                         [("🔄 Новий розрахунок", "restart")]),
+}
+REMOVE_KB = types.ReplyKeyboardRemove().to_json()
+
+# Запит номера телефону можливий лише звичайною (reply) клавіатурою
+_contact = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+_contact.add(types.KeyboardButton(BTN_CONTACT, request_contact=True))
+_contact.add(BTN_CANCEL)
+CONTACT_KB = _contact.to_json()
+
+STEP_KEYBOARDS = {"auction_fee": FEE_KB, "fuel_type": FUEL_KB}
+
+
+def apply_rules(rules):
+    """Кнопки й назви країн під поточні правила: нова країна у файлі — нова кнопка без перезапуску"""
+    global COUNTRY_KB
+    BTN_COUNTRY.clear()
+    BTN_COUNTRY.update((c.name, code) for code, c in rules.countries.items())
+    COUNTRY_NAMES.clear()
+    COUNTRY_NAMES.update((code, c.name) for code, c in rules.countries.items())
+    buttons = [(c.name, "country:" + code) for code, c in rules.countries.items()]
+    COUNTRY_KB = _inline(*(buttons[i:i + 2] for i in range(0, len(buttons), 2)), [BTN_CANCEL_INLINE])
+    STEP_KEYBOARDS["country"] = COUNTRY_KB
+
+
+apply_rules(rules_provider.current())
+rules_provider.listeners.append(apply_rules)
+
+
+# ===== ПОВІДОМЛЕННЯ-МАЙСТЕР =====
+# Увесь діалог — одне повідомлення, яке редагується на кожному кроці
+def wizard_text(s, question, error=None):
+    """Введене досі (одним рядком) + помилка, якщо є + питання поточного кроку"""
+    parts = []
+    if s.country:
+        parts.append(COUNTRY_NAMES.get(s.country, s.country))
+    if s.car_price is not None:
+        parts.append(f"{s.car_price:,.0f} USD")
+    if s.auction_fee is not None:
+        parts.append(f"збір {s.auction_fee:,.0f}")
+    if s.delivery_usa is not None:
+        parts.append(f"США {s.delivery_usa:,.0f}")
+    if s.sea_delivery is not None:
+        parts.append(f"море {s.sea_delivery:,.0f}")
+    if s.engine_cc is not None:
+        parts.append(f"{s.engine_cc} см³")
+    if s.fuel_type:
+        parts.append(FUEL_NAMES[s.fuel_type])
+    if s.car_age is not None:
+        parts.append(f"{datetime.datetime.now().year - s.car_age} р.")
+    if s.vin:
+        parts.append(f"VIN …{s.vin[-6:]}")
+    text = ("🚗 " + " · ".join(parts) + "\n\n") if parts else ""
+    if error:
+        text += error + "\n\n"
+    return text + question
+
+
+def prompt_hash(text, markup):
+    """Відбиток показаного в майстрі: crc32 однаковий в усіх процесах, на відміну від hash()"""
+    return zlib.crc32((text + (markup or "")).encode())
+
+
+async def show(s, text, markup, priority=PRIORITY_PROMPT):
+    """Редагує повідомлення-майстер; якщо його немає або воно недоступне — надсилає нове"""
+    digest = prompt_hash(text, markup)
+    if s.prompt_id:
+        if s.prompt_hash == digest:
+            return  # те саме вже на екрані — без виклику API
+        try:
+            await sender.edit_message_text(text, s.chat_id, s.prompt_id, priority=priority,
+                                           parse_mode="Markdown", reply_markup=markup)
+            remember_prompt(s.chat_id, s.prompt_id, digest)
+            return
+        except ApiTelegramException as e:
+            if "message is not modified" in e.description:
+                return
+            if e.error_code != 400:
+                raise
+            # Повідомлення видалене або надто старе — продовжуємо в новому
+    msg = await sender.send_message(s.chat_id, text, priority=priority,
+                                    parse_mode="Markdown", reply_markup=markup)
+    s.prompt_id = msg.message_id
+    remember_prompt(s.chat_id, None, digest, msg.message_id)
+
+
+def remember_prompt(chat_id, prompt_id, digest, new_prompt_id=None):
+    """
+    Поки повідомлення чекало в черзі, інший апдейт міг змінити сесію (крок, відповіді):
+    перечитуємо її і міняємо лише prompt_id / prompt_hash, а не зберігаємо застарілий s.
+    Відбиток редагування — лише якщо майстер за цей час не переїхав в інше повідомлення.
+    """
+    current = sessions.get(chat_id)
+    if current is None or (new_prompt_id is None and current.prompt_id != prompt_id):
+        return
+    if new_prompt_id is not None:
+        current.prompt_id = new_prompt_id
+    current.prompt_hash = digest
+    sessions.save(current)
+
+
+def car_entered(s):
+    """Чи введено вже щось про саме авто (крім країни)"""
+    return any(getattr(s, name) is not None for name in ("car_price", "engine_cc", "fuel_type", "car_age", "vin"))
+
+
+async def show_step(s, error=None):
+    # Поки про авто нічого не відомо, на кроці країни лишається повна підказка з першого повідомлення
+    question = START_QUESTION if s.step == "country" and not car_entered(s) else STEP_QUESTIONS[s.step]
+    await show(s, wizard_text(s, question, error), STEP_KEYBOARDS.get(s.step, CANCEL_KB))
+
+
+async def next_step(s, note=None):
+    """Перший незаповнений крок (VIN заповнює рік, пальне й об'єм наперед); усе відомо — одразу результат"""
+    for step in STEP_QUESTIONS:
+        if getattr(s, step) is None:
+            advance(s, step)
+            await show_step(s, note)
+            return
+    advance(s, "done")
+    await send_result(s)
+
+
+async def start_wizard(uid, title):
+    s = Session(uid)
+    msg = await sender.send_message(uid, title + START_QUESTION,
+                                    parse_mode="Markdown", reply_markup=COUNTRY_KB)
+    s.prompt_id = msg.message_id
+    s.prompt_hash = prompt_hash(title + START_QUESTION, COUNTRY_KB)
+    advance(s, "country")
 
 
 # ===== /start =====
 @bot.message_handler(commands=["start"])
-def cmd_start(message):
-    uid = message.chat.id
-    user_data[uid] = {"step": "country"}
-    bot.send_message(
-        uid,
+@metrics.timed("cmd_start")
+async def cmd_start(message):
+    await start_wizard(
+        message.chat.id,
         "🚗 *Калькулятор вартості авто з США*\n\n"
         "Розрахую повну вартість під ключ з урахуванням:\n"
         "• Аукціонних зборів\n"
         "• Доставки\n"
         "• Митних платежів\n\n"
-        "Починаємо!\n\n" + STEP_QUESTIONS["country"],
-        parse_mode="Markdown",
-        reply_markup=country_keyboard()
+        "📄 Маєте список лотів? Надішліть файл .csv або .xlsx — порахую все разом.\n\n"
+        "Починаємо!\n\n"
     )
 
 
+# ===== ШВИДКИЙ РОЗРАХУНОК =====
+# Реєструється до handle_text: telebot віддає повідомлення першому хендлеру, що підійшов
+QUICK_HELP = (
+    "⚡️ *Швидкий розрахунок одним рядком*\n\n"
+    "`/q UA 8500 0 400 1200 1998 gas 2019`\n"
+    "_країна, ціна, збір (0 — за таблицею), доставка США, море, об'єм, пальне, рік_\n\n"
+    "Або вільно: `poland 12k 2.0 diesel 2018`\n"
+    f"_Без доставки беру {DEFAULT_DELIVERY_USA:.0f} + {DEFAULT_SEA_DELIVERY:.0f} USD._\n\n"
+    "В іншому чаті: `@бот ua 8500 2.0 gas 2019`"
+)
+# Кроки сесії, на яких текст з пробілами пробуємо як запит одним рядком (та без сесії);
+# на початку майстра такий рядок заповнює саму сесію — див. handle_text
+QUICK_STEPS = ("done", "finished")
+
+
+async def quick_result(uid, fields):
+    if not fields["auction_fee"]:
+        fields["auction_fee"] = get_auction_fee(fields["car_price"])
+    s = Session(uid, **fields)
+    advance(s, "done")
+    await send_result(s)
+
+
+@bot.message_handler(commands=["q", "quote"])
+@metrics.timed("cmd_quote")
+async def cmd_quote(message):
+    try:
+        fields = parse_quote(message.text, aliases=rules_provider.current().aliases)
+    except ValueError as e:
+        await sender.send_message(message.chat.id, f"❌ {str(e).capitalize()}\n\n" + QUICK_HELP,
+                                  parse_mode="Markdown")
+        return
+    await quick_result(message.chat.id, fields)
+
+
+@bot.inline_handler(func=lambda query: True)
+@metrics.timed("handle_inline")
+async def handle_inline(query):
+    """@бот ua 8500 2.0 gas 2019 — готовий розрахунок, яким можна поділитися; без країни — усі країни"""
+    text = query.query.strip()
+    rules = rules_provider.current()
+    try:
+        fields = parse_quote(text, require_country=False, aliases=rules.aliases)
+    except ValueError as e:
+        hint = types.InlineQueryResultArticle(
+            "help", "⚡️ Формат: ua 8500 2.0 gas 2019",
+            types.InputTextMessageContent(QUICK_HELP, parse_mode="Markdown"),
+            description=str(e).capitalize() if text else "країна, ціна, об'єм, пальне, рік")
+        await sender.answer_inline_query(query.id, [hint], cache_time=INLINE_CACHE_TIME)
+        return
+
+    if not fields["auction_fee"]:
+        fields["auction_fee"] = get_auction_fee(fields["car_price"])
+    snap = rate_provider.current()
+    countries = [fields["country"]] if fields["country"] else list(rules.countries)
+    results = []
+    for country in countries:
+        inputs = (country, fields["car_price"], fields["auction_fee"], fields["delivery_usa"],
+                  fields["sea_delivery"], fields["engine_cc"], fields["fuel_type"], fields["car_age"])
+        c, msg = cached_quote(inputs, snap, rules)
+        sym = c["currency"]
+        results.append(types.InlineQueryResultArticle(
+            country, f"{COUNTRY_NAMES[country]}: ≈ {c['total_usd']:,.0f} USD під ключ",
+            types.InputTextMessageContent(msg, parse_mode="Markdown"),
+            description=f"≈ {c['total_local']:,.0f} {sym} · мито {c['total_customs']:,.0f} {sym}"))
+    await sender.answer_inline_query(query.id, results, cache_time=INLINE_CACHE_TIME)
+
+
+# ===== АДМІНІСТРАТОР: ЖУРНАЛ РОЗРАХУНКІВ =====
+STATS_HELP = (
+    "📊 *Статистика розрахунків*\n\n"
+    "`/stats last 7d by country`\n"
+    "_період: 24h, 7d, 4w або all; розріз: country, band, fuel, day;_\n"
+    "_фільтри: країна (ua) і ціна (10k або 10-20k)_\n\n"
+    "`/history <chat_id>` — останні розрахунки користувача"
+)
+
+
+def is_admin(message):
+    return message.chat.id == ADMIN_CHAT_ID
+
+
+def _stats_key(by, value):
+    # Без емодзі: у моноширинній таблиці вони ламають вирівнювання
+    if by == "country":
+        calc = rules_provider.current().countries.get(value)
+        return calc.name.split(" ", 1)[-1] if calc else str(value)
+    if by == "band":
+        return band_label(value)
+    if by == "fuel":
+        return FUEL_NAMES.get(value, str(value)).split(" ")[0]
+    return str(value)
+
+
+@bot.message_handler(commands=["stats"], func=is_admin)
+@metrics.timed("cmd_stats")
+async def cmd_stats(message):
+    try:
+        query = parse_stats_args(message.text, rules_provider.current().aliases)
+    except ValueError as e:
+        await sender.send_message(message.chat.id, f"❌ {str(e).capitalize()}\n\n" + STATS_HELP,
+                                  parse_mode="Markdown")
+        return
+    t0 = time.perf_counter()
+    rows = await asyncio.to_thread(quote_log.stats, query["since"], query["by"],
+                                   query["country"], query["bands"])
+    elapsed = time.perf_counter() - t0
+
+    title = f"📊 *Розрахунки за {query['period']}* — by {query['by']}"
+    if query["country"]:
+        title += f" · {COUNTRY_NAMES.get(query['country'], query['country'])}"
+    if query["bands"]:
+        title += " · " + band_label(*query["bands"])
+    if not rows:
+        await sender.send_message(message.chat.id, title + "\n\nРозрахунків немає.", parse_mode="Markdown")
+        return
+    keys = [_stats_key(query["by"], row[0]) for row in rows]
+    width = max(6, *map(len, keys))
+    table = [f"{'':<{width}} {'К-сть':>7} {'Сер.USD':>8} {'Мін':>7} {'Макс':>8}"]
+    for key, (_, count, avg, low, high) in zip(keys, rows):
+        table.append(f"{key:<{width}} {count:>7,} {avg:>8,.0f} {low:>7,.0f} {high:>8,.0f}")
+    total = sum(row[1] for row in rows)
+    await sender.send_message(
+        message.chat.id,
+        f"{title}\nУсього: *{total:,}*\n\n```\n" + "\n".join(table[:51]) + "\n```\n"
+        f"_Під ключ у USD · {elapsed * 1000:.0f} мс_",
+        parse_mode="Markdown")
+
+
+@bot.message_handler(commands=["history"], func=is_admin)
+@metrics.timed("cmd_history")
+async def cmd_history(message):
+    args = message.text.split()[1:]
+    if not args or not args[0].lstrip("-").isdigit():
+        await sender.send_message(message.chat.id, STATS_HELP, parse_mode="Markdown")
+        return
+    chat_id = int(args[0])
+    limit = min(int(args[1]), 50) if len(args) > 1 and args[1].isdigit() else 10
+    quotes = await asyncio.to_thread(quote_log.history, chat_id, limit)
+    if not quotes:
+        await sender.send_message(message.chat.id, f"Розрахунків чату `{chat_id}` немає.", parse_mode="Markdown")
+        return
+    lines = [f"🕘 *Розрахунки чату* `{chat_id}` (останні {len(quotes)})\n"]
+    for q in quotes:
+        when = datetime.datetime.fromtimestamp(q["created_at"])
+        lines.append(
+            f"{when:%d.%m %H:%M} {COUNTRY_NAMES.get(q['country'], q['country'])} · {q['car_price']:,.0f} USD · "
+            f"{q['engine_cc']} см³ · {FUEL_NAMES.get(q['fuel_type'], q['fuel_type'])} · {when.year - q['car_age']} р.\n"
+            f"   → *{q['total_usd']:,.0f} USD* ({q['total_local']:,.0f} {q['currency']}) `#{q['id']}`")
+    await sender.send_message(message.chat.id, "\n".join(lines), parse_mode="Markdown")
+
+
+# ===== АДМІНІСТРАТОР: РОЗСИЛКИ =====
+# Відомі чати — з апдейтів (handle_updates) і журналу розрахунків; ті, що заблокували бота, вибувають.
+# Кожен воркер спершу бере шард своїх чатів (той самий chat_id % WORKERS), тож розсилка йде
+# з повним лімітом бота і не забирає черги розрахунків: PRIORITY_BULK. Звітує один процес (broadcast.py).
+BROADCAST_HELP = (
+    "📣 *Розсилка*\n\n"
+    "`/broadcast <текст>` — чернетка з попереднім переглядом; надсилається після підтвердження.\n"
+    "_Текст іде як є, без форматування._"
+)
+broadcast_store = BroadcastStore(os.path.join(DATA_DIR, "broadcast.db"))
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds} с"
+    if seconds < 3600:
+        return f"{seconds // 60} хв {seconds % 60} с"
+    return f"{seconds // 3600} год {seconds % 3600 // 60} хв"
+
+
+def broadcast_text(p, rate=None):
+    """Звіт про розсилку; rate — повідомлень/с для оцінки часу, що лишився"""
+    total, done = p["total"] or 0, p["processed"]
+    if p["state"] == RUNNING:
+        title = f"📣 *Розсилка #{p['id']}: {min(100, done * 100 // max(total, 1))}%*"
+    elif p["state"] == DONE:
+        title = f"✅ *Розсилку #{p['id']} завершено*"
+    else:
+        title = f"⏹ *Розсилку #{p['id']} зупинено*"
+    lines = [title, "",
+             f"Оброблено {done:,} з {total:,}",
+             f"✅ Надіслано: {p['sent']:,}",
+             f"🚫 Заблокували бота: {p['blocked']:,}",
+             f"⚠️ Помилки: {p['failed']:,}"]
+    if p["state"] == RUNNING and rate:
+        lines.append(f"\n⚡️ {rate:,.1f} повідомл./с · залишилось ≈ {format_duration(max(0, total - done) / rate)}")
+    elif p["finished_at"] and p["started_at"]:
+        lines.append(f"\n⏱ За {format_duration(p['finished_at'] - p['started_at'])}")
+    return "\n".join(lines)
+
+
+async def send_broadcast(chat_id, text):
+    await sender.send_message(chat_id, text, priority=PRIORITY_BULK)
+
+
+async def report_broadcast(p, rate):
+    """Оновлює повідомлення-звіт; фінальний (rate=None) — ще й окремим повідомленням, щоб прийшло сповіщення"""
+    text = broadcast_text(p, rate)
+    markup = _inline([("⏹ Зупинити", f"bcast:stop:{p['id']}")]) if rate is not None else None
+    if p["report_message_id"]:
+        try:
+            await sender.edit_message_text(text, ADMIN_CHAT_ID, p["report_message_id"],
+                                           parse_mode="Markdown", reply_markup=markup)
+        except ApiTelegramException as e:
+            if "message is not modified" not in e.description:
+                raise
+    if rate is None:
+        await sender.send_message(ADMIN_CHAT_ID, text, parse_mode="Markdown")
+
+broadcaster = Broadcaster(broadcast_store, send_broadcast, report_broadcast, BROADCAST_CONCURRENCY)
+
+
+@bot.message_handler(commands=["broadcast"], func=is_admin)
+@metrics.timed("cmd_broadcast")
+async def cmd_broadcast(message):
+    parts = message.text.split(maxsplit=1)
+    if len(parts) < 2:
+        text = BROADCAST_HELP
+        campaign_id = await asyncio.to_thread(broadcast_store.running)
+        if campaign_id is not None:
+            p = await asyncio.to_thread(broadcast_store.progress, campaign_id)
+            text += "\n\n" + broadcast_text(p)
+        await sender.send_message(message.chat.id, text, parse_mode="Markdown")
+        return
+    campaign_id = await asyncio.to_thread(broadcast_store.create, parts[1])
+    counts = await asyncio.to_thread(broadcast_store.chat_counts)
+    # Попередній перегляд — рівно той текст, що отримають користувачі
+    await sender.send_message(message.chat.id, parts[1])
+    await sender.send_message(
+        message.chat.id,
+        f"📣 *Розсилка #{campaign_id}* — вище попередній перегляд.\n"
+        f"Отримувачів: *{counts['active']:,}* (заблокували бота: {counts['blocked']:,}).",
+        parse_mode="Markdown",
+        reply_markup=_inline([("✅ Надіслати всім", f"bcast:go:{campaign_id}")],
+                             [("❌ Скасувати", f"bcast:cancel:{campaign_id}")]))
+
+
+@bot.my_chat_member_handler()
+@metrics.timed("handle_chat_member")
+async def handle_chat_member(update):
+    """Користувач заблокував бота — розсилки його оминають; розблокував — знову в списку"""
+    status = update.new_chat_member.status
+    if status in ("kicked", "left"):
+        await asyncio.to_thread(broadcast_store.block, [update.chat.id])
+    elif status == "member":
+        broadcast_store.seen(update.chat.id)
+
+
+async def broadcast_action(uid, command, campaign_id, message_id):
+    """Кнопки чернетки і звіту: go — запуск, cancel / stop — скасування"""
+    if command == "go":
+        await asyncio.to_thread(broadcast_store.flush)  # щойно написали боту — теж отримувачі
+        total = await asyncio.to_thread(broadcast_store.start, campaign_id, WORKERS, message_id)
+        if total is None:
+            running = await asyncio.to_thread(broadcast_store.running)
+            text = (f"⏳ Спершу має завершитися розсилка #{running}." if running is not None
+                    else f"Розсилка #{campaign_id} вже не чернетка.")
+            await sender.send_message(uid, text)
+            return
+        logging.info(f"📣 Розсилка #{campaign_id}: {total} отримувачів")
+        await report_broadcast(await asyncio.to_thread(broadcast_store.progress, campaign_id), 0.0)
+        broadcaster.notify()
+    elif command in ("cancel", "stop"):
+        if await asyncio.to_thread(broadcast_store.cancel, campaign_id):
+            logging.info(f"⏹ Розсилку #{campaign_id} скасовано")
+        p = await asyncio.to_thread(broadcast_store.progress, campaign_id)
+        text = "❌ Розсилку скасовано." if p["total"] is None else broadcast_text(p)
+        await sender.edit_message_text(text, uid, message_id, parse_mode="Markdown")
+
+
+# ===== СТЕЖЕННЯ ЗА ЦІНОЮ =====
+# Ціль — на кілька відсотків нижче поточної суми під ключ у валюті країни.
+# Після зміни курсів чи правил watch_worker перераховує лише стеження, що могли дійти до цілі.
+WATCH_DROPS = (2, 5, 10)
+
+watchlist = WatchList(os.path.join(DATA_DIR, "watches.db"))
+
+
+def describe_watch(w):
+    year = datetime.datetime.fromtimestamp(w["created_at"]).year - w["car_age"]
+    return (f"{COUNTRY_NAMES.get(w['country'], w['country'])} · {w['car_price']:,.0f} USD · "
+            f"{w['engine_cc']} см³ · {FUEL_NAMES.get(w['fuel_type'], w['fuel_type'])} · {year} р.")
+
+
+def currency_symbol(country, code):
+    calc = rules_provider.current().countries.get(country)
+    return calc.rate(rate_provider.current().rates)["symbol"] if calc else code
+
+
+async def send_watch_alert(w):
+    snap, rules = rate_provider.current(), rules_provider.current()
+    sym = currency_symbol(w["country"], w["currency"])
+    # Розсилка: у черзі надсилання поступається розрахункам і підказкам кроків
+    await sender.send_message(
+        w["chat_id"],
+        f"🔔 *Ціна дійшла до вашої цілі!*\n\n"
+        f"{describe_watch(w)}\n"
+        f"Під ключ: *≈ {w['total']:,.0f} {sym}*\n"
+        f"_було {w['start_total']:,.0f}, ціль {w['target']:,.0f} {sym}_\n\n"
+        f"📌 _Курси v{snap.version}, тарифи {rules.version}._\n"
+        f"Натисніть /start, щоб перерахувати й залишити заявку.",
+        priority=PRIORITY_BULK, parse_mode="Markdown")
+
+watch_worker = WatchWorker(watchlist, lambda: (rate_provider.current(), rules_provider.current()),
+                           send_watch_alert)
+rate_provider.listeners.append(watch_worker.notify)
+rules_provider.listeners.append(watch_worker.notify)
+
+
+async def watches_view(uid):
+    """Текст і кнопки /watches"""
+    items = await asyncio.to_thread(watchlist.for_chat, uid)
+    if not items:
+        return "🔔 Стежень за ціною немає.\n\nПісля розрахунку натисніть «🔔 Стежити за ціною».", None
+    lines = ["🔔 *Ваші стеження за ціною*\n"]
+    buttons = []
+    for n, w in enumerate(items, 1):
+        sym = currency_symbol(w["country"], w["currency"])
+        lines.append(f"{n}. {describe_watch(w)}\n"
+                     f"   зараз ≈ {w['total']:,.0f} {sym} → ціль *≤ {w['target']:,.0f} {sym}*")
+        buttons.append([(f"❌ Прибрати {n}", f"unwatch:{w['id']}")])
+    return "\n".join(lines), _inline(*buttons)
+
+
+@bot.message_handler(commands=["watches"])
+@metrics.timed("cmd_watches")
+async def cmd_watches(message):
+    text, markup = await watches_view(message.chat.id)
+    await sender.send_message(message.chat.id, text, parse_mode="Markdown", reply_markup=markup)
+
+
+def watch_quote(s):
+    """(inputs, calc) поточного розрахунку сесії; None — країни вже немає в правилах"""
+    rules = rules_provider.current()
+    if s.country not in rules.countries:
+        return None
+    inputs = (s.country, s.car_price, s.auction_fee, s.delivery_usa, s.sea_delivery,
+              s.engine_cc, s.fuel_type, s.car_age)
+    c, _ = cached_quote(inputs, rate_provider.current(), rules)
+    return inputs, c
+
+
+async def offer_watch(s):
+    quote = watch_quote(s)
+    if quote is None:
+        await sender.send_message(s.chat_id, "Дані розрахунку вже недоступні. Натисніть /start щоб почати знову.")
+        return
+    _, c = quote
+    total, sym = c["total_local"], c["currency"]
+    markup = _inline(*([(f"−{pct}% · ≤ {total * (1 - pct / 100):,.0f} {sym}", f"watch:{pct}")]
+                       for pct in WATCH_DROPS))
+    await sender.send_message(
+        s.chat_id,
+        f"🔔 *Стежити за ціною*\n\n{COUNTRY_NAMES[s.country]}: зараз під ключ *≈ {total:,.0f} {sym}*.\n"
+        f"Коли повідомити?\n\n_Перераховую, щойно змінюються курси валют або митні тарифи._",
+        parse_mode="Markdown", reply_markup=markup)
+
+
+async def add_watch(s, pct, message_id):
+    quote = watch_quote(s)
+    if quote is None:
+        text = "Дані розрахунку вже недоступні. Натисніть /start щоб почати знову."
+    elif await asyncio.to_thread(watchlist.count_for_chat, s.chat_id) >= WATCH_MAX_PER_CHAT:
+        text = f"❌ У вас уже {WATCH_MAX_PER_CHAT} стежень — приберіть зайві в /watches."
+    else:
+        inputs, c = quote
+        total, sym = c["total_local"], c["currency"]
+        target = round(total * (1 - pct / 100))
+        await asyncio.to_thread(watchlist.add, s.chat_id, inputs, target,
+                                rate_provider.current(), rules_provider.current())
+        text = (f"🔔 *Стежу за ціною*\n\n{COUNTRY_NAMES[s.country]} · {s.car_price:,.0f} USD\n"
+                f"Повідомлю, коли під ключ стане *≤ {target:,.0f} {sym}* (зараз ≈ {total:,.0f}).\n\n"
+                f"/watches — ваші стеження")
+    await sender.edit_message_text(text, s.chat_id, message_id, parse_mode="Markdown")
+
+
 # ===== ГОЛОВНИЙ ОБРОБНИК =====
 @bot.message_handler(content_types=["text"])
-def handle_text(message):
+@metrics.timed("handle_text")
+async def handle_text(message):
     uid  = message.chat.id
     text = message.text.strip()
 
-    # Скасувати — завжди
+    # Скасувати — кнопкою клавіатури запиту контакту
     if text == BTN_CANCEL:
-        user_data.pop(uid, None)
-        bot.send_message(uid, "❌ Розрахунок скасовано.\n\nНатисніть /start щоб почати знову.",
-                         reply_markup=remove_keyboard())
+        sessions.delete(uid)
+        await sender.send_message(uid, "❌ Розрахунок скасовано.\n\nНатисніть /start щоб почати знову.",
+                                  reply_markup=REMOVE_KB)
+        return
+
+    s = sessions.get(uid)
+
+    # Весь запит одним рядком («poland 12k 2.0 diesel 2018») — одразу результат.
+    # Лише поза майстром: на його кроках «8 500» — це відповідь, а не запит
+    if " " in text and (s is None or s.step in QUICK_STEPS):
+        try:
+            fields = parse_quote(text, aliases=rules_provider.current().aliases)
+        except ValueError:
+            pass
+        else:
+            await quick_result(uid, fields)
+            return
+
+    if s is None:
+        await sender.send_message(uid, "Натисніть /start щоб почати розрахунок.")
         return
 
-    if uid not in user_data:
-        bot.send_message(uid, "Натисніть /start щоб почати розрахунок.")
+    step = s.step
+
+    # --- VIN на будь-якому кроці майстра ---
+    if step in STEP_QUESTIONS and looks_like_vin(text):
+        await apply_vin(s, text)
         return
 
-    step = user_data[uid].get("step")
+    # --- Дані авто одним повідомленням («8500 2.0 diesel 2019»), поки ціну ще не введено ---
+    if step in ("country", "car_price") and " " in text and text not in BTN_COUNTRY:
+        try:
+            fields = parse_quote(text, require_country=False, aliases=rules_provider.current().aliases)
+        except ValueError as e:
+            if step == "country" or not SPACED_NUMBER.fullmatch(text):
+                await show_step(s, f"❌ {e}")
+                return
+        else:
+            await fill_car(s, fields)
+            return
 
-    # --- Вибір країни ---
+    # --- Кроки з кнопками: текст приймаємо лише з клавіатур попередньої версії ---
     if step == "country":
         if text not in BTN_COUNTRY:
-            bot.send_message(uid, "Будь ласка, оберіть країну з кнопок нижче 👇",
-                             reply_markup=country_keyboard())
+            await show_step(s, "👇 Оберіть країну кнопками")
             return
-        user_data[uid]["country"] = BTN_COUNTRY[text]
-        user_data[uid]["step"] = "car_price"
-        bot.send_message(uid, STEP_QUESTIONS["car_price"],
-                         parse_mode="Markdown", reply_markup=cancel_keyboard())
+        # Тут немає відповіді на кнопку з назвою країни — тож показуємо наступний крок
+        s.country = BTN_COUNTRY[text]
+        await next_step(s)
         return
 
-    # --- Вибір пального ---
     if step == "fuel_type":
         if text not in BTN_FUEL:
-            bot.send_message(uid, "Будь ласка, оберіть тип пального з кнопок нижче 👇",
-                             reply_markup=fuel_keyboard())
+            await show_step(s, "👇 Оберіть тип пального кнопками")
             return
-        user_data[uid]["fuel_type"] = BTN_FUEL[text]
-        user_data[uid]["step"] = "car_age"
-        bot.send_message(uid, STEP_QUESTIONS["car_age"],
-                         parse_mode="Markdown", reply_markup=cancel_keyboard())
+        await choose_fuel(s, BTN_FUEL[text])
         return
 
     # --- Очікування контакту ---
     if step == "waiting_contact":
-        bot.send_message(uid,
+        await sender.send_message(uid,
             "Натисніть кнопку *«📞 Надіслати мій номер»* нижче\n"
             "або *«❌ Скасувати»* для відміни.",
-            parse_mode="Markdown", reply_markup=contact_keyboard())
+            parse_mode="Markdown", reply_markup=CONTACT_KB)
         return
 
     # --- Завершено ---
     if step in ("done", "finished"):
-        bot.send_message(uid, "Натисніть /start для нового розрахунку.",
-                         reply_markup=remove_keyboard())
+        await sender.send_message(uid, "Натисніть /start для нового розрахунку.",
+                                  reply_markup=REMOVE_KB)
         return
 
     # --- Числові кроки ---
     try:
-        value = float(text.replace(",", ".").replace(" ", "").replace("\u202f", ""))
+        value = float(text.replace(",", ".").replace(" ", "").replace(" ", ""))
     except ValueError:
-        bot.send_message(uid, "❌ Введіть число, наприклад: *8500*",
-                         parse_mode="Markdown", reply_markup=cancel_keyboard())
+        await show_step(s, f"❌ «{text[:20]}» — не число. Введіть, наприклад: *8500*")
         return
 
     if step == "car_price":
         if value <= 0:
-            bot.send_message(uid, "❌ Ціна має бути більше 0", reply_markup=cancel_keyboard())
+            await show_step(s, "❌ Ціна має бути більше 0")
             return
-        user_data[uid]["car_price"] = value
-        user_data[uid]["step"] = "auction_fee"
-        bot.send_message(uid, STEP_QUESTIONS["auction_fee"],
-                         parse_mode="Markdown", reply_markup=cancel_keyboard())
+        s.car_price = value
+        await next_step(s)
 
     elif step == "auction_fee":
         if value == 0:
-            auto_fee = get_auction_fee(user_data[uid]["car_price"])
-            user_data[uid]["auction_fee"] = auto_fee
-            bot.send_message(uid,
-                f"✅ Аукціонний збір: *{auto_fee} USD* (за таблицею Copart/IAAI)",
-                parse_mode="Markdown")
-        else:
-            user_data[uid]["auction_fee"] = value
-        user_data[uid]["step"] = "delivery_usa"
-        bot.send_message(uid, STEP_QUESTIONS["delivery_usa"],
-                         parse_mode="Markdown", reply_markup=cancel_keyboard())
+            await choose_auto_fee(s)
+            return
+        s.auction_fee = value
+        await next_step(s)
 
     elif step == "delivery_usa":
-        user_data[uid]["delivery_usa"] = value
-        user_data[uid]["step"] = "sea_delivery"
-        bot.send_message(uid, STEP_QUESTIONS["sea_delivery"],
-                         parse_mode="Markdown", reply_markup=cancel_keyboard())
+        s.delivery_usa = value
+        await next_step(s)
 
     elif step == "sea_delivery":
-        user_data[uid]["sea_delivery"] = value
-        user_data[uid]["step"] = "engine_cc"
-        bot.send_message(uid, STEP_QUESTIONS["engine_cc"],
-                         parse_mode="Markdown", reply_markup=cancel_keyboard())
+        s.sea_delivery = value
+        await next_step(s)
 
     elif step == "engine_cc":
-        user_data[uid]["engine_cc"] = int(value)
-        user_data[uid]["step"] = "fuel_type"
-        bot.send_message(uid, STEP_QUESTIONS["fuel_type"],
-                         parse_mode="Markdown", reply_markup=fuel_keyboard())
+        s.engine_cc = int(value)
+        await next_step(s)
 
     elif step == "car_age":
         age = (datetime.datetime.now().year - int(value)) if value > 1900 else int(value)
         if age < 0:
-            bot.send_message(uid, "❌ Некоректний рік. Спробуйте ще раз.",
-                             reply_markup=cancel_keyboard())
+            await show_step(s, "❌ Некоректний рік. Спробуйте ще раз.")
             return
-        user_data[uid]["car_age"] = age
-        user_data[uid]["step"] = "done"
-        send_result(uid)
+        s.car_age = age
+        await next_step(s)
+
+
+async def fill_car(s, fields):
+    """Поля з рядка parse_quote — у сесію; країна з рядка, якщо є, замінює обрану кнопкою"""
+    for name, value in fields.items():
+        if value is not None:
+            setattr(s, name, value)
+    if not s.auction_fee:
+        s.auction_fee = get_auction_fee(s.car_price)
+    await next_step(s)
+
+
+async def choose_country(s, country):
+    s.country = country
+    if not car_entered(s):
+        # Підказка, що надіслати далі, вже в повідомленні, а країну показала відповідь на кнопку —
+        # редагувати нічого
+        advance(s, "car_price")
+        return
+    await next_step(s)
+
+
+async def choose_fuel(s, fuel):
+    s.fuel_type = fuel
+    await next_step(s)
+
+
+async def choose_auto_fee(s):
+    s.auction_fee = get_auction_fee(s.car_price)
+    await next_step(s, f"✅ Аукціонний збір: *{s.auction_fee} USD* (за таблицею Copart/IAAI)")
+
+
+async def apply_vin(s, text):
+    """Рік, пальне й об'єм з VIN — у сесію; відповідні кроки майстер далі пропустить"""
+    try:
+        info = vin_decoder.decode(text)
+    except ValueError as e:
+        metrics.VIN_DECODES.labels("invalid").inc()
+        await show_step(s, f"❌ {e}")
+        return
+    s.vin = info.vin
+    found = []
+    if info.year is not None:
+        s.car_age = max(0, datetime.datetime.now().year - info.year)
+        found.append(f"{info.year} р.")
+    if info.fuel_type:
+        s.fuel_type = info.fuel_type
+        found.append(FUEL_NAMES[info.fuel_type])
+    if info.engine_cc is not None:
+        s.engine_cc = info.engine_cc
+        if info.engine_cc:
+            found.append(f"{info.engine_cc} см³")
+    metrics.VIN_DECODES.labels("model" if info.model else "year" if info.year else "unknown").inc()
+    note = "✅ VIN: " + " · ".join(([info.model] if info.model else []) + found)
+    if info.model is None:
+        note += "\n_Модель не знайдена в довіднику — пальне й об'єм уточню окремо_"
+    if getattr(s, s.step) is None:
+        sessions.save(s)
+        await show_step(s, note)
+    else:
+        await next_step(s, note)
 
 
 # ===== ОБРОБНИК КОНТАКТУ =====
 @bot.message_handler(content_types=["contact"])
-def handle_contact(message):
+@metrics.timed("handle_contact")
+async def handle_contact(message):
     uid = message.chat.id
-    if user_data.get(uid, {}).get("step") != "waiting_contact":
+    d = sessions.get(uid)
+    if d is None or d.step != "waiting_contact":
         return
 
-    d = user_data.get(uid, {})
     age = d.get("car_age", "?")
     year = datetime.datetime.now().year - age if isinstance(age, int) else "?"
     country_name = COUNTRY_NAMES.get(d.get("country", ""), "?")
@@ -459,34 +964,107 @@ def handle_contact(message):
         f"  Пальне: {FUEL_NAMES.get(d.get('fuel_type',''), '?')}\n"
         f"  Рік: {year} (~{age} р.)"
     )
+    if d.vin:
+        admin_msg += f"\n  VIN: `{d.vin}`"
+    # Саме ті суми й курс, які бачив користувач
+    quote = await asyncio.to_thread(quote_log.get, d.quote_id) if d.quote_id else None
+    if quote:
+        sym = quote["currency"]
+        admin_msg += (
+            f"\n\n💰 *Розрахунок* `#{quote['id']}`:\n"
+            f"  Під ключ: ≈ {quote['total_local']:,.0f} {sym} (≈ {quote['total_usd']:,.0f} USD)\n"
+            f"  Митні платежі: {quote['total_customs']:,.0f} {sym}\n"
+            f"  Курс: 1 USD = {quote['rate_usd']} {sym} (курси v{quote['rates_version']}, "
+            f"тарифи {quote['rules_version']})"
+        )
+
+    # Запис у чергу — і одразу підтвердження; доставку адміністратору робить lead_worker
+    lead_queue.push(uid, admin_msg, quote_id=d.quote_id)
+    lead_worker.notify()
+
+    advance(d, "finished")
+    await sender.send_message(uid,
+        "✅ *Заявку надіслано!*\n\nМенеджер зв'яжеться з вами найближчим часом. 🤝\n\n"
+        "Натисніть /start для нового розрахунку.",
+        parse_mode="Markdown", reply_markup=REMOVE_KB)
+
+
+# ===== ФАЙЛ ЛОТІВ =====
+BULK_HELP = (
+    "📄 *Масовий розрахунок*\n\n"
+    "Надішліть файл *.csv* або *.xlsx* з колонками:\n"
+    "`country, car_price, engine_cc, fuel_type, year`\n"
+    "і за потреби `auction_fee, delivery_usa, sea_delivery`.\n"
+    "_Я поверну той самий файл з митом, акцизом, ПДВ і підсумком для кожного лота._"
+)
+BULK_PROGRESS_INTERVAL = 2  # сек між оновленнями повідомлення про прогрес
+INLINE_CACHE_TIME = 300     # сек, скільки Telegram кешує відповіді на inline-запит
+
+
+@bot.message_handler(content_types=["document"])
+@metrics.timed("handle_document")
+async def handle_document(message):
+    uid = message.chat.id
+    doc = message.document
+    import bulk  # разом з NumPy; зазвичай уже завантажений preload()
+    fmt = bulk.file_format(doc.file_name)
+    if fmt is None:
+        await sender.send_message(uid, BULK_HELP, parse_mode="Markdown")
+        return
 
+    status = await sender.send_message(uid, "📥 Файл отримано, рахую...")
+    file_info = await bot.get_file(doc.file_id)
+    data = await bot.download_file(file_info.file_path)
+    snap = rate_provider.current()
+    rules = rules_provider.current()
+
+    # Розрахунок — у потоці, а тут раз на кілька секунд редагуємо одне повідомлення
+    stats = {"rows": 0}
+    fd, dst = tempfile.mkstemp(suffix="." + fmt)
+    os.close(fd)
     try:
-        bot.send_message(ADMIN_CHAT_ID, admin_msg, parse_mode="Markdown")
-    except Exception as e:
-        logging.error(f"Помилка надсилання адміністратору: {e}")
+        job = asyncio.create_task(asyncio.to_thread(
+            bulk.price_file, io.BytesIO(data), dst, fmt, snap.rates, stats, BULK_MAX_ROWS, rules))
+        shown = 0
+        while not job.done():
+            await asyncio.wait({job}, timeout=BULK_PROGRESS_INTERVAL)
+            if not job.done() and stats["rows"] != shown:
+                shown = stats["rows"]
+                await sender.edit_message_text(f"⏳ Оброблено рядків: {shown:,}", uid, status.message_id,
+                                               priority=PRIORITY_BULK)
+        try:
+            job.result()
+        except ValueError as e:
+            await sender.edit_message_text(f"❌ {e}", uid, status.message_id)
+            return
+        except Exception as e:
+            # Пошкоджений XLSX (BadZipFile, InvalidFileException) чи інший збій читання
+            logging.error(f"Файл лотів {doc.file_name}: {e!r}")
+            await sender.edit_message_text("❌ Не вдалося прочитати файл — перевірте, що це CSV або XLSX",
+                                           uid, status.message_id)
+            return
 
-    user_data[uid]["step"] = "finished"
-    bot.send_message(uid,
-        "✅ *Заявку надіслано!*\n\nМенеджер зв'яжеться з вами найближчим часом. 🤝\n\n"
-        "Натисніть /start для нового розрахунку.",
-        parse_mode="Markdown", reply_markup=remove_keyboard())
+        summary = f"✅ Готово: розраховано {stats['priced']:,} з {stats['rows']:,} лотів"
+        if stats["errors"]:
+            summary += f"\n⚠️ З помилками: {stats['errors']:,} (див. колонку error)"
+        await sender.edit_message_text(summary, uid, status.message_id)
+        with open(dst, "rb") as f:
+            await sender.send_document(uid, f, visible_file_name="priced_" + doc.file_name,
+                                       caption=f"📌 Курси v{snap.version}, тарифи {rules.version}")
+    finally:
+        os.remove(dst)
 
 
 # ===== ВИВІД РЕЗУЛЬТАТУ =====
-def send_result(uid):
-    d = user_data[uid]
-    country      = d["country"]
-    car_price    = d["car_price"]
-    auction_fee  = d["auction_fee"]
-    delivery_usa = d["delivery_usa"]
-    sea_delivery = d["sea_delivery"]
-    engine_cc    = d["engine_cc"]
-    fuel_type    = d["fuel_type"]
-    car_age      = d["car_age"]
-
+def build_quote(country, car_price, auction_fee, delivery_usa, sea_delivery,
+                engine_cc, fuel_type, car_age, snap, rules):
+    """Розрахунок + текст результату. Результат кешується — не змінювати його після повернення."""
     customs_usd = car_price + auction_fee + delivery_usa + sea_delivery
-    calc_fn, rate = COUNTRY_CALCULATORS[country]
-    c = calc_fn(customs_usd, engine_cc, fuel_type, car_age)
+    calc = rules[country]
+    rate = calc.rate(snap.rates)
+    with metrics.CALC_LATENCY.labels(country).time():
+        c = calc.calc(customs_usd, engine_cc, fuel_type, car_age, rates=snap.rates)
+    c["rates_version"] = snap.version
 
     usd2local     = rate["usd"]
     sym           = rate["symbol"]
@@ -495,11 +1073,13 @@ def send_result(uid):
     customs_total = c["total_customs"]
     total_loc     = logistics_loc + customs_total
     total_usd     = total_loc / usd2local
+    c["total_local"] = total_loc
+    c["total_usd"] = total_usd
 
     year = datetime.datetime.now().year - car_age
     age_word = "рік" if car_age == 1 else ("роки" if 2 <= car_age <= 4 else "років")
     age_note = f"{year} р. ({car_age} {age_word})"
-    country_name = COUNTRY_NAMES.get(country, country)
+    country_name = calc.name
 
     msg = (
         f"✅ *РОЗРАХУНОК ЗАВЕРШЕНО*\n"
@@ -531,48 +1111,569 @@ def send_result(uid):
         f"  *≈ {total_loc:,.0f} {sym}*\n"
         f"  *≈ {total_usd:,.0f} USD*\n\n"
         f"{'─' * 32}\n"
-        f"📌 _1 USD = {usd2local} {sym}_\n"
+        f"📌 _1 USD = {usd2local} {sym} · тарифи {rules.version}_\n"
         f"_Розрахунок орієнтовний. Уточнюйте у менеджера._"
     )
+    return c, msg
+
+
+def cached_quote(inputs, snap, rules):
+    """(calc, текст) з кешу або свіжий розрахунок"""
+    # Рік у ключі — бо текст показує рік випуску, обчислений від поточного.
+    key = QuoteCache.make_key(*inputs, snap.version, rules.version, datetime.datetime.now().year)
+    quote = quote_cache.get(key)
+    if quote is None:
+        quote = build_quote(*inputs, snap, rules)
+        quote_cache.put(key, quote)
+    return quote
+
+
+@metrics.timed("send_result")
+async def send_result(d):
+    inputs = (d.country, d.car_price, d.auction_fee, d.delivery_usa, d.sea_delivery,
+              d.engine_cc, d.fuel_type, d.car_age)
+    rules = rules_provider.current()
+    if d.country not in rules.countries:
+        # Країну прибрали з правил, поки користувач заповнював дані
+        await show(d, "❌ Розрахунок для цієї країни більше недоступний.\n\n"
+                      "Натисніть /start щоб почати знову.", None)
+        return
+    # Один знімок курсів на весь розрахунок — і цифри, і рядок «1 USD = ...».
+    snap = rate_provider.current()
+    c, msg = cached_quote(inputs, snap, rules)
+    calc = rules[d.country]
+    d.quote_id = quote_log.record(d.chat_id, inputs, c, calc.currency, calc.rate(snap.rates))
+    sessions.save(d)
+
+    # Результат займає місце повідомлення-майстра разом з кнопками дій
+    await show(d, msg, RESULT_KB, priority=PRIORITY_RESULT)
+
 
-    markup = types.InlineKeyboardMarkup()
-    markup.add(types.InlineKeyboardButton("📩 Залишити заявку",   callback_data="request"))
-    markup.add(types.InlineKeyboardButton("🔄 Новий розрахунок", callback_data="restart"))
+# ===== ПОРІВНЯННЯ КРАЇН =====
+def build_comparison(selected, car_price, auction_fee, delivery_usa, sea_delivery,
+                     engine_cc, fuel_type, car_age, snap, rules):
+    """Усі країни на одному знімку курсів і одній версії правил; підсумки зведені до USD і відсортовані"""
+    customs_usd = car_price + auction_fee + delivery_usa + sea_delivery
+    rows = []
+    for country, calc in rules.countries.items():
+        rate = calc.rate(snap.rates)
+        with metrics.CALC_LATENCY.labels(country).time():
+            c = calc.calc(customs_usd, engine_cc, fuel_type, car_age, rates=snap.rates)
+        total_loc = customs_usd * rate["usd"] + c["total_customs"]
+        rows.append((total_loc / rate["usd"], c["total_customs"] / rate["usd"], total_loc, rate["symbol"], country))
+    rows.sort()
+
+    # Без прапорця: емодзі в моноширинній таблиці ламають вирівнювання
+    names = {code: c.name.split(" ", 1)[-1] for code, c in rules.countries.items()}
+    width = max(8, *map(len, names.values()))
+    table = [f"{'Країна':<{width}} {'Мито':>7} {'Під ключ':>8}"]
+    for total_usd, customs_total_usd, total_loc, sym, country in rows:
+        mark = " ◀" if country == selected else ""
+        table.append(f"{names[country]:<{width}} {customs_total_usd:>7,.0f} {total_usd:>8,.0f}{mark}")
+    local = [f"  {names[c]}: {total_loc:,.0f} {sym}" for _, _, total_loc, sym, c in rows]
+
+    best_usd, best = rows[0][0], rows[0][4]
+    selected_usd = next(r[0] for r in rows if r[4] == selected)
+    if best == selected:
+        verdict = f"🏆 {rules[best].name} — вже найвигідніший варіант"
+    else:
+        verdict = (f"🏆 Найвигідніше: *{rules[best].name}* — "
+                   f"на {selected_usd - best_usd:,.0f} USD дешевше, ніж {rules[selected].name}")
 
-    bot.send_message(uid, msg, parse_mode="Markdown", reply_markup=remove_keyboard())
-    bot.send_message(uid, "Оберіть дію:", reply_markup=markup)
+    year = datetime.datetime.now().year - car_age
+    return (
+        f"🌍 *ПОРІВНЯННЯ КРАЇН*\n"
+        f"_{car_price:,.0f} USD · {engine_cc} см³ · {FUEL_NAMES[fuel_type]} · {year} р._\n"
+        f"Логістика: *{customs_usd:,.0f} USD*\n\n"
+        "```\n" + "\n".join(table) + "\n```\n"
+        "_Суми в USD; ◀ — обрана країна_\n\n"
+        "🔑 *Під ключ у місцевій валюті:*\n" + "\n".join(local) + "\n\n"
+        f"{verdict}\n\n"
+        f"📌 _Курси v{snap.version}, тарифи {rules.version}. Розрахунок орієнтовний._"
+    )
+
+
+async def send_comparison(d):
+    inputs = (d.car_price, d.auction_fee, d.delivery_usa, d.sea_delivery,
+              d.engine_cc, d.fuel_type, d.car_age)
+    snap = rate_provider.current()
+    rules = rules_provider.current()
+    if d.country not in rules.countries:
+        await sender.send_message(d.chat_id, "Дані розрахунку вже недоступні. Натисніть /start щоб почати знову.")
+        return
+    key = QuoteCache.make_key("compare", *inputs, d.country, snap.version, rules.version,
+                              datetime.datetime.now().year)
+    msg = quote_cache.get(key)
+    if msg is None:
+        msg = build_comparison(d.country, *inputs, snap, rules)
+        quote_cache.put(key, msg)
+    await sender.send_message(d.chat_id, msg, priority=PRIORITY_RESULT, parse_mode="Markdown",
+                              reply_markup=RESULT_KB_NO_COMPARE)
+
+
+# ===== ЩО, ЯКБИ =====
+def build_whatif(country, car_price, auction_fee, delivery_usa, sea_delivery,
+                 engine_cc, fuel_type, car_age, axis, snap, rules):
+    """Сітка рік × об'єм (або ціна) під ключ у тис. USD; «!» — клітинка за межею тарифної сітки"""
+    import whatif
+    grid = whatif.build_grid(country, car_price, auction_fee, delivery_usa, sea_delivery,
+                             engine_cc, fuel_type, car_age, axis, rates=snap.rates, rules=rules)
+    now = datetime.datetime.now().year
+    if axis == "engine_cc":
+        head, columns = "см³", [str(c) for c in grid.columns]
+        between = lambda k: f"{grid.columns[k]} → {grid.columns[k + 1]} см³"
+    else:
+        head, columns = "ціна", [f"{c / 1000:.{1 if c < 10_000 else 0}f}k" for c in grid.columns]
+        between = lambda k: f"ціна {grid.columns[k]:,.0f} → {grid.columns[k + 1]:,.0f} USD"
+
+    # Клітинка — 5 знаків значення + позначка; 5 колонок вміщуються в ширину телефона
+    table = [f"{head:<5}" + "".join(f"{c:>5} " for c in columns)]
+    for i, age in enumerate(grid.ages):
+        cells = []
+        for j in range(len(grid.columns)):
+            mark = "•" if (i, j) == grid.cell else ("!" if grid.marks[i, j] else " ")
+            cells.append(f"{grid.total_usd[i, j] / 1000:>5.1f}{mark}")
+        table.append(f"{now - age:<5}" + "".join(cells))
+
+    lines = []
+    for along, k, jump, name in grid.cliffs[:3]:
+        where = f"{now - grid.ages[k]} → {now - grid.ages[k + 1]} р." if along == 0 else between(k)
+        lines.append(f"  {where}: *+{jump:,.0f} USD* — {name}")
+    cliffs = ("⚠️ *Стрибки на межах тарифів:*\n" + "\n".join(lines)) if lines else \
+        "✅ Поруч немає меж тарифної сітки — підсумок змінюється плавно."
+
+    return (
+        f"📊 *ЩО, ЯКБИ…* — {rules[country].name}\n"
+        f"_{car_price:,.0f} USD · {engine_cc} см³ · {FUEL_NAMES[fuel_type]} · {now - car_age} р._\n"
+        f"Під ключ, тис. USD:\n\n"
+        f"```\n" + "\n".join(table) + "\n```\n"
+        f"_• — ваш варіант; ! — стрибок відносно сусідньої клітинки_\n\n"
+        f"{cliffs}\n\n"
+        f"📌 _Курси v{snap.version}, тарифи {rules.version}. Розрахунок орієнтовний._"
+    )
+
+
+async def send_whatif(d, axis=None, message_id=None):
+    """Нове повідомлення з сіткою; з message_id — перемикання осі в тому ж повідомленні"""
+    inputs = (d.country, d.car_price, d.auction_fee, d.delivery_usa, d.sea_delivery,
+              d.engine_cc, d.fuel_type, d.car_age)
+    snap = rate_provider.current()
+    rules = rules_provider.current()
+    if d.country not in rules.countries:
+        await sender.send_message(d.chat_id, "Дані розрахунку вже недоступні. Натисніть /start щоб почати знову.")
+        return
+    # В електромобіля об'єм ні на що не впливає — лише ціна
+    if d.fuel_type == "electric":
+        axis, markup = "car_price", RESULT_KB_NO_COMPARE
+    else:
+        axis = axis if axis in WHATIF_KB else "engine_cc"
+        markup = WHATIF_KB[axis]
+    key = QuoteCache.make_key(*inputs, "whatif", axis, snap.version, rules.version,
+                              datetime.datetime.now().year)
+    msg = quote_cache.get(key)
+    if msg is None:
+        msg = build_whatif(*inputs, axis, snap, rules)
+        quote_cache.put(key, msg)
+    if message_id is None:
+        await sender.send_message(d.chat_id, msg, priority=PRIORITY_RESULT, parse_mode="Markdown",
+                                  reply_markup=markup)
+        return
+    try:
+        await sender.edit_message_text(msg, d.chat_id, message_id, priority=PRIORITY_RESULT,
+                                       parse_mode="Markdown", reply_markup=markup)
+    except ApiTelegramException as e:
+        if "message is not modified" not in e.description:
+            raise
 
 
 # ===== INLINE КНОПКИ =====
 @bot.callback_query_handler(func=lambda call: True)
-def handle_callback(call):
+@metrics.timed("handle_callback")
+async def handle_callback(call):
     uid = call.message.chat.id
-    bot.answer_callback_query(call.id)
-
-    if call.data == "restart":
-        user_data[uid] = {"step": "country"}
-        bot.send_message(uid,
-            "🔄 *Новий розрахунок*\n\n" + STEP_QUESTIONS["country"],
-            parse_mode="Markdown", reply_markup=country_keyboard())
-
-    elif call.data == "request":
-        if user_data.get(uid, {}).get("step") == "finished":
-            bot.send_message(uid, "✅ Ви вже залишили заявку. Менеджер зв'яжеться з вами.",
-                             reply_markup=remove_keyboard())
+    action, _, arg = call.data.partition(":")
+    # Обрана країна — у спливаючій відповіді: повідомлення-майстер заради неї не редагується
+    toast = f"✅ {COUNTRY_NAMES[arg]}" if action == "country" and arg in COUNTRY_NAMES else None
+    await sender.answer_callback_query(call.id, toast)
+
+    if action == "restart":
+        await start_wizard(uid, "🔄 *Новий розрахунок*\n\n")
+
+    elif action in ("country", "fuel", "fee", "cancel"):
+        s = sessions.get(uid)
+        if s is None:
+            await sender.edit_message_text("Натисніть /start щоб почати розрахунок.",
+                                           uid, call.message.message_id)
+            return
+        # Натиснуте повідомлення і є майстром (навіть якщо користувач повернувся до старішого)
+        if s.prompt_id != call.message.message_id:
+            s.prompt_id = call.message.message_id
+            s.prompt_hash = None
+        if action == "cancel":
+            sessions.delete(uid)
+            await sender.edit_message_text("❌ Розрахунок скасовано.\n\nНатисніть /start щоб почати знову.",
+                                           uid, s.prompt_id)
+        elif action == "country" and arg in COUNTRY_NAMES and (
+                s.step == "country" or s.step == "car_price" and not car_entered(s)):
+            await choose_country(s, arg)
+        elif action == "fuel" and s.step == "fuel_type" and arg in FUEL_NAMES:
+            await choose_fuel(s, arg)
+        elif action == "fee" and s.step == "auction_fee":
+            await choose_auto_fee(s)
+
+    elif action == "compare":
+        s = sessions.get(uid)
+        if s is None or s.car_age is None:
+            await sender.send_message(uid, "Дані розрахунку вже недоступні. Натисніть /start щоб почати знову.")
             return
-        user_data.setdefault(uid, {})["step"] = "waiting_contact"
-        bot.send_message(uid,
+        await send_comparison(s)
+
+    elif action == "whatif":
+        s = sessions.get(uid)
+        if s is None or s.car_age is None:
+            await sender.send_message(uid, "Дані розрахунку вже недоступні. Натисніть /start щоб почати знову.")
+            return
+        # Кнопка з результату — нове повідомлення; перемикач осі — редагує сітку
+        await send_whatif(s, arg or None, call.message.message_id if arg else None)
+
+    elif action == "watch":
+        s = sessions.get(uid)
+        if s is None or s.car_age is None:
+            await sender.send_message(uid, "Дані розрахунку вже недоступні. Натисніть /start щоб почати знову.")
+            return
+        # Кнопка з результату — вибір цілі; кнопка цілі — створює стеження в тому ж повідомленні
+        if not arg:
+            await offer_watch(s)
+        elif arg.isdigit() and int(arg) in WATCH_DROPS:
+            await add_watch(s, int(arg), call.message.message_id)
+
+    elif action == "unwatch":
+        if arg.isdigit():
+            await asyncio.to_thread(watchlist.remove, uid, int(arg))
+        text, markup = await watches_view(uid)
+        await sender.edit_message_text(text, uid, call.message.message_id,
+                                       parse_mode="Markdown", reply_markup=markup)
+
+    elif action == "bcast":
+        command, _, campaign_id = arg.partition(":")
+        if is_admin(call.message) and campaign_id.isdigit():
+            await broadcast_action(uid, command, int(campaign_id), call.message.message_id)
+
+    elif action == "request":
+        s = sessions.get(uid) or Session(uid)
+        if s.step == "finished":
+            await sender.send_message(uid, "✅ Ви вже залишили заявку. Менеджер зв'яжеться з вами.",
+                                      reply_markup=REMOVE_KB)
+            return
+        advance(s, "waiting_contact")
+        await sender.send_message(uid,
             "📞 Надішліть ваш *номер телефону* для зв'язку.\nНатисніть кнопку нижче 👇",
-            parse_mode="Markdown", reply_markup=contact_keyboard())
+            parse_mode="Markdown", reply_markup=CONTACT_KB)
+
+
+# ===== МЕТРИКИ =====
+# Значення, які дешевше порахувати в момент збору, ніж оновлювати на кожну подію
+# count_by_step — необов'язковий у протоколі сховища (SESSION_STORE=модуль:фабрика може його не мати)
+metrics.Gauge("bot_sessions_active", "Активні сесії за кроком", ["step"],
+              fn=getattr(sessions, "count_by_step", lambda: {}))
+metrics.Gauge("bot_send_queue_depth", "Повідомлень у черзі надсилання", fn=lambda: sender.pending)
+metrics.Gauge("bot_leads_pending", "Недоставлені заявки", fn=lead_queue.pending_count)
+metrics.Gauge("bot_rates_version", "Версія знімка курсів", fn=lambda: rate_provider.current().version)
+metrics.Gauge("bot_tariff_rules_info", "Поточна версія тарифних правил", ["version"],
+              fn=lambda: {rules_provider.current().version: 1})
+metrics.Gauge("bot_watches", "Стеження за ціною за станом", ["state"], fn=watchlist.counts)
+metrics.Gauge("bot_broadcast_chats", "Чати для розсилок: active, blocked", ["state"],
+              fn=broadcast_store.chat_counts)
+metrics.Gauge("bot_broadcast_chats_pending", "Нових чатів у буфері списку розсилок", fn=lambda: broadcast_store.pending)
+metrics.Gauge("bot_quote_log_pending", "Розрахунків у буфері журналу", fn=lambda: quote_log.pending)
+metrics.Gauge("bot_startup_seconds", "Від запуску процесу до готовності", fn=lambda: startup_seconds or 0)
+metrics.Gauge("bot_vin_cache_requests", "Звернення до кешу VIN", ["result"],
+              fn=lambda: {"hit": vin_decoder.hits, "miss": vin_decoder.misses})
+metrics.Gauge("bot_quote_cache_size", "Записів у кеші розрахунків", fn=lambda: len(quote_cache))
+metrics.Gauge("bot_quote_cache_requests", "Звернення до кешу розрахунків", ["result"],
+              fn=lambda: {"hit": quote_cache.hits, "miss": quote_cache.misses})
 
 
 # ===== ЗАПУСК =====
-if __name__ == "__main__":
-    logging.info("✅ Бот запущено...")
-    while True:
+WEBHOOK_PATH = "/webhook"
+METRICS_PATH = "/metrics"
+HEALTH_PATH = "/healthz"   # процес живий і event loop відповідає
+READY_PATH = "/readyz"     # Telegram прийняв з'єднання — можна слати трафік; 503 — запуск або зупинка
+POLL_RETRY_MIN, POLL_RETRY_MAX = 0.5, 5  # сек між перезапусками впалого polling
+
+# Час від запуску процесу до готовності; None — ще не готовий
+startup_seconds = None
+
+# Посилання на задачі обробки апдейтів, щоб їх не зібрав GC до завершення і щоб дочекатись їх при зупинці
+_update_tasks = set()
+# SIGTERM / SIGINT: нові апдейти не приймаються, прийняті — дообробляються
+stopping = asyncio.Event()
+# Пул воркерів у головному процесі при WORKERS > 1
+worker_pool = None
+
+
+def track(coro):
+    task = asyncio.create_task(coro)
+    _update_tasks.add(task)
+    task.add_done_callback(_update_tasks.discard)
+    return task
+
+
+def handle_updates(updates):
+    """Обробка апдейтів; чати, що написали боту, — у список розсилок"""
+    for update in updates:
+        message = update.message or (update.callback_query and update.callback_query.message)
+        if message:
+            broadcast_store.seen(message.chat.id)
+    return track(bot.process_new_updates(updates))
+
+
+def process_update(data):
+    # Відповідаємо Telegram одразу, обробка йде у фоні на тому ж event loop
+    handle_updates([types.Update.de_json(data)])
+
+
+async def handle_webhook(request):
+    if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        return web.Response(status=403)
+    if stopping.is_set():
+        # Telegram повторить доставку — апдейт отримає вже новий процес
+        return web.Response(status=503)
+    data = await request.json()
+    if worker_pool is not None:
+        worker_pool.dispatch(data)
+    else:
+        process_update(data)
+    return web.Response()
+
+
+async def handle_metrics(request):
+    return web.Response(body=metrics.render().encode(),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+async def handle_health(request):
+    return web.Response(text="ok")
+
+
+async def handle_ready(request):
+    if stopping.is_set():
+        return web.Response(status=503, text="stopping")
+    if startup_seconds is None:
+        return web.Response(status=503, text="starting")
+    return web.Response(text="ready")
+
+
+def preload():
+    """Файли лотів і «що, якби» тягнуть NumPy (~0.1 с імпорту) — вантажимо вже після готовності, у потоці"""
+    import bulk, whatif  # noqa: F401
+    rules_provider.current().precompile()
+    rules_provider.listeners.append(lambda rules: rules.precompile())
+
+
+def mark_ready():
+    global startup_seconds
+    startup_seconds = time.monotonic() - STARTED_AT
+    logging.info(f"🟢 Готовий до роботи за {startup_seconds:.2f} с від запуску")
+    track(asyncio.to_thread(preload))
+
+
+def request_stop(sig):
+    logging.info(f"🛑 {sig.name}: нові апдейти не приймаємо, дообробляємо прийняті...")
+    stopping.set()
+    # Повторний сигнал — звичайна негайна зупинка
+    loop = asyncio.get_running_loop()
+    for s in (signal.SIGTERM, signal.SIGINT):
+        loop.remove_signal_handler(s)
+
+
+def install_signal_handlers():
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, request_stop, sig)
+
+
+async def drain(timeout=SHUTDOWN_TIMEOUT):
+    """Чекає прийняті апдейти і чергу надсилання (разом не довше timeout сек)"""
+    deadline = time.monotonic() + timeout
+    # Розсилка не бере нових отримувачів; ті, що вже в черзі надсилання, дочекаються нижче
+    stop_broadcast = asyncio.create_task(broadcaster.stop(timeout))
+    if _update_tasks:
+        logging.info(f"⏳ Дообробка апдейтів: {len(_update_tasks)}")
+        _, pending = await asyncio.wait(set(_update_tasks), timeout=timeout)
+        if pending:
+            logging.warning(f"⚠️ Не встигли дообробити за {timeout} с: {len(pending)}")
+    if not await stop_broadcast:
+        logging.warning("⚠️ Розсилка не зупинилась вчасно — решту надішле наступний процес")
+    # Заявки вже в leads.db: що не встигне піти адміністратору — надішле наступний процес
+    if not await sender.drain(max(0.0, deadline - time.monotonic()), skip=(ADMIN_CHAT_ID,)):
+        logging.warning(f"⚠️ Лишилось ненадісланих повідомлень: {sender.pending}")
+
+
+async def close_bot_session():
+    # Воркер, що не встиг зробити жодного виклику API, сесії aiohttp ще не має
+    if asyncio_helper.session_manager.session is not None:
+        await bot.close_session()
+
+
+async def stop_background(tasks):
+    """Зупиняє фонові задачі (журнал дописує буфер) і зберігає сесії"""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    quote_log.close()
+    broadcast_store.close()
+    close = getattr(sessions, "close", None)
+    if close is not None:
+        close()
+
+
+async def start_http(port=PORT, webhook=BOT_MODE == "webhook"):
+    """HTTP-сервер: /metrics, /healthz і /readyz завжди, /webhook — у режимі webhook"""
+    app = web.Application()
+    app.router.add_get(METRICS_PATH, handle_metrics)
+    app.router.add_get(HEALTH_PATH, handle_health)
+    app.router.add_get(READY_PATH, handle_ready)
+    if webhook:
+        app.router.add_post(WEBHOOK_PATH, handle_webhook)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    return runner
+
+
+async def run_webhook():
+    await bot.set_webhook(url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                          secret_token=WEBHOOK_SECRET or None)
+    logging.info(f"✅ Бот запущено (webhook, порт {PORT})...")
+    mark_ready()
+    await stopping.wait()
+
+
+async def run_polling():
+    """
+    getUpdates до сигналу зупинки. Апдейти підтверджуються наступним запитом (offset),
+    тож після зупинки — окремим запитом, коли всі прийняті вже оброблені: новий процес
+    почне з першого неотриманого і жодного не обробить удруге.
+    """
+    await bot.delete_webhook()
+    logging.info(f"✅ Бот запущено (polling, метрики на порту {PORT})...")
+    mark_ready()
+    delay = POLL_RETRY_MIN
+    stop = asyncio.create_task(stopping.wait())
+    while not stopping.is_set():
+        poll = asyncio.create_task(bot.get_updates(offset=bot.offset, timeout=20, request_timeout=30))
+        await asyncio.wait((poll, stop), return_when=asyncio.FIRST_COMPLETED)
+        if not poll.done():
+            # Недочитана відповідь не підтверджена — ці апдейти Telegram віддасть наступному процесу
+            poll.cancel()
+            break
         try:
-            bot.infinity_polling(timeout=30, long_polling_timeout=20)
+            updates = poll.result()
         except Exception as e:
-            logging.error(f"Polling впав: {e}. Перезапуск через 5 сек...")
-            import time
-            time.sleep(5)
+            # Коротка пауза спершу: збій мережі зазвичай миттєвий, а користувачі чекають
+            logging.error(f"Polling: {e}. Повтор через {delay} сек...")
+            await asyncio.wait((stop,), timeout=delay)
+            delay = min(delay * 2, POLL_RETRY_MAX)
+            continue
+        delay = POLL_RETRY_MIN
+        if updates:
+            bot.offset = updates[-1].update_id + 1
+            handle_updates(updates)
+    stop.cancel()
+
+
+async def confirm_offset():
+    """Підтверджує Telegram усі отримані апдейти (limit=1, timeout=0 — наступний лишається в черзі)"""
+    if bot.offset is None:
+        return
+    try:
+        await bot.get_updates(offset=bot.offset, limit=1, timeout=0, request_timeout=5)
+        logging.info(f"✔️ Апдейти до {bot.offset - 1} підтверджено")
+    except Exception as e:
+        logging.warning(f"Не вдалося підтвердити апдейти до {bot.offset - 1}: {e}")
+
+
+def start_background(shard=0):
+    """shard — номер воркера: розсилка спершу дає йому шард з його чатами"""
+    return [asyncio.create_task(sender.run()),
+            asyncio.create_task(rate_provider.run()),
+            asyncio.create_task(rules_provider.run()),
+            asyncio.create_task(quote_log.run()),
+            asyncio.create_task(lead_worker.run()),
+            asyncio.create_task(watch_worker.run()),
+            asyncio.create_task(broadcast_store.run(seed=quote_log.chat_ids)),
+            asyncio.create_task(broadcaster.run(shard))]
+
+
+# ----- багатопроцесний режим -----
+def worker_main(index, queue):
+    """Точка входу процесу-воркера: обробляє апдейти своїх чатів з queue"""
+    # Зупиняє головний процес: воркер дообробляє чергу до сигналу None
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(run_worker(index, queue))
+
+
+async def run_worker(index, queue):
+    background = start_background(index)
+    # Метрики кожного воркера — на своєму порту; зайнятий порт не заважає обробці апдейтів
+    port = WORKER_METRICS_PORT + index
+    try:
+        runner = await start_http(port, webhook=False)
+    except OSError as e:
+        logging.warning(f"Воркер {index}: метрики недоступні ({e})")
+        runner = None
+    logging.info(f"👷 Воркер {index} запущено (pid {os.getpid()}, метрики на порту {port})")
+    mark_ready()
+    try:
+        async for data in receive_updates(queue):
+            process_update(data)
+        await drain()
+    finally:
+        await stop_background(background)
+        if runner is not None:
+            await runner.cleanup()
+        await close_bot_session()
+
+
+async def run_dispatcher():
+    global worker_pool
+    worker_pool = WorkerPool(WORKERS, worker_main)
+    worker_pool.start()
+    runner = await start_http()
+    try:
+        await bot.set_webhook(url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                              secret_token=WEBHOOK_SECRET or None)
+        logging.info(f"✅ Бот запущено (webhook, порт {PORT}, воркерів: {WORKERS})...")
+        mark_ready()
+        supervise = asyncio.create_task(worker_pool.supervise())
+        await stopping.wait()
+        supervise.cancel()
+    finally:
+        # Поки воркери дообробляють чергу, webhook відповідає 503 — Telegram повторить пізніше
+        await asyncio.to_thread(worker_pool.stop, SHUTDOWN_TIMEOUT + 1)
+        await runner.cleanup()
+        await close_bot_session()
+
+
+async def main():
+    install_signal_handlers()
+    if WORKERS > 1:
+        await run_dispatcher()
+        return
+    background = start_background()
+    runner = await start_http()
+    try:
+        await (run_webhook() if BOT_MODE == "webhook" else run_polling())
+        await drain()
+        if BOT_MODE == "polling":
+            await confirm_offset()
+    finally:
+        await stop_background(background)
+        await runner.cleanup()
+        await close_bot_session()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
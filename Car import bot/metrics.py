@@ -0,0 +1,203 @@
+"""
+Метрики у текстовому форматі Prometheus (без сторонніх залежностей)
+Counter / Gauge / Histogram з мітками; render() віддає все для GET /metrics.
+"""
+
+import time
+import functools
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names, values, extra=""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values, **kw):
+        key = tuple(str(v) for v in values) or tuple(str(kw[n]) for n in self.labelnames)
+        child = self._values.get(key)
+        if child is None:
+            child = self._values[key] = self._new_child()
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in self._samples():
+            lines.extend(self._render_child(key, child))
+        return "\n".join(lines)
+
+    def _samples(self):
+        return sorted(self._values.items())
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_fmt_labels(self.labelnames, key)} {child.value:g}"]
+
+
+class Gauge(Counter):
+    """fn — необов'язковий колбек на момент збору: число або {кортеж міток: число}"""
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), fn=None):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def _samples(self):
+        if self.fn is None:
+            return super()._samples()
+        result = self.fn()
+        if not isinstance(result, dict):
+            result = {(): result}
+        samples = []
+        for key, value in sorted(result.items()):
+            v = _Value()
+            v.set(value)
+            samples.append((tuple(str(k) for k in (key if isinstance(key, tuple) else (key,))), v))
+        return samples
+
+
+class _HistogramChild:
+    __slots__ = ("counts", "sum", "count", "bounds")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, key, child):
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += n
+            le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {child.sum:g}")
+        lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {child.count}")
+        return lines
+
+
+def render():
+    return "\n".join(m.render() for m in REGISTRY) + "\n"
+
+
+# ===== МЕТРИКИ БОТА =====
+HANDLER_LATENCY = Histogram("bot_handler_seconds", "Час обробки апдейта хендлером", ["handler"])
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Винятки в хендлерах", ["handler"])
+API_LATENCY = Histogram("bot_telegram_api_seconds", "Тривалість викликів Telegram Bot API", ["method"])
+API_ERRORS = Counter("bot_telegram_api_errors_total", "Помилки Telegram Bot API", ["method", "code"])
+SEND_WAIT = Histogram("bot_send_queue_wait_seconds", "Очікування в черзі надсилання", ["priority"])
+FUNNEL = Counter("bot_funnel_step_total", "Скільки разів користувачі дійшли до кроку", ["step"])
+DISPATCHED = Counter("bot_dispatched_updates_total", "Апдейти, передані воркерам", ["worker"])
+VIN_DECODES = Counter("bot_vin_decodes_total", "Введені VIN: model — знайдено в довіднику, year — лише рік", ["result"])
+WATCH_REPRICED = Counter("bot_watch_repriced_total", "Перераховані стеження за ціною: rates — курси, rules — правила",
+                         ["reason"])
+WATCH_ALERTS = Counter("bot_watch_alerts_total", "Сповіщення стежень: sent, failed (чат недоступний), retry", ["result"])
+BROADCAST_SENT = Counter("bot_broadcast_messages_total", "Повідомлення розсилок: sent, blocked (чат недоступний), failed",
+                         ["result"])
+WORKER_RESTARTS = Counter("bot_worker_restarts_total", "Перезапуски воркерів, що впали")
+CALC_LATENCY = Histogram("bot_calc_seconds", "Час розрахунку мита", ["country"],
+                         buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.01))
+
+
+def timed(handler_name):
+    """Декоратор async-хендлера: гістограма часу + лічильник винятків"""
+    def decorator(fn):
+        latency = HANDLER_LATENCY.labels(handler_name)
+        errors = HANDLER_ERRORS.labels(handler_name)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                latency.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,111 @@
+"""
+Розбір швидкого запиту одним рядком замість 8 кроків діалогу
+  /q UA 8500 0 400 1200 1998 gas 2019   — країна, ціна, збір, доставка США, море, об'єм, пальне, рік
+  poland 12k 2.0 diesel 2018            — вільний порядок; чого немає — за замовчуванням
+Суми: 12k = 12000, 8,500 або 8 500 = 8500; об'єм: 1998, 2.0 або 2.0l; вік: рік випуску або «5р» / «5y».
+Перевірка розбору: python benchmarks/bench_quick.py
+"""
+
+import re
+import datetime
+
+from rules import default_rules
+from tariffs import FUEL_ALIASES
+
+# Якщо доставку не вказано — типові суми з підказок діалогу
+DEFAULT_DELIVERY_USA = 400.0
+DEFAULT_SEA_DELIVERY = 1200.0
+MIN_CAR_PRICE = 100  # менше — майже напевно розбита на частини ціна («8 500» → 8 і 500)
+
+_NUMBER = re.compile(r"^(\d+(?:\.\d+)?)(k|к|тис)?(l|л|cc|см3|см³|y|р|років|роки|рік)?$")
+_THOUSANDS = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+# Нерозривний і вузькі пробіли між групами цифр — завжди тисячі (так форматують скопійовані суми)
+_NARROW_THOUSANDS = re.compile(r"(?<=\d)[\u00a0\u2009\u202f](?=\d{3}(?!\d))")
+# Звичайний пробіл — неоднозначний («8500 500 400»), тож «8 500» склеюється лише як запасний варіант
+# і лише один роздільник: ціни від мільйона не буває, а «12 500 300» — це ціна і збір
+_SPACED_THOUSANDS = re.compile(r"(?<![\d.,])[1-9]\d{0,2} \d{3}(?![\d.,])")
+_ENGINE_UNITS = ("l", "л", "cc", "см3", "см³")
+_AGE_UNITS = ("y", "р", "років", "роки", "рік")
+
+
+def parse_quote(text, year=None, require_country=True, aliases=None):
+    """
+    Повертає dict полів сесії (country, car_price, auction_fee, delivery_usa,
+    sea_delivery, engine_cc, fuel_type, car_age) або кидає ValueError з поясненням.
+    auction_fee = 0 — за таблицею Copart/IAAI (рахує викликач, як і в діалозі).
+    require_country=False — без країни повертається country=None (напр. для порівняння в inline-режимі).
+    aliases — назви країн з поточних правил (TariffRules.aliases).
+    Якщо рядок як є не розбирається (або ціна нижче MIN_CAR_PRICE), пробує ще раз,
+    склеївши групи цифр через пробіл, як у діалозі: «ua 8 500 2.0 gas 2019» → ціна 8500.
+    """
+    text = _NARROW_THOUSANDS.sub("", text)
+    try:
+        return _parse(text, year, require_country, aliases)
+    except ValueError as e:
+        joined = _SPACED_THOUSANDS.sub(lambda m: m.group(0).replace(" ", ""), text)
+        if joined == text:
+            raise
+        try:
+            return _parse(joined, year, require_country, aliases)
+        except ValueError:
+            raise e from None
+
+
+def _parse(text, year, require_country, aliases):
+    year = year or datetime.datetime.now().year
+    aliases = aliases or default_rules().aliases
+    country = fuel = engine = age = None
+    plain = []
+    for token in text.lower().split():
+        # 8,500 — тисячі; 2,0 — десятковий дріб
+        token = _THOUSANDS.sub("", token.strip(";")).replace(",", ".")
+        if token in ("/q", "/quote") or token.startswith(("/q@", "/quote@")):
+            continue
+        if token in aliases:
+            country = aliases[token]
+            continue
+        if token in FUEL_ALIASES:
+            fuel = FUEL_ALIASES[token]
+            continue
+        m = _NUMBER.match(token)
+        if m is None:
+            raise ValueError(f"незрозуміло: «{token}»")
+        value, thousands, unit = float(m.group(1)), m.group(2), m.group(3)
+        if thousands:
+            value *= 1000
+        if unit in _ENGINE_UNITS or (unit is None and not thousands and "." in m.group(1) and value < 10):
+            engine = int(round(value * 1000)) if value < 10 else int(value)
+        elif unit in _AGE_UNITS:
+            age = int(value)
+        else:
+            plain.append((value, bool(thousands)))
+
+    # Останнє «голе» число — рік випуску (або вік, якщо решту вже розпізнано)
+    if age is None and plain and not plain[-1][1]:
+        last = plain[-1][0]
+        if 1900 < last <= year or (last < 100 and (len(plain) > 1 or engine is not None)):
+            plain.pop()
+            age = (year - int(last)) if last > 1900 else int(last)
+    # Потім — об'єм двигуна, якщо його не задано одиницями
+    if engine is None and len(plain) > 1 and not plain[-1][1] and plain[-1][0] <= 10000:
+        engine = int(plain.pop()[0])
+    if fuel == "electric" and engine is None:
+        engine = 0
+
+    money = [value for value, _ in plain]
+    missing = [name for name, value in (("країна", country if require_country else ""),
+                                        ("ціна", money[:1] or None),
+                                        ("об'єм двигуна", engine), ("рік випуску", age)) if value is None]
+    if missing:
+        raise ValueError("не вистачає: " + ", ".join(missing))
+    if len(money) > 4:
+        raise ValueError("забагато чисел")
+    if money[0] < MIN_CAR_PRICE:
+        raise ValueError(f"ціна має бути щонайменше {MIN_CAR_PRICE} USD")
+    money += [0.0, DEFAULT_DELIVERY_USA, DEFAULT_SEA_DELIVERY][len(money) - 1:]
+    return {
+        "country": country, "car_price": money[0], "auction_fee": money[1],
+        "delivery_usa": money[2], "sea_delivery": money[3],
+        "engine_cc": engine, "fuel_type": fuel or "gasoline", "car_age": age,
+    }
+
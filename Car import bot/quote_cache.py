@@ -0,0 +1,47 @@
+"""
+Кеш готових розрахунків: (країна, нормалізовані вхідні дані, версія курсів) -> (результат calc, текст)
+Популярні комбінації (8500 USD / 1998 см³ / бензин / 5 р.) віддаються без перерахунку.
+"""
+
+from collections import OrderedDict
+
+
+class QuoteCache:
+    def __init__(self, max_size=10_000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    @staticmethod
+    def make_key(country, car_price, auction_fee, delivery_usa, sea_delivery,
+                 engine_cc, fuel_type, car_age, *context):
+        """Суми — до центів (8500 і 8500.0 дають один ключ); context — версія курсів тощо"""
+        return (country, round(car_price, 2), round(auction_fee, 2), round(delivery_usa, 2),
+                round(sea_delivery, 2), int(engine_cc), fuel_type, int(car_age), *context)
+
+    def get(self, key):
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def clear(self, *_):
+        self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data),
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,167 @@
+"""
+Курси валют: знімки (snapshot) з фоновим оновленням
+Розрахунок ніколи не чекає мережу — береться останній знімок, а застарілий
+оновлюється у фоні (stale-while-revalidate). Джерело підключається через RATES_SOURCE:
+  static                                — вбудовані tariffs.RATES
+  /path/rates.json                      — локальний файл
+  https://open.er-api.com/v6/latest/USD — HTTP JSON
+Формат даних: {"UAH": {"usd": 41.5, "eur": 44.5}, ...} або USD-базовий {"rates": {"UAH": 41.5, "EUR": 0.93, ...}}
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+
+from tariffs import RATES
+
+
+class RateSnapshot:
+    """Незмінний знімок курсів. version зростає лише коли змінилися самі курси."""
+    __slots__ = ("version", "rates", "source", "fetched_at")
+
+    def __init__(self, version, rates, source, fetched_at):
+        self.version = version
+        self.rates = rates
+        self.source = source
+        self.fetched_at = fetched_at
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def to_json(self):
+        return {"version": self.version, "source": self.source, "fetched_at": self.fetched_at,
+                "rates": {code: {"usd": r["usd"], "eur": r["eur"]} for code, r in self.rates.items()}}
+
+    def __repr__(self):
+        return f"RateSnapshot(v{self.version}, {self.source})"
+
+
+def parse_rates(data, base=RATES):
+    """Перетворює дані джерела на dict формату tariffs.RATES (символи валют — з base)"""
+    if "rates" in data:
+        per_usd = data["rates"]
+        raw = {code: (per_usd[code], per_usd[code] / per_usd["EUR"]) for code in base}
+    else:
+        raw = {code: (data[code]["usd"], data[code]["eur"]) for code in base}
+    parsed = {}
+    for code, (usd, eur) in raw.items():
+        usd, eur = float(usd), float(eur)
+        if not (usd > 0 and eur > 0):
+            raise ValueError(f"Некоректний курс {code}: usd={usd}, eur={eur}")
+        parsed[code] = {**base[code], "usd": usd, "eur": eur}
+    return parsed
+
+
+# ===== ДЖЕРЕЛА =====
+class StaticSource:
+    name = "static"
+
+    async def fetch(self):
+        return RATES
+
+
+class FileSource:
+    def __init__(self, path):
+        self.path = path
+        self.name = f"file:{path}"
+
+    async def fetch(self):
+        with open(self.path, encoding="utf-8") as f:
+            return parse_rates(json.load(f))
+
+
+class HttpSource:
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+        self.name = url
+
+    async def fetch(self):
+        import aiohttp
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as s:
+            async with s.get(self.url) as resp:
+                resp.raise_for_status()
+                return parse_rates(await resp.json(content_type=None))
+
+
+def make_source(spec):
+    if not spec or spec == "static":
+        return StaticSource()
+    if spec.startswith(("http://", "https://")):
+        return HttpSource(spec)
+    return FileSource(spec)
+
+
+# ===== ПРОВАЙДЕР =====
+class RateProvider:
+    def __init__(self, source, refresh_interval=3600, cache_path=None):
+        self.source = source
+        self.refresh_interval = refresh_interval
+        self.cache_path = cache_path
+        self._snapshot = self._load_cache() or RateSnapshot(1, RATES, "static", 0.0)
+        self._refreshing = None
+        self.listeners = []  # викликаються з новим знімком, коли змінилися курси
+
+    def current(self):
+        """Поточний знімок без очікування; якщо застарів — оновлення запускається у фоні"""
+        snap = self._snapshot
+        if snap.age() > self.refresh_interval and self._refreshing is None:
+            try:
+                self._refreshing = asyncio.get_running_loop().create_task(self.refresh())
+            except RuntimeError:
+                pass  # немає event loop (напр. пакетний скрипт) — працюємо з тим, що є
+        return snap
+
+    async def refresh(self):
+        try:
+            rates = await self.source.fetch()
+            old = self._snapshot
+            version = old.version if rates == old.rates else old.version + 1
+            self._snapshot = RateSnapshot(version, rates, self.source.name, time.time())
+            if version != old.version:
+                logging.info(f"💱 Курси оновлено (v{version}): "
+                             + ", ".join(f"{c}={r['usd']}" for c, r in rates.items()))
+                self._save_cache()
+                for listener in self.listeners:
+                    listener(self._snapshot)
+            return True
+        except Exception as e:
+            logging.error(f"Не вдалося оновити курси з {self.source.name}: {e}")
+            return False
+        finally:
+            self._refreshing = None
+
+    async def run(self):
+        """Фонове оновлення за розкладом; після помилки — повтор зі зростаючою паузою"""
+        delay = 30
+        while True:
+            if await self.refresh():
+                delay = 30
+                await asyncio.sleep(self.refresh_interval)
+            else:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.refresh_interval)
+
+    # ----- останній вдалий знімок на диску: після рестарту не повертаємось до static -----
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+            return RateSnapshot(data["version"], parse_rates(data["rates"]),
+                                data["source"], data["fetched_at"])
+        except Exception as e:
+            logging.error(f"Кеш курсів пошкоджено ({self.cache_path}): {e}")
+            return None
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        tmp = f"{self.cache_path}.{os.getpid()}.tmp"  # кілька воркерів пишуть один файл
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._snapshot.to_json(), f)
+        os.replace(tmp, self.cache_path)
@@ -0,0 +1,461 @@
+"""
+Митні правила країн як дані (tariff_rules.json), скомпільовані в обчислювачі
+Зміна ставок або нова країна — правка файлу без деплою: RulesProvider перечитує його
+на льоту і підміняє правила цілком, лише після успішної компіляції.
+
+Формат файлу:
+  {"version": "2026-10-01",
+   "currencies": {"RON": {"usd": 4.6, "eur": 4.97, "symbol": "лей"}},   — лише валюти поза tariffs.RATES
+   "countries": {"poland": {"name": "🇵🇱 Польща", "currency": "PLN", "aliases": ["pl"],
+                            "duty": [випадок, ...], "excise": [...], "vat": [...]}}}
+Платіж — список випадків; діє перший, чия умова when виконується (останній — без when):
+  {"when": {"car_age": {"gt": 2}, "fuel_type": {"not_in": ["electric"]}},
+   "currency": "EUR",                 — валюта розрахунку: local (за замовчуванням) | USD | EUR
+   "terms": ["customs", 0.184],       — множники зліва направо; без terms платіж = 0
+   "note": "18.4% ..."}               — підпис; {назва} — вхідні поля і названі множники
+Множники: "customs" (митна вартість у валюті випадку), "engine_cc", "car_age", "customs_usd",
+"subtotal" (лише ПДВ: вартість + мито + акциз у місцевій валюті), число, {"div": 100},
+{"by": поле, "table": [[межа, ставка], ...], "default": ставка, "notes": [...], "columns": {"by": поле, "limits": [...]}},
+{"by": поле, "map": {значення: ставка}, "default": ставка}.
+"name" у множнику зберігає його значення для note, "as" — добуток на цей момент.
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import operator
+import functools
+
+from brackets import Brackets
+from tariffs import RATES
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tariff_rules.json")
+
+COMPONENTS = ("duty", "excise", "vat")
+FIELDS = ("customs", "customs_usd", "engine_cc", "car_age", "fuel_type", "subtotal")
+CURRENCIES = ("local", "USD", "EUR")
+
+_OPS = {"eq": operator.eq, "ne": operator.ne, "gt": operator.gt, "gte": operator.ge,
+        "lt": operator.lt, "lte": operator.le}
+
+# Перевірочні лоти: кожне правило виконується на них до того, як стати поточним
+_SAMPLE_LOTS = [(10_000.0, cc, fuel, age)
+                for cc in (0, 1998, 2500, 120_000)
+                for fuel in ("gasoline", "diesel", "hybrid", "electric")
+                for age in (0, 3, 6, 30)]
+
+
+# ===== МНОЖНИКИ =====
+class _Term:
+    notes = None  # підписи за рядками таблиці — лише в _Table
+
+    __slots__ = ("name", "running", "divide")
+
+    def __init__(self, spec):
+        spec = spec if isinstance(spec, dict) else {}
+        self.name = spec.get("name")
+        self.running = spec.get("as")
+        self.divide = False
+
+
+class _Input(_Term):
+    __slots__ = ("field",)
+
+    def __init__(self, field):
+        super().__init__(field)
+        if field not in FIELDS:
+            raise ValueError(f"невідоме поле «{field}»")
+        self.field = field
+
+    def scalar(self, v):
+        return v[self.field]
+
+    array = scalar
+
+
+class _Const(_Term):
+    __slots__ = ("value",)
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        if isinstance(spec, dict):
+            self.value = float(spec["div"])
+            self.divide = True
+        else:
+            self.value = spec
+
+    def scalar(self, v):
+        return self.value
+
+    array = scalar
+
+
+class _Table(_Term):
+    """Ставка за межами (Brackets); з columns — рядок за одним полем, колонка за іншим"""
+    __slots__ = ("by", "brackets", "notes", "columns_by", "columns")
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.by = spec["by"]
+        rows = [(limit, tuple(value) if isinstance(value, list) else value) for limit, value in spec["table"]]
+        default = spec["default"]
+        self.brackets = Brackets(rows, tuple(default) if isinstance(default, list) else default)
+        self.notes = tuple(spec["notes"]) if "notes" in spec else None
+        if self.notes is not None and not self.name:
+            raise ValueError("notes потребують name — підпис доступний як {name_note}")
+        if self.notes is not None and len(self.notes) != len(self.brackets.values):
+            raise ValueError(f"notes: потрібно {len(self.brackets.values)} підписів (межі + default)")
+        columns = spec.get("columns")
+        self.columns_by = columns and columns["by"]
+        self.columns = columns and Brackets([(limit, i) for i, limit in enumerate(columns["limits"])],
+                                            len(columns["limits"]))
+        if self.columns is not None:
+            width = len(self.columns.values)
+            if any(not isinstance(row, tuple) or len(row) != width for row in self.brackets.values):
+                raise ValueError(f"кожен рядок таблиці має містити {width} ставки (колонки {self.columns_by})")
+        for field in (self.by, self.columns_by or self.by):
+            if field not in FIELDS:
+                raise ValueError(f"невідоме поле «{field}»")
+
+    def scalar(self, v):
+        value = self.brackets.lookup(v[self.by])
+        if self.columns is not None:
+            value = value[self.columns.index(v[self.columns_by])]
+        return value
+
+    def array(self, v):
+        column = None if self.columns is None else self.columns.index_array(v[self.columns_by])
+        return self.brackets.lookup_array(v[self.by], column=column)
+
+
+class _Map(_Term):
+    __slots__ = ("by", "mapping", "default")
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.by = spec["by"]
+        self.mapping = dict(spec["map"])
+        self.default = spec.get("default", 1.0)
+        if self.by not in FIELDS:
+            raise ValueError(f"невідоме поле «{self.by}»")
+
+    def scalar(self, v):
+        return self.mapping.get(v[self.by], self.default)
+
+    def array(self, v):
+        import numpy as np
+        key = v[self.by]
+        out = np.full(len(key), self.default, dtype=float)
+        for value, rate in self.mapping.items():
+            out[key == value] = rate
+        return out
+
+
+def _term(spec):
+    if isinstance(spec, str):
+        return _Input(spec)
+    if isinstance(spec, (int, float)) or (isinstance(spec, dict) and "div" in spec):
+        return _Const(spec)
+    if isinstance(spec, dict) and "table" in spec:
+        return _Table(spec)
+    if isinstance(spec, dict) and "map" in spec:
+        return _Map(spec)
+    raise ValueError(f"незрозумілий множник {spec!r}")
+
+
+# ===== УМОВИ І ВИПАДКИ =====
+def _condition(field, spec):
+    """Функції-перевірки поля: приймають і число, і масив"""
+    if field not in FIELDS:
+        raise ValueError(f"невідоме поле умови «{field}»")
+    if not isinstance(spec, dict):
+        spec = {"eq": spec}
+    checks = []
+    for op, operand in spec.items():
+        if op in _OPS:
+            checks.append(functools.partial(_compare, _OPS[op], operand))
+        elif op in ("in", "not_in"):
+            checks.append(functools.partial(_member, tuple(operand), op == "in"))
+        else:
+            raise ValueError(f"невідомий оператор «{op}»")
+    return checks
+
+
+def _compare(op, operand, x):
+    return op(x, operand)
+
+
+def _member(values, inside, x):
+    if isinstance(x, str) or not hasattr(x, "__len__"):
+        return (x in values) == inside
+    import numpy as np
+    found = np.isin(x, values)
+    return found if inside else ~found
+
+
+class _Case:
+    __slots__ = ("checks", "currency", "terms", "note", "formatted")
+
+    def __init__(self, spec):
+        self.checks = tuple((field, check) for field, cond in spec.get("when", {}).items()
+                            for check in _condition(field, cond))
+        self.currency = spec.get("currency", "local")
+        if self.currency not in CURRENCIES:
+            raise ValueError(f"валюта випадку — одна з {', '.join(CURRENCIES)}")
+        self.terms = tuple(_term(t) for t in spec.get("terms", ()))
+        if self.terms and self.terms[0].divide:
+            raise ValueError("формула не може починатися з ділення")
+        for term in self.terms:
+            for key in (term.name, term.running):
+                if key in FIELDS:
+                    raise ValueError(f"назва «{key}» збігається з вхідним полем")
+        self.note = spec.get("note", "")
+        self.formatted = "{" in self.note
+
+    def matches(self, v):
+        for field, check in self.checks:
+            if not check(v[field]):
+                return False
+        return True
+
+    def mask(self, v):
+        m = True
+        for field, check in self.checks:
+            m = m & check(v[field])
+        return m
+
+    def customs(self, customs_usd, r):
+        if self.currency == "local":
+            return customs_usd * r["usd"]
+        if self.currency == "EUR":
+            return customs_usd * (r["usd"] / r["eur"])
+        return customs_usd
+
+    def to_local(self, amount, r):
+        if self.currency == "local":
+            return amount
+        if self.currency == "EUR":
+            return amount * r["eur"]
+        return amount * r["usd"]
+
+    def scalar(self, v, r):
+        """(сума в місцевій валюті, підпис); названі множники дописуються у v для підпису"""
+        if not self.terms:
+            return 0.0, self.note
+        v["customs"] = self.customs(v["customs_usd"], r)
+        amount = None
+        # Порядок множень — зліва направо, як у файлі: від нього залежать останні біти результату
+        for term in self.terms:
+            x = term.scalar(v)
+            if amount is None:
+                amount = x
+            elif term.divide:
+                amount = amount / x
+            else:
+                amount = amount * x
+            if term.name:
+                v[term.name] = x
+                if term.notes is not None:
+                    v[term.name + "_note"] = term.notes[term.brackets.index(v[term.by])]
+            if term.running:
+                v[term.running] = amount
+        return self.to_local(amount, r), (self.note.format_map(v) if self.formatted else self.note)
+
+    def array(self, v, r):
+        if not self.terms:
+            return 0.0
+        v["customs"] = self.customs(v["customs_usd"], r)
+        amount = None
+        for term in self.terms:
+            x = term.array(v)
+            if amount is None:
+                amount = x
+            elif term.divide:
+                amount = amount / x
+            else:
+                amount = amount * x
+        return self.to_local(amount, r)
+
+
+# ===== КРАЇНА =====
+class Country:
+    """Скомпільовані правила однієї країни: calc — для одного лота, calc_batch — для масивів"""
+    __slots__ = ("code", "name", "currency", "aliases", "fallback_rate", "version", "components", "tables",
+                 "digest")
+
+    def __init__(self, code, spec, version, currencies):
+        self.code = code
+        self.name = spec["name"]
+        self.currency = spec["currency"]
+        self.aliases = tuple(a.lower() for a in spec.get("aliases", ()))
+        self.version = version
+        self.fallback_rate = currencies.get(self.currency) or RATES.get(self.currency)
+        if self.fallback_rate is None:
+            raise ValueError(f"невідома валюта {self.currency} (додайте її в currencies)")
+        # Відбиток правил країни: нова version файлу не означає, що змінилися ставки саме тут
+        self.digest = hashlib.sha1(json.dumps([spec, self.fallback_rate], sort_keys=True).encode()).hexdigest()[:16]
+        self.components = {}
+        self.tables = {}
+        for component in COMPONENTS:
+            cases = []
+            for i, case_spec in enumerate(spec[component]):
+                try:
+                    case = _Case(case_spec)
+                except (KeyError, TypeError, ValueError) as e:
+                    raise ValueError(f"{component}[{i}]: {e}")
+                if component != "vat" and any(getattr(t, "field", None) == "subtotal" for t in case.terms):
+                    raise ValueError(f"{component}[{i}]: subtotal доступний лише для vat")
+                self.tables.update((t.name, t) for t in case.terms if t.name and isinstance(t, _Table))
+                cases.append(case)
+            if not cases or cases[-1].checks:
+                raise ValueError(f"{component}: останній випадок має бути без умови when")
+            self.components[component] = tuple(cases)
+
+    def rate(self, rates):
+        """Курс валюти країни зі знімка; валюти, яких джерело не дає, — з файлу правил"""
+        return rates.get(self.currency) or self.fallback_rate
+
+    def calc(self, customs_usd, engine_cc, fuel_type, car_age, rates=RATES):
+        """Суми й примітки *_local / *_note, total_customs, currency, rules_version (без EUR-проміжних duty_eur і excise_eur колишніх calc_*)"""
+        r = self.rate(rates)
+        v = {"customs_usd": customs_usd, "engine_cc": engine_cc, "fuel_type": fuel_type, "car_age": car_age}
+        out = {}
+        for component in COMPONENTS:
+            if component == "vat":
+                v["subtotal"] = customs_usd * r["usd"] + out["duty_local"] + out["excise_local"]
+            for case in self.components[component]:
+                if case.matches(v):
+                    out[component + "_local"], out[component + "_note"] = case.scalar(v, r)
+                    break
+        out["total_customs"] = out["duty_local"] + out["excise_local"] + out["vat_local"]
+        out["currency"] = r["symbol"]
+        out["rules_version"] = self.version
+        return out
+
+    def calc_batch(self, customs_usd, engine_cc, fuel_type, car_age, r):
+        """Масиви (мито, акциз, ПДВ, разом) у місцевій валюті; ті самі операції, що й calc"""
+        import numpy as np
+        v = {"customs_usd": customs_usd, "engine_cc": engine_cc, "fuel_type": fuel_type, "car_age": car_age}
+        out = {}
+        for component in COMPONENTS:
+            if component == "vat":
+                v["subtotal"] = customs_usd * r["usd"] + out["duty"] + out["excise"]
+            cases = self.components[component]
+            result = cases[-1].array(v, r)
+            for case in reversed(cases[:-1]):
+                result = np.where(case.mask(v), case.array(v, r), result)
+            if np.ndim(result) == 0:
+                result = np.full(len(customs_usd), result)
+            out[component] = result
+        return out["duty"], out["excise"], out["vat"], out["duty"] + out["excise"] + out["vat"]
+
+    def __repr__(self):
+        return f"Country({self.code}, {self.currency}, v{self.version})"
+
+
+class TariffRules:
+    """Незмінний набір правил однієї версії файлу"""
+    __slots__ = ("version", "source", "countries", "aliases")
+
+    def __init__(self, data, source=""):
+        self.version = str(data["version"])
+        self.source = source
+        currencies = data.get("currencies", {})
+        self.countries = {}
+        for code, spec in data["countries"].items():
+            try:
+                self.countries[code] = Country(code, spec, self.version, currencies)
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"{code}: {e}")
+        if not self.countries:
+            raise ValueError("у файлі немає жодної країни")
+        self.aliases = {}
+        for code, country in self.countries.items():
+            for alias in (code, *country.aliases):
+                self.aliases[alias] = code
+        # Підписи й умови перевіряються виконанням, а не лише розбором
+        for code, country in self.countries.items():
+            for lot in _SAMPLE_LOTS:
+                try:
+                    country.calc(*lot)
+                except Exception as e:
+                    raise ValueError(f"{code}: правило не виконується для {lot}: {e!r}")
+
+    def __getitem__(self, code):
+        return self.countries[code]
+
+    def precompile(self):
+        """Масиви NumPy усіх таблиць — заздалегідь, щоб перший пакетний розрахунок їх не будував"""
+        for country in self.countries.values():
+            for cases in country.components.values():
+                for case in cases:
+                    for term in case.terms:
+                        if isinstance(term, _Table):
+                            term.brackets._arrays()
+                            if term.columns is not None:
+                                term.columns._arrays()
+        return self
+
+    def __repr__(self):
+        return f"TariffRules(v{self.version}, {', '.join(self.countries)})"
+
+
+def load_rules(path=DEFAULT_RULES_PATH):
+    with open(path, encoding="utf-8") as f:
+        return TariffRules(json.load(f), source=path)
+
+
+@functools.lru_cache(maxsize=None)
+def default_rules():
+    """Правила з файлу в репозиторії — для пакетних скриптів і бенчмарків"""
+    return load_rules(DEFAULT_RULES_PATH)
+
+
+# ===== ГАРЯЧЕ ПЕРЕЗАВАНТАЖЕННЯ =====
+class RulesProvider:
+    def __init__(self, path=DEFAULT_RULES_PATH, check_interval=30):
+        self.path = path
+        self.check_interval = check_interval
+        self._stamp = self._file_stamp()
+        self._rules = load_rules(path)  # битий файл на старті — помилка конфігурації
+        self.listeners = []  # викликаються з новими правилами після заміни
+
+    def current(self):
+        """Поточні правила; брати один раз на розрахунок, щоб усі платежі були з однієї версії"""
+        return self._rules
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def reload(self):
+        """Перечитує файл, якщо він змінився; при помилці лишаються попередні правила"""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        if stamp is None:
+            logging.error(f"Файл тарифних правил {self.path} недоступний — лишаються v{self._rules.version}")
+            return False
+        try:
+            rules = load_rules(self.path)
+        except Exception as e:
+            logging.error(f"❌ Тарифні правила {self.path} не застосовано: {e} — лишаються v{self._rules.version}")
+            return False
+        old, self._rules = self._rules, rules
+        if rules.version == old.version:
+            logging.warning(f"⚠️ Файл тарифних правил змінився, а version — ні (v{rules.version})")
+        logging.info(f"📜 Тарифні правила v{old.version} → v{rules.version}: {', '.join(rules.countries)}")
+        for listener in self.listeners:
+            listener(rules)
+        return True
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            self.reload()
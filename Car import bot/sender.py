@@ -0,0 +1,244 @@
+"""
+Планувальник вихідних викликів Telegram API
+Усі надсилання проходять через спільну чергу з лімітами:
+  • глобально ~30 повідомлень/с, у кожен чат — ~1/с (з невеликим запасом на «пачку»);
+  • пріоритети: результати розрахунку випереджають підказки кроків, а розсилки йдуть останніми;
+  • порядок повідомлень в одному чаті зберігається;
+  • 429 Too Many Requests — пауза retry_after і повтор.
+"""
+
+import time
+import heapq
+import asyncio
+import logging
+from collections import deque
+
+from telebot.asyncio_helper import ApiTelegramException
+
+import metrics
+
+PRIORITY_RESULT = 0
+PRIORITY_PROMPT = 1
+PRIORITY_BULK = 2
+PRIORITY_NAMES = {PRIORITY_RESULT: "result", PRIORITY_PROMPT: "prompt", PRIORITY_BULK: "bulk"}
+
+
+def retry_after_of(exc):
+    """Кількість секунд з відповіді 429 Too Many Requests, інакше None"""
+    if isinstance(exc, ApiTelegramException) and exc.error_code == 429:
+        return int(exc.result_json.get("parameters", {}).get("retry_after", 1))
+    return None
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, now):
+        """Секунд до появи одного токена (0 — можна надсилати)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def idle(self, now):
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class _Item:
+    __slots__ = ("priority", "seq", "enqueued", "func", "args", "kwargs", "future", "coalesce")
+
+    def __init__(self, priority, seq, func, args, kwargs, future, coalesce=None):
+        self.priority = priority
+        self.coalesce = coalesce
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+
+
+class SendScheduler:
+    def __init__(self, bot, global_rate=30, chat_rate=1, chat_burst=3, concurrency=30, max_retries=5):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chats = {}       # chat_id -> deque[_Item]; є запис — чат в обробці
+        self._buckets = {}     # chat_id -> TokenBucket
+        self._ready = []       # heap (priority, seq, chat_id) чатів, чия перша в черзі — готова
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._paused_until = 0.0
+        self._seq = 0
+        self.pending = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries_429 = 0
+        self.coalesced = 0
+        self.wait_stats = {p: [0, 0.0, 0.0] for p in PRIORITY_NAMES}  # count, sum, max (сек)
+
+    # ----- постановка в чергу -----
+    async def call(self, chat_id, func, *args, priority=PRIORITY_PROMPT, coalesce=None, **kwargs):
+        """
+        Виконує func(*args, **kwargs) у межах лімітів чату chat_id; повертає результат виклику.
+        coalesce — ключ: якщо останній у черзі чату виклик має той самий ключ, він замінюється цим
+        (лише останній — щоб не змінити порядок відносно інших повідомлень).
+        """
+        queue = self._chats.get(chat_id)
+        if coalesce is not None and queue and queue[-1].coalesce == coalesce:
+            pending = queue[-1]
+            pending.args, pending.kwargs = args, kwargs
+            self.coalesced += 1
+            return await asyncio.shield(pending.future)
+        self._seq += 1
+        item = _Item(priority, self._seq, func, args, kwargs, asyncio.get_running_loop().create_future(), coalesce)
+        if queue is None:
+            self._chats[chat_id] = deque([item])
+            self._push_ready(chat_id)
+        else:
+            queue.append(item)
+        self.pending += 1
+        return await item.future
+
+    def send_message(self, chat_id, text, priority=PRIORITY_PROMPT, **kwargs):
+        return self.call(chat_id, self.bot.send_message, chat_id, text, priority=priority, **kwargs)
+
+    def send_document(self, chat_id, document, priority=PRIORITY_RESULT, **kwargs):
+        return self.call(chat_id, self.bot.send_document, chat_id, document, priority=priority, **kwargs)
+
+    def edit_message_text(self, text, chat_id, message_id, priority=PRIORITY_PROMPT, **kwargs):
+        # Кілька ще не надісланих редагувань одного повідомлення — досить останнього
+        return self.call(chat_id, self.bot.edit_message_text, text, chat_id, message_id,
+                         priority=priority, coalesce=("edit", message_id), **kwargs)
+
+    def answer_callback_query(self, callback_query_id, *args, **kwargs):
+        return self._direct(self.bot.answer_callback_query, callback_query_id, *args, **kwargs)
+
+    def answer_inline_query(self, inline_query_id, results, *args, **kwargs):
+        return self._direct(self.bot.answer_inline_query, inline_query_id, results, *args, **kwargs)
+
+    async def _direct(self, func, *args, **kwargs):
+        # Відповіді на кнопки та inline-запити не є повідомленнями в чат і не лімітуються
+        method = func.__name__
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            metrics.API_ERRORS.labels(method, getattr(e, "error_code", type(e).__name__)).inc()
+            raise
+        finally:
+            metrics.API_LATENCY.labels(method).observe(time.perf_counter() - start)
+
+    def _push_ready(self, chat_id):
+        head = self._chats[chat_id][0]
+        heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+        self._wakeup.set()
+
+    # ----- диспетчер -----
+    async def run(self):
+        last_prune = time.monotonic()
+        while True:
+            if not self._ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            pause = max(self._paused_until - now, self.global_bucket.wait_time(now))
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            _, _, chat_id = heapq.heappop(self._ready)
+            bucket = self._buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            wait = bucket.wait_time(now)
+            if wait > 0:
+                # Чат вичерпав ліміт — відкладаємо його, інші чати йдуть далі
+                asyncio.get_running_loop().call_later(wait, self._push_ready, chat_id)
+                continue
+            bucket.take()
+            self.global_bucket.take()
+            await self._slots.acquire()
+            asyncio.create_task(self._send(chat_id))
+            if now - last_prune > 60:
+                self._prune(now)
+                last_prune = now
+
+    async def _send(self, chat_id):
+        queue = self._chats[chat_id]
+        item = queue.popleft()
+        self.pending -= 1
+        waited = time.monotonic() - item.enqueued
+        stat = self.wait_stats[item.priority]
+        stat[0] += 1
+        stat[1] += waited
+        stat[2] = max(stat[2], waited)
+        metrics.SEND_WAIT.labels(PRIORITY_NAMES[item.priority]).observe(waited)
+        method = item.func.__name__
+        try:
+            for attempt in range(self.max_retries + 1):
+                start = time.perf_counter()
+                try:
+                    result = await item.func(*item.args, **item.kwargs)
+                    metrics.API_LATENCY.labels(method).observe(time.perf_counter() - start)
+                    self.sent += 1
+                    item.future.set_result(result)
+                    break
+                except Exception as e:
+                    metrics.API_LATENCY.labels(method).observe(time.perf_counter() - start)
+                    metrics.API_ERRORS.labels(method, getattr(e, "error_code", type(e).__name__)).inc()
+                    retry_after = retry_after_of(e)
+                    if retry_after is None or attempt == self.max_retries:
+                        raise
+                    self.retries_429 += 1
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                    logging.warning(f"Telegram 429: пауза {retry_after} с (чат {chat_id})")
+                    await asyncio.sleep(retry_after)
+        except Exception as e:
+            self.failed += 1
+            if not item.future.done():
+                item.future.set_exception(e)
+        finally:
+            self._slots.release()
+            if queue:
+                self._push_ready(chat_id)
+            else:
+                del self._chats[chat_id]
+
+    async def drain(self, timeout=None, skip=()):
+        """
+        Чекає, доки черга спорожніє і всі надсилання завершаться; False — не встигли за timeout сек.
+        skip — чати, яких не чекаємо (напр. адміністратора: заявки й так лежать у базі).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while any(chat_id not in skip for chat_id in self._chats):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    def _prune(self, now):
+        for chat_id in [c for c, b in self._buckets.items() if c not in self._chats and b.idle(now)]:
+            del self._buckets[chat_id]
+
+    def stats(self):
+        return {
+            "queue_depth": self.pending,
+            "active_chats": len(self._chats),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries_429": self.retries_429,
+            "coalesced": self.coalesced,
+            "wait": {PRIORITY_NAMES[p]: {"count": c, "avg": s / c if c else 0.0, "max": m}
+                     for p, (c, s, m) in self.wait_stats.items()},
+        }
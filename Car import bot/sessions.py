@@ -0,0 +1,204 @@
+"""
+Сховище сесій діалогу (крок + введені користувачем дані)
+MemorySessionStore — LRU + TTL у пам'яті процесу; при зупинці зберігається у файл і читається при запуску (лише один процес)
+SQLiteSessionStore — файл SQLite (WAL), переживає перезапуск бота і спільний для кількох воркерів
+Інше сховище (напр. Redis) підключається як SESSION_STORE=модуль:фабрика —
+фабрика отримує (data_dir, ttl, max_size) і повертає об'єкт з get/save/delete;
+необов'язкові: count_by_step() → {крок: кількість} для метрик і close() при зупинці.
+"""
+
+import os
+import json
+import time
+import importlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Поля стану, які заповнюються кроками діалогу; prompt_id — повідомлення, що редагується на кожному кроці;
+# quote_id — останній показаний розрахунок у журналі (history.QuoteLog), на нього посилається заявка;
+# vin — введений користувачем VIN (з нього заповнені рік, пальне й об'єм), іде в заявку;
+# prompt_hash — відбиток тексту й кнопок, що зараз у prompt_id: те саме вдруге не редагується
+SESSION_FIELDS = (
+    "step", "country", "car_price", "auction_fee", "delivery_usa",
+    "sea_delivery", "engine_cc", "fuel_type", "car_age", "prompt_id", "quote_id", "vin", "prompt_hash",
+)
+
+
+class Session:
+    """Стан одного чату. __slots__ замість dict — удвічі менше пам'яті на сесію."""
+    __slots__ = ("chat_id", "updated_at") + SESSION_FIELDS
+
+    def __init__(self, chat_id, step="country", **fields):
+        self.chat_id = chat_id
+        self.updated_at = time.time()
+        for name in SESSION_FIELDS:
+            setattr(self, name, fields.get(name))
+        self.step = step
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None)
+        return default if value is None else value
+
+    def to_row(self):
+        return (self.chat_id, *(getattr(self, n) for n in SESSION_FIELDS), self.updated_at)
+
+    @classmethod
+    def from_row(cls, row):
+        s = cls(row[0], **dict(zip(SESSION_FIELDS, row[1:])))
+        s.updated_at = row[-1]
+        return s
+
+    def __repr__(self):
+        return f"Session({self.chat_id}, step={self.step!r})"
+
+
+class MemorySessionStore:
+    """
+    LRU + TTL: неактивні чати видаляються після ttl сек, понад max_size — найстаріші.
+    path — файл знімка: close() записує в нього живі сесії, наступний запуск їх підхоплює.
+    """
+
+    def __init__(self, max_size=100_000, ttl=24 * 3600, path=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self._data = OrderedDict()
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def _load(self, path):
+        with open(path) as f:
+            snapshot = json.load(f)
+        # Поля — за назвами зі знімка: нове поле в SESSION_FIELDS не зсуває старі
+        names = ("chat_id", *snapshot["fields"], "updated_at")
+        now = time.time()
+        # Рядки записані від найстаріших до найсвіжіших — порядок LRU зберігається
+        for row in snapshot["sessions"]:
+            values = dict(zip(names, row))
+            if now - values["updated_at"] <= self.ttl:
+                self._data[values["chat_id"]] = Session.from_row(
+                    [values["chat_id"], *(values.get(n) for n in SESSION_FIELDS), values["updated_at"]])
+        self._evict(now)
+
+    def get(self, chat_id):
+        s = self._data.get(chat_id)
+        if s is None:
+            return None
+        if time.time() - s.updated_at > self.ttl:
+            del self._data[chat_id]
+            return None
+        return s
+
+    def save(self, session):
+        session.updated_at = time.time()
+        self._data[session.chat_id] = session
+        self._data.move_to_end(session.chat_id)
+        self._evict(session.updated_at)
+
+    def delete(self, chat_id):
+        self._data.pop(chat_id, None)
+
+    def _evict(self, now):
+        # Найстаріші за часом останньої активності — на початку OrderedDict
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+        while self._data:
+            oldest = next(iter(self._data.values()))
+            if now - oldest.updated_at <= self.ttl:
+                break
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def count_by_step(self):
+        counts = {}
+        for s in self._data.values():
+            counts[s.step] = counts.get(s.step, 0) + 1
+        return counts
+
+    def close(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Через тимчасовий файл: kill посеред запису не зіпсує попередній знімок
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"fields": SESSION_FIELDS, "sessions": [s.to_row() for s in self._data.values()]},
+                      f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+class SQLiteSessionStore:
+    """Сесії у SQLite (WAL). Прострочені записи чистяться раз на purge_every записів."""
+
+    def __init__(self, path, ttl=24 * 3600, purge_every=1000):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        cols = ", ".join(SESSION_FIELDS)
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS sessions (chat_id INTEGER PRIMARY KEY, {cols}, updated_at REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)")
+        # База від попередньої версії — додаємо нові поля
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(sessions)")}
+        for name in SESSION_FIELDS:
+            if name not in existing:
+                self._db.execute(f"ALTER TABLE sessions ADD COLUMN {name}")
+        placeholders = ", ".join("?" * (len(SESSION_FIELDS) + 2))
+        self._select = f"SELECT chat_id, {cols}, updated_at FROM sessions WHERE chat_id = ?"
+        self._upsert = f"INSERT OR REPLACE INTO sessions (chat_id, {cols}, updated_at) VALUES ({placeholders})"
+
+    def get(self, chat_id):
+        with self._lock:
+            row = self._db.execute(self._select, (chat_id,)).fetchone()
+        if row is None:
+            return None
+        s = Session.from_row(row)
+        if time.time() - s.updated_at > self.ttl:
+            self.delete(chat_id)
+            return None
+        return s
+
+    def save(self, session):
+        session.updated_at = time.time()
+        with self._lock:
+            self._db.execute(self._upsert, session.to_row())
+            self._writes += 1
+            if self._writes % self.purge_every == 0:
+                self._db.execute("DELETE FROM sessions WHERE updated_at < ?",
+                                 (session.updated_at - self.ttl,))
+
+    def delete(self, chat_id):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE chat_id = ?", (chat_id,))
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def count_by_step(self):
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT step, COUNT(*) FROM sessions WHERE updated_at >= ? GROUP BY step",
+                (time.time() - self.ttl,)).fetchall())
+
+    def close(self):
+        self._db.close()
+
+
+def open_store(kind, data_dir="data", ttl=24 * 3600, max_size=100_000):
+    if kind == "memory":
+        return MemorySessionStore(max_size=max_size, ttl=ttl, path=os.path.join(data_dir, "sessions.json"))
+    if kind == "sqlite":
+        return SQLiteSessionStore(os.path.join(data_dir, "sessions.db"), ttl=ttl)
+    if ":" in kind:
+        module, factory = kind.split(":", 1)
+        return getattr(importlib.import_module(module), factory)(data_dir=data_dir, ttl=ttl, max_size=max_size)
+    raise ValueError(f"Невідоме сховище сесій: {kind}")
@@ -0,0 +1,38 @@
+"""
+Курси за замовчуванням, таблиця аукціонних зборів і назви типів пального
+Митні ставки країн — дані в tariff_rules.json (див. rules.py), а не код.
+"""
+
+from brackets import Brackets
+
+# ===== КУРСИ ВАЛЮТ (запасні; актуальні приходять знімками з rates.RateProvider) =====
+RATES = {
+    "UAH": {"usd": 41.5,  "eur": 44.5,  "symbol": "грн", "code": "UAH"},
+    "PLN": {"usd": 4.05,  "eur": 4.28,  "symbol": "злот.", "code": "PLN"},
+    "EUR": {"usd": 0.93,  "eur": 1.0,   "symbol": "EUR",  "code": "EUR"},  # Литва — євро
+    "GEL": {"usd": 2.68,  "eur": 2.88,  "symbol": "ларі", "code": "GEL"},
+}
+
+
+# ===== ТАБЛИЦЯ АУКЦІОННИХ ЗБОРІВ (Copart / IAAI) =====
+AUCTION_FEE_TABLE = [
+    (100, 1), (499, 89), (999, 129), (1499, 179), (1999, 229),
+    (2999, 279), (3999, 329), (4999, 379), (5999, 429), (6999, 479),
+    (7999, 529), (8999, 579), (9999, 629), (14999, 729), (19999, 829),
+    (29999, 979), (49999, 1279), (74999, 1579), (99999, 1879),
+]
+AUCTION_FEE_MAX = 2179
+AUCTION_FEES = Brackets(AUCTION_FEE_TABLE, AUCTION_FEE_MAX)
+
+
+def get_auction_fee(price_usd: float) -> float:
+    return AUCTION_FEES.lookup(price_usd)
+
+
+# ===== ТИПИ ПАЛЬНОГО: як їх пишуть у файлах лотів і в запиті одним рядком =====
+FUEL_ALIASES = {
+    "gasoline": "gasoline", "petrol": "gasoline", "gas": "gasoline", "бензин": "gasoline",
+    "diesel": "diesel", "дизель": "diesel",
+    "hybrid": "hybrid", "гібрид": "hybrid",
+    "electric": "electric", "ev": "electric", "електро": "electric",
+}
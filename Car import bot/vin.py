@@ -0,0 +1,215 @@
+"""
+Розбір VIN авто з США: рік моделі, тип пального, об'єм двигуна — без мережі
+Рік — із самого VIN (позиція 10). Пальне й об'єм — з довідника vin_reference.csv,
+скомпільованого в бінарний індекс: записи фіксованої довжини, відсортовані за WMI.
+Індекс відображається в пам'ять (mmap) і шукається бінарним пошуком — мікросекунди на VIN,
+ОС ділить сторінки файлу між воркерами. Недавні VIN — у LRU-кеші декодера.
+Компіляція вручну: python vin.py [довідник.csv] [індекс.bin]
+"""
+
+import os
+import csv
+import mmap
+import struct
+import hashlib
+import logging
+import datetime
+from collections import OrderedDict
+
+DEFAULT_REFERENCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vin_reference.csv")
+
+FUELS = (None, "gasoline", "diesel", "hybrid", "electric")  # код пального в записі — індекс тут
+NO_ENGINE = 0xFFFF  # об'єм у довіднику не вказаний
+MODEL_LEN = 32
+
+MAGIC = b"VIN1"
+HEADER = struct.Struct("<4sI20s")                      # сигнатура, кількість записів, sha1 довідника
+RECORD = struct.Struct(f"<3s5sHHBH{MODEL_LEN}s")        # WMI, шаблон VDS, роки від/до, пальне, об'єм, модель
+WILDCARD = ord("*")
+
+# Значення символів і ваги позицій для контрольної цифри (позиція 9, стандарт США)
+_VALUES = {**{str(d): d for d in range(10)}, **dict(zip("ABCDEFGH", range(1, 9))),
+           **dict(zip("JKLMN", range(1, 6))), "P": 7, "R": 9, **dict(zip("STUVWXYZ", range(2, 10)))}
+_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+# Код року (позиція 10): цикл 30 років, 1980–2009 і 2010–2039
+_YEAR_CODES = "ABCDEFGHJKLMNPRSTVWXY123456789"
+# I, O, Q у VIN не буває — це майже завжди 1 і 0, переписані з фото
+_TYPOS = str.maketrans("IOQ", "100")
+
+
+def normalize(text):
+    return "".join(text.split()).replace("-", "").upper().translate(_TYPOS)
+
+
+def looks_like_vin(text):
+    """17 символів з алфавіту VIN і хоч одна літера — щоб не сплутати з числом у кроці діалогу"""
+    vin = normalize(text)
+    return len(vin) == 17 and not vin.isdigit() and all(ch in _VALUES for ch in vin)
+
+
+def check_digit(vin):
+    r = sum(_VALUES[ch] * w for ch, w in zip(vin, _WEIGHTS)) % 11
+    return "X" if r == 10 else str(r)
+
+
+def model_year(vin, current_year=None):
+    """
+    Рік моделі або None. Для авто Північної Америки (WMI 1–5) цикл визначає позиція 7:
+    літера — 2010 і новіші, цифра — 1980–2009; для інших — найпізніший рік, що вже настав.
+    """
+    code = _YEAR_CODES.find(vin[9])
+    if code < 0:
+        return None
+    old, new = 1980 + code, 2010 + code
+    if vin[0] in "12345":
+        return new if vin[6].isalpha() else old
+    return new if new <= (current_year or datetime.date.today().year) + 1 else old
+
+
+def compile_index(reference_path, index_path):
+    """Довідник CSV → бінарний індекс (атомарно). Повертає кількість записів; ValueError — помилка в довіднику."""
+    with open(reference_path, "rb") as f:
+        source = f.read()
+    lines = [line for line in source.decode("utf-8").splitlines() if line.strip() and not line.startswith("#")]
+    rows = []
+    for row in csv.DictReader(lines):
+        wmi, vds = row["wmi"].strip().upper(), row["vds"].strip().upper()
+        fuel, cc = row["fuel_type"].strip() or None, row["engine_cc"].strip()
+        if len(wmi) != 3 or len(vds) != 5:
+            raise ValueError(f"{wmi},{vds}: WMI — 3 символи, VDS — 5")
+        if fuel not in FUELS:
+            raise ValueError(f"{wmi},{vds}: невідомий тип пального «{fuel}»")
+        rows.append((wmi, vds.count("*"), vds, int(row["year_from"]), int(row["year_to"]),
+                     FUELS.index(fuel), int(cc) if cc else NO_ENGINE, row["model"].strip()))
+    # За WMI, а в межах WMI — точніші шаблони першими: перший збіг при пошуку і є найкращим
+    rows.sort(key=lambda r: (r[0], r[1]))
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    tmp = f"{index_path}.{os.getpid()}.tmp"  # воркери можуть компілювати одночасно
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(rows), hashlib.sha1(source).digest()))
+        for wmi, _, vds, year_from, year_to, fuel, cc, model in rows:
+            f.write(RECORD.pack(wmi.encode(), vds.encode(), year_from, year_to, fuel, cc,
+                                model.encode()[:MODEL_LEN]))
+    os.replace(tmp, index_path)
+    return len(rows)
+
+
+class VinIndex:
+    """Скомпільований довідник через mmap: бінарний пошук першого запису WMI, далі — кілька записів підряд"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.source_hash = HEADER.unpack_from(self._mm)
+        if magic != MAGIC or len(self._mm) != HEADER.size + self.count * RECORD.size:
+            self._mm.close()
+            raise ValueError(f"{path}: пошкоджений індекс VIN")
+
+    def _wmi(self, i):
+        offset = HEADER.size + i * RECORD.size
+        return self._mm[offset:offset + 3]
+
+    def lookup(self, vin, year=None):
+        """(пальне | None, об'єм | None, модель) для WMI + VDS у межах року або None"""
+        wmi, vds = vin[:3].encode(), vin[3:8].encode()
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._wmi(mid) < wmi:
+                lo = mid + 1
+            else:
+                hi = mid
+        for i in range(lo, self.count):
+            w, pattern, year_from, year_to, fuel, cc, model = RECORD.unpack_from(
+                self._mm, HEADER.size + i * RECORD.size)
+            if w != wmi:
+                break
+            if year is not None and not year_from <= year <= year_to:
+                continue
+            if all(p == WILDCARD or p == c for p, c in zip(pattern, vds)):
+                return FUELS[fuel], None if cc == NO_ENGINE else cc, model.rstrip(b"\0").decode(errors="ignore")
+        return None
+
+    def close(self):
+        self._mm.close()
+
+
+class VinInfo:
+    """Розібраний VIN; None — поле невідоме (спитаємо в діалозі)"""
+    __slots__ = ("vin", "year", "fuel_type", "engine_cc", "model")
+
+    def __init__(self, vin, year, fuel_type=None, engine_cc=None, model=None):
+        self.vin = vin
+        self.year = year
+        self.fuel_type = fuel_type
+        self.engine_cc = engine_cc
+        self.model = model
+
+
+class VinDecoder:
+    """decode(текст) → VinInfo; ValueError — з поясненням для користувача. index=None — лише рік."""
+
+    def __init__(self, index=None, cache_size=10_000):
+        self.index = index
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def decode(self, text):
+        vin = normalize(text)
+        info = self._cache.get(vin)
+        if info is not None:
+            self.hits += 1
+            self._cache.move_to_end(vin)
+            return info
+        self.misses += 1
+        if len(vin) != 17 or any(ch not in _VALUES for ch in vin):
+            raise ValueError("VIN — це 17 латинських літер і цифр")
+        if vin[8] != check_digit(vin):
+            raise ValueError("VIN не сходиться з контрольною цифрою (9-й символ) — перевірте, чи немає помилки")
+        year = model_year(vin)
+        found = self.index.lookup(vin, year) if self.index is not None else None
+        info = VinInfo(vin, year, *(found or ()))
+        self._cache[vin] = info
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return info
+
+
+def _open_fresh(index_path, digest):
+    """Індекс, скомпільований саме з цієї версії довідника, або None"""
+    try:
+        index = VinIndex(index_path)
+    except (OSError, ValueError):
+        return None
+    if index.source_hash != digest:
+        index.close()
+        return None
+    return index
+
+
+def open_decoder(reference_path, index_path, cache_size=10_000):
+    """
+    Відкриває індекс; якщо його немає або довідник змінився (sha1 у заголовку) — спершу компілює.
+    Довідник недоступний чи з помилкою — декодер лише року; бот працює далі.
+    """
+    try:
+        with open(reference_path, "rb") as f:
+            digest = hashlib.sha1(f.read()).digest()
+        index = _open_fresh(index_path, digest)
+        if index is None:
+            count = compile_index(reference_path, index_path)
+            logging.info(f"🔎 Індекс VIN скомпільовано: {count} записів → {index_path}")
+            index = VinIndex(index_path)
+    except (OSError, ValueError) as e:
+        logging.error(f"Довідник VIN недоступний ({e}) — з VIN визначатиметься лише рік")
+        index = None
+    return VinDecoder(index, cache_size)
+
+
+if __name__ == "__main__":
+    import sys
+    reference = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_REFERENCE_PATH
+    target = sys.argv[2] if len(sys.argv) > 2 else os.path.join("data", "vin_index.bin")
+    print(f"Записів: {compile_index(reference, target)} → {target}")
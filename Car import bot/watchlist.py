@@ -0,0 +1,305 @@
+"""
+Стеження за ціною: «повідомте, коли під ключ стане ≤ ціль»
+Стеження зберігає вхідні дані розрахунку і ціль у місцевій валюті країни (SQLite).
+Після зміни курсів чи тарифних правил перераховуються лише ті, що могли перетнути ціль:
+  • правила — за відбитком правил країни (Country.digest): змінилася країна — перерахунок її стежень;
+  • курси — за чутливістю: сума під ключ лінійна за курсами USD і EUR місцевої валюти,
+    тож для кожного стеження зберігається частина суми, прив'язана до USD і до EUR (exposure),
+    і запас до цілі в частках цієї суми (headroom). Зниження курсів на d% може дати ціль лише
+    стеженням з headroom ≤ d — це діапазон в індексі (валюта, курси на момент розрахунку, headroom).
+Кандидати перераховуються пакетом (batch.quote_batch), сповіщення йдуть пачками з орендою,
+як заявки в leads.py: після рестарту недоставлені підхоплюються з бази.
+"""
+
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+
+import metrics
+
+# Вхідні дані розрахунку в порядку аргументів quote_batch
+INPUTS = ("country", "car_price", "auction_fee", "delivery_usa", "sea_delivery",
+          "engine_cc", "fuel_type", "car_age")
+# Поля сповіщення (due)
+ALERT_COLUMNS = ("id", "chat_id", "created_at", "country", "car_price", "engine_cc", "fuel_type", "car_age",
+                 "currency", "target", "start_total", "total")
+
+WATCHING, TRIGGERED, NOTIFIED = 0, 1, 2
+BUMP = 1e-4          # відносний приріст курсу для оцінки чутливості
+NO_EXPOSURE = 1e9    # headroom стеження, сума якого від курсів не залежить
+
+
+def _bump(rates, key):
+    return {code: {**r, key: r[key] * (1 + BUMP)} for code, r in rates.items()}
+
+
+def price(rows, targets, snap, rules):
+    """
+    rows — кортежі INPUTS (країни є в rules), targets — цілі → dict масивів: total (місцева валюта),
+    exposure_usd, exposure_eur (на скільки зросте total, якщо курс USD / EUR подвоїться), курси
+    rate_usd, rate_eur, headroom — відносне зниження курсів, потрібне, щоб total дійшов до цілі.
+    """
+    # NumPy — при першому перерахунку, а не на холодному старті бота
+    import numpy as np
+    from batch import quote_batch
+    cols = [np.asarray(col) for col in zip(*rows)]
+    total = quote_batch(*cols, rates=snap.rates, rules=rules)["total_local"]
+    up_usd = quote_batch(*cols, rates=_bump(snap.rates, "usd"), rules=rules)["total_local"]
+    up_eur = quote_batch(*cols, rates=_bump(snap.rates, "eur"), rules=rules)["total_local"]
+    rate_usd, rate_eur = np.empty(len(total)), np.empty(len(total))
+    for code, calc in rules.countries.items():
+        mask = cols[0] == code
+        r = calc.rate(snap.rates)
+        rate_usd[mask], rate_eur[mask] = r["usd"], r["eur"]
+    # Межі таблиць можуть дати від'ємну похідну — для оцінки знизу вона не потрібна
+    exposure_usd = np.maximum((up_usd - total) / BUMP, 0.0)
+    exposure_eur = np.maximum((up_eur - total) / BUMP, 0.0)
+    exposure = exposure_usd + exposure_eur
+    gap = total - np.asarray(targets, dtype=float)
+    return {
+        "total": total,
+        "exposure_usd": exposure_usd,
+        "exposure_eur": exposure_eur,
+        "rate_usd": rate_usd,
+        "rate_eur": rate_eur,
+        "headroom": np.where(exposure > 0, gap / np.where(exposure > 0, exposure, 1.0), NO_EXPOSURE),
+    }
+
+
+class WatchList:
+    """
+    slack — запас (частка exposure) на нелінійність: умови правил за сумою, межі таблиць.
+    Кілька процесів можуть ділити одну базу: refresh — в одній транзакції, due() бере сповіщення в оренду.
+    """
+
+    def __init__(self, path, slack=0.005):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.slack = slack
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS watches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER, created_at REAL,
+            country TEXT, car_price REAL, auction_fee REAL, delivery_usa REAL, sea_delivery REAL,
+            engine_cc INTEGER, fuel_type TEXT, car_age INTEGER,
+            currency TEXT, target REAL, start_total REAL, total REAL,
+            exposure_usd REAL, exposure_eur REAL, rate_usd REAL, rate_eur REAL, headroom REAL,
+            rules_digest TEXT, priced_at REAL,
+            state INTEGER DEFAULT 0, notify_after REAL DEFAULT 0, notified_at REAL)""")
+        # Кандидати при зміні курсів: діапазон headroom у групі (валюта, курси, за якими рахували)
+        self._db.execute("CREATE INDEX IF NOT EXISTS watches_rates ON watches "
+                         "(currency, rate_usd, rate_eur, headroom) WHERE state = 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS watches_rules ON watches (country, rules_digest) "
+                         "WHERE state = 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS watches_chat ON watches (chat_id) WHERE state = 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS watches_due ON watches (notify_after) WHERE state = 1")
+
+    # ----- стеження користувача -----
+    def add(self, chat_id, inputs, target, snap, rules):
+        """inputs — кортеж INPUTS; target — ціль у валюті країни. Повертає id стеження."""
+        return self.add_many([(chat_id, inputs, target)], snap, rules)[0]
+
+    def add_many(self, watches, snap, rules):
+        """watches — (chat_id, inputs, target); усі за одним знімком курсів і однією версією правил"""
+        now = time.time()
+        p = price([inputs for _, inputs, _ in watches], [target for *_, target in watches], snap, rules)
+        rows = []
+        for i, (chat_id, inputs, target) in enumerate(watches):
+            calc = rules[inputs[0]]
+            total = float(p["total"][i])
+            rows.append((chat_id, now, *inputs, calc.currency, target, total, total,
+                         float(p["exposure_usd"][i]), float(p["exposure_eur"][i]),
+                         float(p["rate_usd"][i]), float(p["rate_eur"][i]), float(p["headroom"][i]),
+                         calc.digest, now, TRIGGERED if total <= target else WATCHING))
+        insert = (f"INSERT INTO watches (chat_id, created_at, {', '.join(INPUTS)}, currency, target, "
+                  "start_total, total, exposure_usd, exposure_eur, rate_usd, rate_eur, headroom, "
+                  f"rules_digest, priced_at, state) VALUES ({', '.join('?' * (len(INPUTS) + 14))})")
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [self._db.execute(insert, row).lastrowid for row in rows]
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return ids
+
+    def for_chat(self, chat_id):
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(ALERT_COLUMNS)} FROM watches WHERE chat_id = ? AND state = 0 ORDER BY id",
+                (chat_id,)).fetchall()
+        return [dict(zip(ALERT_COLUMNS, row)) for row in rows]
+
+    def count_for_chat(self, chat_id):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM watches WHERE chat_id = ? AND state = 0",
+                                    (chat_id,)).fetchone()[0]
+
+    def remove(self, chat_id, watch_id):
+        with self._lock:
+            cur = self._db.execute("DELETE FROM watches WHERE id = ? AND chat_id = ? AND state = 0",
+                                   (watch_id, chat_id))
+        return cur.rowcount > 0
+
+    # ----- перерахунок -----
+    def refresh(self, snap, rules):
+        """
+        Перераховує стеження, яких стосується зміна правил або курсів відносно їхнього останнього
+        розрахунку. Повертає dict: rules / rates — скільки перераховано з кожної причини, triggered —
+        скільки дійшли до цілі, reprice_s — час перерахунку, candidates_s — решта (пошук і запис).
+        """
+        stats = {"rules": 0, "rates": 0, "triggered": 0, "candidates_s": 0.0, "reprice_s": 0.0}
+        columns = f"id, target, {', '.join(INPUTS)}"
+        t0 = time.perf_counter()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                groups = self._db.execute(
+                    "SELECT DISTINCT country, rules_digest FROM watches WHERE state = 0").fetchall()
+                for country, digest in groups:
+                    calc = rules.countries.get(country)
+                    if calc is None or calc.digest == digest:
+                        continue  # країну прибрали з правил — стеження чекають її повернення
+                    rows = self._db.execute(
+                        f"SELECT {columns} FROM watches WHERE state = 0 AND country = ? AND rules_digest = ?",
+                        (country, digest)).fetchall()
+                    stats["rules"] += len(rows)
+                    stats["triggered"] += self._reprice(rows, snap, rules, stats)
+
+                current = {calc.currency: calc.rate(snap.rates) for calc in rules.countries.values()}
+                groups = self._db.execute(
+                    "SELECT DISTINCT currency, rate_usd, rate_eur FROM watches WHERE state = 0").fetchall()
+                for currency, rate_usd, rate_eur in groups:
+                    r = current.get(currency)
+                    if r is None or (r["usd"], r["eur"]) == (rate_usd, rate_eur):
+                        continue
+                    # Сума росте з обома курсами, тож її зміна не менша, ніж при меншому з двох рухів
+                    drop = max(0.0, 1 - min(r["usd"] / rate_usd, r["eur"] / rate_eur))
+                    rows = self._db.execute(
+                        f"SELECT {columns} FROM watches WHERE state = 0 AND currency = ? "
+                        "AND rate_usd = ? AND rate_eur = ? AND headroom <= ?",
+                        (currency, rate_usd, rate_eur, drop + self.slack)).fetchall()
+                    stats["rates"] += len(rows)
+                    stats["triggered"] += self._reprice(rows, snap, rules, stats)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        stats["candidates_s"] = time.perf_counter() - t0 - stats["reprice_s"]
+        return stats
+
+    def _reprice(self, rows, snap, rules, stats):
+        """rows — (id, target, *INPUTS); записує нові суми й чутливість, повертає кількість спрацювань"""
+        rows = [row for row in rows if row[2] in rules.countries]
+        if not rows:
+            return 0
+        t0 = time.perf_counter()
+        p = price([row[2:] for row in rows], [row[1] for row in rows], snap, rules)
+        hit = [total <= row[1] for total, row in zip(p["total"], rows)]
+        now = time.time()
+        self._db.executemany(
+            "UPDATE watches SET currency = ?, total = ?, exposure_usd = ?, exposure_eur = ?, rate_usd = ?, "
+            "rate_eur = ?, headroom = ?, rules_digest = ?, priced_at = ?, state = ? WHERE id = ?",
+            [(rules[row[2]].currency, float(p["total"][i]), float(p["exposure_usd"][i]),
+              float(p["exposure_eur"][i]), float(p["rate_usd"][i]), float(p["rate_eur"][i]), float(p["headroom"][i]),
+              rules[row[2]].digest, now, TRIGGERED if hit[i] else WATCHING, row[0])
+             for i, row in enumerate(rows)])
+        stats["reprice_s"] += time.perf_counter() - t0
+        return sum(hit)
+
+    # ----- сповіщення -----
+    def due(self, limit, lease=60):
+        """Стеження, що дійшли до цілі; до mark_notified інші процеси їх не бачать lease сек"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    f"SELECT {', '.join(ALERT_COLUMNS)} FROM watches WHERE state = 1 AND notify_after <= ? "
+                    "ORDER BY id LIMIT ?", (now, limit)).fetchall()
+                self._db.executemany("UPDATE watches SET notify_after = ? WHERE id = ?",
+                                     [(now + lease, row[0]) for row in rows])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return [dict(zip(ALERT_COLUMNS, row)) for row in rows]
+
+    def mark_notified(self, ids):
+        with self._lock:
+            self._db.executemany("UPDATE watches SET state = 2, notified_at = ? WHERE id = ?",
+                                 [(time.time(), i) for i in ids])
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM watches GROUP BY state").fetchall()
+        names = {WATCHING: "watching", TRIGGERED: "triggered", NOTIFIED: "notified"}
+        return {names[state]: n for state, n in rows}
+
+
+class WatchWorker:
+    """
+    Фонова задача стежень. notify() — після зміни курсів чи правил: refresh у потоці,
+    потім сповіщення пачками по batch_size. current() → (знімок курсів, правила);
+    send(watch) — корутина одного сповіщення (через sender з PRIORITY_BULK: розрахунки випереджають).
+    """
+
+    def __init__(self, watches, current, send, batch_size=100, interval=60):
+        self.watches = watches
+        self.current = current
+        self.send = send
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wakeup = asyncio.Event()
+
+    def notify(self, *_):
+        self._wakeup.set()
+
+    async def refresh(self):
+        snap, rules = self.current()
+        t0 = time.perf_counter()
+        stats = await asyncio.to_thread(self.watches.refresh, snap, rules)
+        for reason in ("rules", "rates"):
+            if stats[reason]:
+                metrics.WATCH_REPRICED.labels(reason).inc(stats[reason])
+        if stats["rules"] or stats["rates"]:
+            logging.info(f"🔔 Стеження: перераховано {stats['rules'] + stats['rates']} "
+                         f"(правила {stats['rules']}, курси {stats['rates']}), до цілі дійшло "
+                         f"{stats['triggered']} за {time.perf_counter() - t0:.2f} с")
+        return stats
+
+    async def deliver(self):
+        while True:
+            batch = await asyncio.to_thread(self.watches.due, self.batch_size)
+            if not batch:
+                return
+            results = await asyncio.gather(*(self.send(w) for w in batch), return_exceptions=True)
+            done = []
+            for w, result in zip(batch, results):
+                if isinstance(result, Exception) and getattr(result, "error_code", None) not in (400, 403):
+                    # Мережа чи сервер — повтор після оренди; заблокований бот чи видалений чат — ні
+                    logging.warning(f"Сповіщення #{w['id']} у чат {w['chat_id']} не надіслано: {result}")
+                    metrics.WATCH_ALERTS.labels("retry").inc()
+                    continue
+                metrics.WATCH_ALERTS.labels("failed" if isinstance(result, Exception) else "sent").inc()
+                done.append(w["id"])
+            await asyncio.to_thread(self.watches.mark_notified, done)
+
+    async def run(self):
+        while True:
+            # Скидаємо до refresh: notify() під час перерахунку не загубиться
+            self._wakeup.clear()
+            try:
+                await self.refresh()
+                await self.deliver()
+            except Exception as e:
+                logging.error(f"WatchWorker: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
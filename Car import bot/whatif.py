@@ -0,0 +1,92 @@
+"""
+Сітка «що, якби»: той самий лот за сусідніх років випуску × об'ємів двигуна (або цін)
+Уся сітка — один виклик Country.calc_batch, тобто один векторизований прохід правил.
+Межі тарифних таблиць (мито за віком, ставка акцизу за об'ємом) дають стрибки підсумку —
+їх шукаємо між сусідніми клітинками і підписуємо, який платіж стрибнув.
+"""
+
+import numpy as np
+
+from batch import auction_fee_batch
+from rules import default_rules
+from tariffs import RATES, get_auction_fee
+
+AXES = ("engine_cc", "car_price")  # що змінюється по колонках; по рядках — завжди вік
+AGE_STEPS = (-2, -1, 0, 1, 2)
+ENGINE_STEP = 250                  # см³ між колонками
+PRICE_STEPS = (0.8, 0.9, 1.0, 1.1, 1.2)
+# Стрибок — крок, що перевищує найменший крок того ж рядка / колонки (плавний ріст)
+# більш ніж на цю частку підсумку: так ціна, що росте рівномірно, не рахується межею
+CLIFF_SHARE = 0.02
+
+
+class Grid:
+    """Підсумки під ключ (USD) для ages × columns і знайдені стрибки"""
+    __slots__ = ("axis", "ages", "columns", "total_usd", "cell", "marks", "cliffs")
+
+    def __init__(self, axis, ages, columns, total_usd, cell):
+        self.axis = axis
+        self.ages = ages
+        self.columns = columns
+        self.total_usd = total_usd
+        self.cell = cell      # (рядок, колонка) введеного користувачем лота
+        self.marks = np.zeros(total_usd.shape, dtype=bool)  # клітинки, до яких веде стрибок
+        # Межі: (0 — між ages[k] і ages[k+1] | 1 — між columns[k] і columns[k+1], k, найбільший +USD, платіж),
+        # найбільші першими; та сама межа в кожному рядку / колонці — один запис
+        self.cliffs = []
+
+
+def _columns(axis, car_price, engine_cc):
+    if axis == "engine_cc":
+        return sorted({max(0, engine_cc + k * ENGINE_STEP) for k in (-2, -1, 0, 1, 2)})
+    return sorted({round(car_price * m, -2) if m != 1.0 else car_price for m in PRICE_STEPS})
+
+
+def build_grid(country, car_price, auction_fee, delivery_usa, sea_delivery,
+               engine_cc, fuel_type, car_age, axis="engine_cc", rates=None, rules=None):
+    """
+    Вік car_age ± 2 роки × engine_cc ± 500 см³ (крок ENGINE_STEP) або ціна ± 20%.
+    rates / rules — як у batch.quote_batch; підсумки збігаються з ним і з Country.calc.
+    """
+    rules = rules or default_rules()
+    ages = sorted({max(0, car_age + step) for step in AGE_STEPS})
+    columns = _columns(axis, car_price, engine_cc)
+    shape = (len(ages), len(columns))
+    age = np.repeat(ages, len(columns))
+    col = np.tile(columns, len(ages))
+    if axis == "car_price":
+        prices = col.astype(float)
+        # Збір за таблицею росте з ціною; введений вручну — лишається як є
+        fees = auction_fee_batch(prices) if auction_fee == get_auction_fee(car_price) else auction_fee
+        engines = np.full(age.size, engine_cc)
+    else:
+        prices, fees, engines = car_price, auction_fee, col
+    # Одна країна — правила напряму, без масок quote_batch: на 25 клітинках вирішують накладні витрати NumPy
+    calc = rules[country]
+    r = calc.rate(rates or RATES)
+    customs_usd = np.broadcast_to(prices + fees + delivery_usa + sea_delivery, age.shape).astype(float)
+    duty, excise, vat, customs = calc.calc_batch(customs_usd, engines, np.full(age.size, fuel_type), age, r)
+    total = ((customs_usd * r["usd"] + customs) / r["usd"]).reshape(shape)
+
+    grid = Grid(axis, ages, columns, total, (ages.index(car_age), columns.index(
+        engine_cc if axis == "engine_cc" else car_price)))
+    parts = {name: (value / r["usd"]).reshape(shape)
+             for name, value in (("мито", duty), ("акциз", excise), ("ПДВ", vat))}
+    # По колонках (той самий вік) і по рядках (та сама колонка)
+    for along, (a, b) in ((1, (total[:, :-1], total[:, 1:])), (0, (total[:-1], total[1:]))):
+        if a.size == 0:
+            continue
+        step = b - a
+        cliff = step - step.min(axis=along, keepdims=True) > CLIFF_SHARE * a
+        if along == 1:
+            grid.marks[:, 1:] |= cliff
+        else:
+            grid.marks[1:] |= cliff
+        for k in np.nonzero(cliff.any(axis=1 - along))[0]:
+            line = step[:, k] if along == 1 else step[k]
+            i = int(np.argmax(np.where(cliff[:, k] if along == 1 else cliff[k], line, -np.inf)))
+            src, dst = ((i, k), (i, k + 1)) if along == 1 else ((k, i), (k + 1, i))
+            name = max(parts, key=lambda p: parts[p][dst] - parts[p][src])
+            grid.cliffs.append((along, int(k), float(line[i]), name))
+    grid.cliffs.sort(key=lambda c: -c[2])
+    return grid
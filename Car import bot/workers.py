@@ -0,0 +1,95 @@
+"""
+Багатопроцесний режим (WORKERS > 1, лише webhook)
+Головний процес приймає webhook і розподіляє апдейти між процесами-воркерами за chat.id:
+усі апдейти одного чату потрапляють в один воркер, тож порядок повідомлень не змінюється.
+Стан діалогу — у спільному сховищі (SESSION_STORE), тому так само працюють
+і кілька реплік за балансувальником, де шардування не контролюємо.
+"""
+
+import time
+import queue
+import asyncio
+import logging
+import multiprocessing
+
+import metrics
+
+
+def update_chat_id(data):
+    """chat.id з сирого апдейта Telegram (без повного розбору); для inline-запитів — id користувача"""
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = value.get("from")
+        if user:
+            return user["id"]
+    return 0
+
+
+async def receive_updates(updates, poll=1.0):
+    """Апдейти з черги воркера до сигналу None; завершується й тоді, коли головний процес зник"""
+    loop = asyncio.get_running_loop()
+    parent = multiprocessing.parent_process()
+    while True:
+        try:
+            data = await loop.run_in_executor(None, updates.get, True, poll)
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                logging.error("Головний процес зник — воркер завершується")
+                return
+            continue
+        if data is None:
+            return
+        yield data
+
+
+class WorkerPool:
+    """
+    target(index, queue) — точка входу воркера (функція рівня модуля, бо процеси — spawn).
+    Воркер читає апдейти з queue; None — сигнал завершитись.
+    """
+
+    def __init__(self, size, target):
+        self._ctx = multiprocessing.get_context("spawn")
+        self.target = target
+        self.queues = [self._ctx.Queue() for _ in range(size)]
+        self.processes = [None] * size
+
+    def _spawn(self, index):
+        p = self._ctx.Process(target=self.target, args=(index, self.queues[index]),
+                              name=f"worker-{index}", daemon=True)
+        p.start()
+        self.processes[index] = p
+
+    def start(self):
+        for index in range(len(self.queues)):
+            self._spawn(index)
+
+    def dispatch(self, data):
+        index = update_chat_id(data) % len(self.queues)
+        self.queues[index].put(data)
+        metrics.DISPATCHED.labels(index).inc()
+        return index
+
+    async def supervise(self, interval=1.0):
+        """Перезапускає воркери, що впали; апдейти в їхній черзі дочекаються нового процесу"""
+        while True:
+            await asyncio.sleep(interval)
+            for index, p in enumerate(self.processes):
+                if not p.is_alive():
+                    logging.error(f"Воркер {index} завершився (код {p.exitcode}), перезапуск...")
+                    metrics.WORKER_RESTARTS.inc()
+                    self._spawn(index)
+
+    def stop(self, timeout=10):
+        """Воркери дообробляють свою чергу; хто не встиг за timeout сек (на всіх разом) — примусово"""
+        for q in self.queues:
+            q.put(None)
+        deadline = time.monotonic() + timeout
+        for p in self.processes:
+            p.join(max(0, deadline - time.monotonic()))
+            if p.is_alive():
+                p.terminate()